@@ -0,0 +1,62 @@
+"""create rate history
+
+Revision ID: 2b7e0c4f9a15
+Revises: 9f4c2e7d1b36
+Create Date: 2026-10-18 14:05:12.604318
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2b7e0c4f9a15"
+down_revision = "9f4c2e7d1b36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "rate_history",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("currency_code", sa.String(), nullable=False),
+        sa.Column("rate", sa.Float(), nullable=False),
+        sa.Column("backed_by", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("id", "updated_at"),
+        postgresql_partition_by="RANGE (updated_at)",
+    )
+    op.create_index(
+        "ix_rate_history_updated_at",
+        "rate_history",
+        ["updated_at"],
+        postgresql_using="brin",
+    )
+    op.create_index(
+        "ix_rate_history_currency_code_updated_at",
+        "rate_history",
+        ["currency_code", "updated_at"],
+    )
+    op.execute("CREATE TABLE rate_history_default PARTITION OF rate_history DEFAULT")
+    op.create_table(
+        "rate_history_hourly",
+        sa.Column("currency_code", sa.String(), nullable=False),
+        sa.Column("bucket", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("open", sa.Float(), nullable=False),
+        sa.Column("high", sa.Float(), nullable=False),
+        sa.Column("low", sa.Float(), nullable=False),
+        sa.Column("close", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("currency_code", "bucket"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rate_history_hourly")
+    # Dropping the partitioned table drops all of its partitions
+    op.drop_table("rate_history")
@@ -0,0 +1,50 @@
+"""create currency changes
+
+Revision ID: 5e2b9c81a4d0
+Revises: c3d5a1f5df7f
+Create Date: 2026-10-18 11:02:17.904126
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5e2b9c81a4d0"
+down_revision = "c3d5a1f5df7f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "currency_changes",
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "added", postgresql.ARRAY(sa.String()), server_default="{}", nullable=False
+        ),
+        sa.Column(
+            "changed",
+            postgresql.ARRAY(sa.String()),
+            server_default="{}",
+            nullable=False,
+        ),
+        sa.Column(
+            "removed",
+            postgresql.ARRAY(sa.String()),
+            server_default="{}",
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("version"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("currency_changes")
@@ -0,0 +1,31 @@
+"""create feeder leases
+
+Revision ID: 9f4c2e7d1b36
+Revises: 5e2b9c81a4d0
+Create Date: 2026-10-18 12:40:53.281947
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9f4c2e7d1b36"
+down_revision = "5e2b9c81a4d0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "feeder_leases",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("holder", sa.String(), nullable=False),
+        sa.Column("fencing_token", sa.BigInteger(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("feeder_leases")
@@ -0,0 +1,114 @@
+"""unify currencies table
+
+Revision ID: c3d5a1f5df7f
+Revises: 7be94db97e67
+Create Date: 2026-10-18 10:12:41.518302
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3d5a1f5df7f"
+down_revision = "7be94db97e67"
+branch_labels = None
+depends_on = None
+
+CURRENCY_COLUMNS = "currency_code, rate, backed_by, updated_at, currency_type"
+
+
+def _create_currency_table(table_name: str, currency_type: str) -> None:
+    op.create_table(
+        table_name,
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("currency_code", sa.String(), nullable=False),
+        sa.Column("rate", sa.Float(), nullable=False),
+        sa.Column("backed_by", sa.String(), server_default="USD", nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "currency_type", sa.String(), server_default=currency_type, nullable=False
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f(f"ix_{table_name}_currency_code"),
+        table_name,
+        ["currency_code"],
+        unique=True,
+    )
+
+
+def upgrade() -> None:
+    op.create_table(
+        "currencies",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("currency_code", sa.String(), nullable=False),
+        sa.Column("rate", sa.Float(), nullable=False),
+        sa.Column("backed_by", sa.String(), server_default="USD", nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("currency_type", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_currencies_currency_code"),
+        "currencies",
+        ["currency_code"],
+        unique=True,
+    )
+    op.create_index(
+        op.f("ix_currencies_currency_type"),
+        "currencies",
+        ["currency_type"],
+        unique=False,
+    )
+
+    # Coinbase rows are copied first, so they win if a fictitious currency reused one of their codes
+    op.execute(
+        f"INSERT INTO currencies ({CURRENCY_COLUMNS}) "
+        f"SELECT {CURRENCY_COLUMNS} FROM coinbase_currencies_public_api ORDER BY currency_code"
+    )
+    op.execute(
+        f"INSERT INTO currencies ({CURRENCY_COLUMNS}) "
+        f"SELECT {CURRENCY_COLUMNS} FROM fictitious_currencies ORDER BY currency_code "
+        "ON CONFLICT (currency_code) DO NOTHING"
+    )
+
+    op.drop_index(
+        op.f("ix_coinbase_currencies_public_api_currency_code"),
+        table_name="coinbase_currencies_public_api",
+    )
+    op.drop_table("coinbase_currencies_public_api")
+    op.drop_index(
+        op.f("ix_fictitious_currencies_currency_code"),
+        table_name="fictitious_currencies",
+    )
+    op.drop_table("fictitious_currencies")
+
+
+def downgrade() -> None:
+    _create_currency_table("fictitious_currencies", "fictitious")
+    _create_currency_table("coinbase_currencies_public_api", "coinbase")
+
+    op.execute(
+        f"INSERT INTO coinbase_currencies_public_api ({CURRENCY_COLUMNS}) "
+        f"SELECT {CURRENCY_COLUMNS} FROM currencies WHERE currency_type = 'coinbase' ORDER BY currency_code"
+    )
+    op.execute(
+        f"INSERT INTO fictitious_currencies ({CURRENCY_COLUMNS}) "
+        f"SELECT {CURRENCY_COLUMNS} FROM currencies WHERE currency_type = 'fictitious' ORDER BY currency_code"
+    )
+
+    op.drop_index(op.f("ix_currencies_currency_type"), table_name="currencies")
+    op.drop_index(op.f("ix_currencies_currency_code"), table_name="currencies")
+    op.drop_table("currencies")
@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from pydantic import BaseSettings
 
 
@@ -7,6 +9,23 @@ class Settings(BaseSettings):
     database_password: str
     database_port: str
     database_name: str
+    rate_source_urls: List[str] = [
+        "https://api.coinbase.com/v2/exchange-rates?currency=USD"
+    ]
+    rate_fetch_timeout: float = 5.0
+    rate_fetch_retries: int = 3
+    rate_fetch_backoff: float = 0.5
+    rate_fetch_max_backoff: float = 4.0
+    rate_fetch_deadline: float = 20.0
+    update_interval: float = 60.0
+    update_overrun_policy: str = "skip"
+    # Defaults to twice `update_interval`
+    leader_lease_duration: Optional[float] = None
+    history_partitions_ahead: int = 2
+    history_retention_days: int = 30
+    history_rollup_retention_days: int = 730
+    # Directory of the memory mapped tick store, which is not written when unset
+    tick_store_path: Optional[str] = None
 
     class Config:
         env_file = ".env"
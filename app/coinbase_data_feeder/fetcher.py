@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import math
+import random
+from time import perf_counter
+from typing import Dict, List, Optional
+
+import httpx
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RateFetcher:
+    """Fetches USD rates from several coinbase shaped sources concurrently over one pooled HTTP client
+
+    Each source answers `{"data": {"currency": <base>, "rates": {<code>: <rate>}}}`. Rates of sources with
+    another base currency are converted to USD, and earlier sources win when several publish the same code.
+    """
+
+    def __init__(
+        self,
+        source_urls: Optional[List[str]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        deadline: Optional[float] = None,
+    ) -> None:
+        self.source_urls = source_urls or settings.rate_source_urls
+        self.deadline = deadline or settings.rate_fetch_deadline
+        self.client = client or httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.rate_fetch_timeout),
+            limits=httpx.Limits(max_keepalive_connections=len(self.source_urls)),
+        )
+
+    async def _get(self, url: str) -> dict:
+        """Requests `url`, retrying failures with exponential backoff and full jitter"""
+
+        for attempt in range(settings.rate_fetch_retries + 1):
+            try:
+                response = await self.client.get(url)
+                response.raise_for_status()
+                return response.json()
+            except (httpx.HTTPError, ValueError) as exception:
+                if attempt == settings.rate_fetch_retries:
+                    raise
+                backoff = min(
+                    settings.rate_fetch_max_backoff,
+                    settings.rate_fetch_backoff * 2**attempt,
+                )
+                logger.warning("Fetching %s failed with %r, retrying", url, exception)
+                await asyncio.sleep(random.uniform(0, backoff))
+
+    async def _fetch_source(self, url: str) -> Optional[dict]:
+        """Returns the payload published by `url`, or `None` if it failed or missed the deadline"""
+
+        started_at = perf_counter()
+        try:
+            payload = await asyncio.wait_for(self._get(url), timeout=self.deadline)
+        except Exception as exception:
+            logger.warning("Skipping rates from %s: %r", url, exception)
+            return None
+        logger.debug("Fetched %s in %.3fs", url, perf_counter() - started_at)
+        return payload
+
+    async def fetch_payloads(self) -> List[Optional[dict]]:
+        """Fetches every source concurrently, returning `None` for the sources that failed"""
+
+        return await asyncio.gather(
+            *(self._fetch_source(url) for url in self.source_urls)
+        )
+
+    def merge_rates(self, payloads: List[Optional[dict]]) -> Dict[str, float]:
+        """Merges the USD rates of every payload, earlier sources winning over later ones"""
+
+        rates: Dict[str, float] = {}
+        for url, payload in reversed(list(zip(self.source_urls, payloads))):
+            if payload is None:
+                continue
+            try:
+                rates.update(
+                    _usd_rates(
+                        base_currency=payload["data"]["currency"],
+                        rates=payload["data"]["rates"],
+                    )
+                )
+            except (KeyError, TypeError, ValueError, AttributeError) as exception:
+                logger.warning("Skipping rates from %s: %r", url, exception)
+        return rates
+
+    async def fetch_rates(self) -> Dict[str, float]:
+        return self.merge_rates(await self.fetch_payloads())
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def _usd_rates(base_currency: str, rates: Dict[str, str]) -> Dict[str, float]:
+    """Returns the rate of every currency code with a positive finite rate in USD, skipping the others"""
+
+    usd_rates: Dict[str, float] = {}
+    for currency_code, rate in rates.items():
+        try:
+            rate = float(rate)
+        except (TypeError, ValueError):
+            continue
+        if math.isfinite(rate) and rate > 0:
+            usd_rates[currency_code.upper()] = rate
+
+    base_currency = base_currency.upper()
+    if base_currency == "USD":
+        return usd_rates
+    # One `base_currency` buys `usd_rates["USD"]` dollars, so every rate is rebased on that
+    usd_per_base = usd_rates.get("USD")
+    if usd_per_base is None:
+        raise ValueError(f"Rates based on {base_currency} have no USD rate")
+    usd_rates = {code: rate / usd_per_base for code, rate in usd_rates.items()}
+    usd_rates["USD"] = 1.0
+    usd_rates[base_currency] = 1 / usd_per_base
+    return usd_rates
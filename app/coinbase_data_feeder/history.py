@@ -0,0 +1,104 @@
+import logging
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+from config import settings
+from models import RateHistoryHourlyModel, RateHistoryModel
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.selectable import CTE
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^rate_history_(\d{8})$")
+
+
+def rate_history_statements(upserted: CTE) -> List[CTE]:
+    """Returns the statements appending the `upserted` rates to `rate_history` and their hourly bucket
+
+    `upserted` must return `currency_code`, `rate` and `backed_by`.
+    """
+
+    history = (
+        insert(RateHistoryModel.__table__)
+        .from_select(
+            ["currency_code", "rate", "backed_by"],
+            select(upserted.c.currency_code, upserted.c.rate, upserted.c.backed_by),
+        )
+        .returning(RateHistoryModel.currency_code, RateHistoryModel.rate)
+        .cte("history")
+    )
+    hourly_table = RateHistoryHourlyModel.__table__
+    hourly_insert = insert(hourly_table).from_select(
+        ["currency_code", "bucket", "open", "high", "low", "close"],
+        select(
+            history.c.currency_code,
+            func.date_trunc("hour", func.now()),
+            history.c.rate,
+            history.c.rate,
+            history.c.rate,
+            history.c.rate,
+        ),
+    )
+    hourly = hourly_insert.on_conflict_do_update(
+        index_elements=[hourly_table.c.currency_code, hourly_table.c.bucket],
+        set_={
+            "high": func.greatest(hourly_table.c.high, hourly_insert.excluded.high),
+            "low": func.least(hourly_table.c.low, hourly_insert.excluded.low),
+            "close": hourly_insert.excluded.close,
+        },
+    ).cte("hourly")
+    return [history, hourly]
+
+
+def _day_start(day: date) -> str:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).isoformat()
+
+
+def maintain_rate_history(engine: Engine, today: date) -> None:
+    """Creates the daily `rate_history` partitions ahead and drops the ones past retention"""
+
+    with engine.begin() as connection:
+        for offset in range(settings.history_partitions_ahead + 1):
+            day = today + timedelta(days=offset)
+            bounds = f"FROM ('{_day_start(day)}') TO ('{_day_start(day + timedelta(days=1))}')"
+            # A partition cannot be created over rows the default partition already holds for that day
+            try:
+                with connection.begin_nested():
+                    connection.execute(
+                        text(
+                            f"CREATE TABLE IF NOT EXISTS rate_history_{day:%Y%m%d} "
+                            f"PARTITION OF rate_history FOR VALUES {bounds}"
+                        )
+                    )
+            except Exception:
+                logger.exception("Could not create rate_history partition for %s", day)
+
+        oldest_day = today - timedelta(days=settings.history_retention_days)
+        partitions = connection.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = 'rate_history'"
+            )
+        ).scalars()
+        for partition in partitions:
+            match = PARTITION_NAME.match(partition)
+            if match and datetime.strptime(match[1], "%Y%m%d").date() < oldest_day:
+                connection.execute(text(f"DROP TABLE {partition}"))
+                logger.info("Dropped expired partition %s", partition)
+
+        connection.execute(
+            text("DELETE FROM rate_history_default WHERE updated_at < :oldest"),
+            {"oldest": _day_start(oldest_day)},
+        )
+        hourly_table = RateHistoryHourlyModel.__table__
+        connection.execute(
+            hourly_table.delete().where(
+                hourly_table.c.bucket
+                < func.now() - timedelta(days=settings.history_rollup_retention_days)
+            )
+        )
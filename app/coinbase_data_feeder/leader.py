@@ -0,0 +1,161 @@
+import logging
+import os
+import socket
+from datetime import timedelta
+from typing import Callable, Optional
+
+from models import FeederLeaseModel
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+
+class FencedError(Exception):
+    """Raised when a write is attempted without holding the current lease"""
+
+
+class LeaderElection:
+    """Elects one writer among feeder replicas
+
+    The leader holds a session advisory lock on a dedicated connection, so the lock is released as soon
+    as its process or connection dies and a standby takes over on its next cycle. Every new leader bumps
+    the lease fencing token, and writes only commit while their token is current and the lease is not
+    expired, so a stale leader can never overwrite the data of a newer one.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        name: str,
+        lease_duration: float,
+        on_elected: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.engine = engine
+        self.name = name
+        self.lease_duration = timedelta(seconds=lease_duration)
+        self.on_elected = on_elected
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.fencing_token: Optional[int] = None
+        self._connection: Optional[Connection] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.fencing_token is not None
+
+    def _try_lock(self) -> bool:
+        if self._connection is None:
+            self._connection = self.engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+        return self._connection.execute(
+            select(func.pg_try_advisory_lock(func.hashtext(self.name)))
+        ).scalar_one()
+
+    def _start_term(self) -> Optional[int]:
+        table = FeederLeaseModel.__table__
+        expires_at = func.now() + self.lease_duration
+        lease_query = (
+            insert(table)
+            .values(
+                name=self.name,
+                holder=self.holder,
+                fencing_token=1,
+                expires_at=expires_at,
+            )
+            .on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={
+                    "holder": self.holder,
+                    "fencing_token": table.c.fencing_token + 1,
+                    "expires_at": expires_at,
+                },
+            )
+            .returning(table.c.fencing_token)
+        )
+        return self._connection.execute(lease_query).scalar_one()
+
+    def _renew_term(self) -> Optional[int]:
+        table = FeederLeaseModel.__table__
+        renew_query = (
+            table.update()
+            .where(
+                table.c.name == self.name,
+                table.c.fencing_token == self.fencing_token,
+            )
+            .values(expires_at=func.now() + self.lease_duration)
+            .returning(table.c.fencing_token)
+        )
+        return self._connection.execute(renew_query).scalar_one_or_none()
+
+    def acquire(self) -> bool:
+        """Takes or renews the lease, returning whether this replica is the leader until the next call"""
+
+        try:
+            if self.is_leader:
+                self.fencing_token = self._renew_term()
+                if not self.is_leader:
+                    logger.warning("Lease of %s was taken over", self.name)
+                    self.release()
+            elif self._try_lock():
+                self.fencing_token = self._start_term()
+                logger.info(
+                    "%s leads %s with fencing token %d",
+                    self.holder,
+                    self.name,
+                    self.fencing_token,
+                )
+                if self.on_elected is not None:
+                    self.on_elected()
+        except Exception:
+            logger.exception("Lost connection while electing %s leader", self.name)
+            self._close()
+        return self.is_leader
+
+    def check_fence(self, connection: Connection) -> None:
+        """Raises `FencedError` unless this replica holds the current lease
+
+        The lease row stays share locked until `connection` commits, so no takeover can commit in between.
+        """
+
+        table = FeederLeaseModel.__table__
+        fence_query = (
+            select(table.c.fencing_token)
+            .where(
+                table.c.name == self.name,
+                table.c.fencing_token == self.fencing_token,
+                table.c.expires_at > func.now(),
+            )
+            .with_for_update(read=True)
+        )
+        if connection.execute(fence_query).scalar_one_or_none() is None:
+            raise FencedError(
+                f"Fencing token {self.fencing_token} of {self.name} is no longer current"
+            )
+
+    def release(self) -> None:
+        """Steps down, expiring the lease so a standby takes over on its next cycle"""
+
+        if self._connection is not None and self.is_leader:
+            table = FeederLeaseModel.__table__
+            try:
+                self._connection.execute(
+                    table.update()
+                    .where(
+                        table.c.name == self.name,
+                        table.c.fencing_token == self.fencing_token,
+                    )
+                    .values(expires_at=func.now())
+                )
+            except Exception:
+                logger.exception("Could not expire lease of %s", self.name)
+        self._close()
+
+    def _close(self) -> None:
+        self.fencing_token = None
+        if self._connection is not None:
+            # Closing the session releases the advisory lock
+            self._connection.invalidate()
+            self._connection.close()
+            self._connection = None
@@ -1,15 +1,62 @@
-from sqlalchemy import TIMESTAMP, Column, Float, Integer, String, text
+from sqlalchemy import (ARRAY, TIMESTAMP, BigInteger, Column, Float, Integer,
+                        String, text)
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+COINBASE_CURRENCY_TYPE = "coinbase"
+
 
 class CoinbaseCurrenciesPublicApiModel(Base):
-    __tablename__ = "coinbase_currencies_public_api"
+    __tablename__ = "currencies"
 
     id = Column(Integer, primary_key=True)
     currency_code = Column(String, nullable=False, index=True, unique=True)
     rate = Column(Float, nullable=False)
     backed_by = Column(String, nullable=False, server_default="USD")
     updated_at = Column(TIMESTAMP, nullable=False, server_default=text("now()"))
-    currency_type = Column(String, nullable=False, index=True, default="coinbase")
+    currency_type = Column(
+        String, nullable=False, index=True, default=COINBASE_CURRENCY_TYPE
+    )
+
+
+class CurrencyChangeModel(Base):
+    __tablename__ = "currency_changes"
+
+    version = Column(BigInteger, primary_key=True)
+    added = Column(ARRAY(String), nullable=False, server_default="{}")
+    changed = Column(ARRAY(String), nullable=False, server_default="{}")
+    removed = Column(ARRAY(String), nullable=False, server_default="{}")
+    created_at = Column(TIMESTAMP, nullable=False, server_default=text("now()"))
+
+
+class FeederLeaseModel(Base):
+    __tablename__ = "feeder_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    fencing_token = Column(BigInteger, nullable=False)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+
+class RateHistoryModel(Base):
+    __tablename__ = "rate_history"
+
+    id = Column(BigInteger, primary_key=True)
+    updated_at = Column(
+        TIMESTAMP(timezone=True), primary_key=True, server_default=text("now()")
+    )
+    currency_code = Column(String, nullable=False)
+    rate = Column(Float, nullable=False)
+    backed_by = Column(String, nullable=False)
+
+
+class RateHistoryHourlyModel(Base):
+    __tablename__ = "rate_history_hourly"
+
+    currency_code = Column(String, primary_key=True)
+    bucket = Column(TIMESTAMP(timezone=True), primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+SKIP = "skip"
+COALESCE = "coalesce"
+
+
+class FixedRateScheduler:
+    """Runs a job on a fixed grid of `interval` seconds, so the job duration never shifts later runs
+
+    A run that ends after one or more grid points overran them. With `skip` the missed points are dropped
+    and the next run waits for the following grid point. With `coalesce` the missed points collapse into a
+    single run started right away.
+    """
+
+    def __init__(self, interval: float, overrun_policy: str = SKIP) -> None:
+        if interval <= 0:
+            raise ValueError("Interval must be positive")
+        if overrun_policy not in (SKIP, COALESCE):
+            raise ValueError(f"Unknown overrun policy {overrun_policy}")
+        self.interval = interval
+        self.overrun_policy = overrun_policy
+        self.stop_event = asyncio.Event()
+
+    def stop(self) -> None:
+        """Lets the running job finish, then returns from `run`"""
+
+        self.stop_event.set()
+
+    async def _sleep_until(self, deadline: float) -> None:
+        delay = deadline - asyncio.get_running_loop().time()
+        if delay <= 0:
+            return
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self, job: Callable[[], Awaitable[None]]) -> None:
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        tick = 0
+        while not self.stop_event.is_set():
+            await self._sleep_until(started_at + tick * self.interval)
+            if self.stop_event.is_set():
+                break
+
+            try:
+                await job()
+            except Exception:
+                logger.exception("Scheduled job failed")
+
+            # Ticks are counted from the start time, so errors in `sleep` never accumulate
+            elapsed_ticks = (loop.time() - started_at) / self.interval
+            next_tick = max(tick + 1, math.ceil(elapsed_ticks))
+            if next_tick > tick + 1:
+                logger.warning(
+                    "Job overran %d tick(s), %s",
+                    next_tick - tick - 1,
+                    self.overrun_policy,
+                )
+                if self.overrun_policy == COALESCE:
+                    next_tick = math.floor(elapsed_ticks)
+            tick = next_tick
@@ -1,45 +1,283 @@
-from time import sleep
+import asyncio
+import logging
+import signal
+from datetime import date, datetime, timezone
+from time import perf_counter
+from typing import Dict, List, NamedTuple, Optional
 
-import requests
 from config import settings
-from models import CoinbaseCurrenciesPublicApiModel
-from schemas import Currency
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from fetcher import RateFetcher
+from history import maintain_rate_history, rate_history_statements
+from leader import FencedError, LeaderElection
+from models import (COINBASE_CURRENCY_TYPE, CoinbaseCurrenciesPublicApiModel,
+                    CurrencyChangeModel)
+from scheduler import FixedRateScheduler
+from sqlalchemy import String, cast, create_engine, func, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.engine import Connection, Engine
+from tick_store import TickStore
 
+logger = logging.getLogger(__name__)
+
+# Same channel the API listens on in `app.services.rate_changes`
+CURRENCY_CHANGES_CHANNEL = "currency_changes"
+
+
+class RatesDiff(NamedTuple):
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
 
-def update_coinbase_currencies_prices():
-    engine = create_engine(
-        f"postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}"
-    )
 
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class AppliedDiff(NamedTuple):
+    version: int
+    written_at: datetime
+    # Rates appended to the rate history, by currency code
+    written_rates: Dict[str, float]
 
-    db = SessionLocal()
 
-    coinbase_currencies_response = requests.get(
-        "https://api.coinbase.com/v2/exchange-rates", params={"currency": "USD"}
+# Rates as last committed by this feeder, loaded from the database on the first update
+applied_rates: Optional[Dict[str, float]] = None
+# Day the rate history partitions were last maintained on
+history_maintained_on: Optional[date] = None
+# Columnar copy of the written rates, when `settings.tick_store_path` is set
+tick_store: Optional[TickStore] = None
+
+
+def _read_applied_rates(connection: Connection) -> Dict[str, float]:
+    table = CoinbaseCurrenciesPublicApiModel.__table__
+    rates_query = select(table.c.currency_code, table.c.rate).where(
+        table.c.currency_type == COINBASE_CURRENCY_TYPE
+    )
+    return dict(connection.execute(rates_query).all())
+
+
+def _diff_rates(applied: Dict[str, float], rates: Dict[str, float]) -> RatesDiff:
+    return RatesDiff(
+        added=sorted(rates.keys() - applied.keys()),
+        changed=sorted(
+            code
+            for code in rates.keys() & applied.keys()
+            if rates[code] != applied[code]
+        ),
+        removed=sorted(applied.keys() - rates.keys()),
     )
-    if coinbase_currencies_response.status_code == 200:
-        db.query(CoinbaseCurrenciesPublicApiModel).delete()
 
-        db.execute(
-            "ALTER SEQUENCE coinbase_currencies_public_api_id_seq RESTART WITH 1"
+
+def _apply_diff(
+    connection: Connection, rates: Dict[str, float], diff: RatesDiff
+) -> AppliedDiff:
+    """Writes only the added, changed and removed rows, appends them to the rate history, then logs and
+    notifies the diff, all in one statement
+
+    Returns the version of the logged diff, which is also notified on `CURRENCY_CHANGES_CHANNEL`, and the
+    rates appended to the history.
+    """
+
+    table = CoinbaseCurrenciesPublicApiModel.__table__
+    statements = []
+    written_codes = written_rates = None
+    if diff.added or diff.changed:
+        insert_query = insert(table).values(
+            [
+                {
+                    "currency_code": code,
+                    "rate": rates[code],
+                    "currency_type": COINBASE_CURRENCY_TYPE,
+                }
+                for code in diff.added + diff.changed
+            ]
+        )
+        upserted = (
+            insert_query.on_conflict_do_update(
+                index_elements=[table.c.currency_code],
+                set_={"rate": insert_query.excluded.rate, "updated_at": func.now()},
+                # Fictitious currencies reusing a coinbase code are left untouched
+                where=table.c.currency_type == COINBASE_CURRENCY_TYPE,
+            )
+            .returning(table.c.currency_code, table.c.rate, table.c.backed_by)
+            .cte("upserted")
         )
+        history, hourly = rate_history_statements(upserted=upserted)
+        statements.extend([upserted, history, hourly])
+        written_codes = select(
+            func.array_agg(history.c.currency_code)
+        ).scalar_subquery()
+        written_rates = select(func.array_agg(history.c.rate)).scalar_subquery()
+    if diff.removed:
+        statements.append(
+            table.delete()
+            .where(
+                table.c.currency_type == COINBASE_CURRENCY_TYPE,
+                table.c.currency_code.in_(diff.removed),
+            )
+            .returning(table.c.id)
+            .cte("deleted")
+        )
+
+    changes_table = CurrencyChangeModel.__table__
+    change = (
+        insert(changes_table)
+        .values(added=diff.added, changed=diff.changed, removed=diff.removed)
+        .returning(changes_table.c.version)
+    )
+    for statement in statements:
+        change = change.add_cte(statement)
+    change = change.cte("change")
+
+    # API workers listening on the channel refresh their rates once this transaction commits
+    payload = func.json_build_object(
+        "version",
+        change.c.version,
+        "codes",
+        cast(diff.added + diff.changed + diff.removed, ARRAY(String)),
+    )
+    notify_query = select(
+        change.c.version,
+        func.now(),
+        written_codes,
+        written_rates,
+        func.pg_notify(CURRENCY_CHANGES_CHANNEL, cast(payload, String)),
+    )
+    version, written_at, codes, rates = connection.execute(notify_query).one()[:4]
+    return AppliedDiff(
+        version=version,
+        written_at=written_at,
+        written_rates=dict(zip(codes or [], rates or [])),
+    )
+
+
+def _forget_applied_rates() -> None:
+    """Makes the next write load the applied rates again, as another leader may have changed them"""
 
-    currencies = coinbase_currencies_response.json()["data"]["rates"]
+    global applied_rates
+    applied_rates = None
 
-    for currency_code, rate in currencies.items():
-        currency = Currency(currency_code=currency_code, rate=rate)
-        currency_db = CoinbaseCurrenciesPublicApiModel(
-            currency_code=currency.currency_code, rate=currency.rate
+
+def _write_rates(
+    engine: Engine, election: LeaderElection, rates: Dict[str, float]
+) -> RatesDiff:
+    """Applies the diff between `rates` and the last applied rates in a single transaction"""
+
+    global applied_rates
+
+    write_started_at = perf_counter()
+    # Readers keep seeing the previous rates until this single transaction commits
+    with engine.begin() as connection:
+        election.check_fence(connection=connection)
+        if applied_rates is None:
+            applied_rates = _read_applied_rates(connection=connection)
+        diff = _diff_rates(applied=applied_rates, rates=rates)
+        applied = (
+            _apply_diff(connection=connection, rates=rates, diff=diff) if diff else None
         )
-        db.add(currency_db)
+    applied_rates = rates
+    # Appended only once committed, so the store never holds rates Postgres rolled back
+    if tick_store is not None and applied and applied.written_rates:
+        tick_store.append(written_at=applied.written_at, rates=applied.written_rates)
+
+    logger.info(
+        "Wrote version %s with %d added, %d changed and %d removed in %.3fs",
+        applied and applied.version,
+        len(diff.added),
+        len(diff.changed),
+        len(diff.removed),
+        perf_counter() - write_started_at,
+    )
+    return diff
+
+
+class CycleTimings(NamedTuple):
+    fetch: float
+    parse: float
+    write: float
+
+
+async def update_coinbase_currencies_prices(
+    engine: Engine, fetcher: RateFetcher, election: LeaderElection
+) -> Optional[CycleTimings]:
+    # Standbys neither fetch nor write, they only check whether the leader is gone
+    if not await asyncio.to_thread(election.acquire):
+        return None
+
+    global history_maintained_on
+    today = datetime.now(timezone.utc).date()
+    if history_maintained_on != today:
+        await asyncio.to_thread(maintain_rate_history, engine=engine, today=today)
+        history_maintained_on = today
+
+    started_at = perf_counter()
+    payloads = await fetcher.fetch_payloads()
+    fetched_at = perf_counter()
+    rates = fetcher.merge_rates(payloads)
+    parsed_at = perf_counter()
+    # Never empties the table when every source failed
+    if rates:
+        try:
+            await asyncio.to_thread(
+                _write_rates, engine=engine, election=election, rates=rates
+            )
+        except FencedError:
+            logger.warning("Lost the lease during the cycle, rates were not written")
+            election.release()
+    timings = CycleTimings(
+        fetch=fetched_at - started_at,
+        parse=parsed_at - fetched_at,
+        write=perf_counter() - parsed_at,
+    )
 
-    db.commit()
-    db.close()
+    logger.info(
+        "Cycle with %d rates took %.3fs to fetch, %.3fs to parse and %.3fs to write",
+        len(rates),
+        *timings,
+    )
+    return timings
+
+
+async def main():
+    global tick_store
+    if settings.tick_store_path:
+        tick_store = TickStore(settings.tick_store_path)
+    engine = create_engine(
+        f"postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}",
+        pool_size=2,
+        pool_pre_ping=True,
+    )
+    # A slow source is dropped before it can make the cycle overrun the interval
+    fetcher = RateFetcher(
+        deadline=min(settings.rate_fetch_deadline, settings.update_interval / 2)
+    )
+    election = LeaderElection(
+        engine=engine,
+        name="coinbase_data_feeder",
+        lease_duration=settings.leader_lease_duration or 2 * settings.update_interval,
+        on_elected=_forget_applied_rates,
+    )
+    scheduler = FixedRateScheduler(
+        interval=settings.update_interval,
+        overrun_policy=settings.update_overrun_policy,
+    )
+
+    loop = asyncio.get_running_loop()
+    for stop_signal in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(stop_signal, scheduler.stop)
+
+    try:
+        await scheduler.run(
+            lambda: update_coinbase_currencies_prices(
+                engine=engine, fetcher=fetcher, election=election
+            )
+        )
+    finally:
+        election.release()
+        await fetcher.aclose()
+        engine.dispose()
+    logger.info("Feeder stopped")
 
 
 if __name__ == "__main__":
-    update_coinbase_currencies_prices()
-    sleep(60)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Local stand-in for the coinbase exchange rates API, to benchmark the fetcher offline
+
+    python stub_server.py --port 8081 --base EUR --latency 0.2 --jitter 0.1 --failure-rate 0.3
+
+Point the feeder at it with `RATE_SOURCE_URLS='["http://localhost:8081/v2/exchange-rates"]'`.
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+USD_RATES = {
+    "USD": 1.0,
+    "BRL": 5.12,
+    "EUR": 1.01,
+    "GBP": 0.86,
+    "JPY": 144.7,
+    "BTC": 0.00005,
+    "ETH": 0.0006,
+}
+
+
+def build_handler(
+    base_currency: str, latency: float, jitter: float, failure_rate: float
+):
+    class StubRatesHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            if random.random() < failure_rate:
+                self._send(503, {"errors": [{"message": "stub failure"}]})
+                return
+
+            # Rates drift a little on every request, like a live feed
+            usd_per_base = USD_RATES["USD"] / USD_RATES[base_currency]
+            rates = {
+                code: str(rate * usd_per_base * random.uniform(0.999, 1.001))
+                for code, rate in USD_RATES.items()
+            }
+            rates[base_currency] = "1"
+            self._send(200, {"data": {"currency": base_currency, "rates": rates}})
+
+        def _send(self, status_code: int, payload: dict) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The fetcher gave up on this request, e.g. after its deadline
+                pass
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return StubRatesHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--base", default="USD", choices=sorted(USD_RATES))
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    handler = build_handler(
+        base_currency=args.base,
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+    )
+    ThreadingHTTPServer((args.host, args.port), handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
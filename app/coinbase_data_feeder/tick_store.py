@@ -0,0 +1,374 @@
+"""Append-only columnar copy of the coinbase rate history, read by the API through memory maps
+
+Layout of a store directory, read by `app.services.tick_store`:
+
+    current                     symlink to the live generation directory
+    <generation>/covers_from    epoch microseconds since which every tick of every currency is in the store
+    <generation>/<CODE>.times   int64 little endian epoch microseconds, ascending
+    <generation>/<CODE>.rates   float64 little endian rates, one per time
+
+Rates are appended before times, so readers taking the shorter of both files never see a time without its
+rate. Maintenance commands write a new generation and swap `current`, so readers never mix the files of two
+generations. They take the store lock, so they are safe to run next to the feeder:
+
+    python tick_store.py check --path /var/lib/rate-ticks
+    python tick_store.py compact --path /var/lib/rate-ticks
+    python tick_store.py rotate --path /var/lib/rate-ticks --keep-days 365 [--archive /mnt/rate-ticks-archive]
+    python tick_store.py rebuild --path /var/lib/rate-ticks --since 2024-01-01
+"""
+import argparse
+import fcntl
+import logging
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from config import settings
+from models import (COINBASE_CURRENCY_TYPE, CoinbaseCurrenciesPublicApiModel,
+                    RateHistoryModel)
+from sqlalchemy import create_engine, select
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+TIME_DTYPE = np.dtype("<i8")
+RATE_DTYPE = np.dtype("<f8")
+CURRENT_LINK = "current"
+COVERS_FROM_FILE = "covers_from"
+LOCK_FILE = ".lock"
+# Ticks are appended right after their transaction commits, so older ones are settled
+CHECK_SETTLE_TIME = timedelta(minutes=1)
+
+
+def to_microseconds(moment: datetime) -> int:
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def _empty_ticks() -> Tuple[np.ndarray, np.ndarray]:
+    return np.empty(0, TIME_DTYPE), np.empty(0, RATE_DTYPE)
+
+
+class TickStore:
+    """Feeder side of the store: appends ticks and runs the maintenance commands"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        with open(os.path.join(self.path, LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _generation(self) -> Optional[str]:
+        try:
+            return os.path.join(
+                self.path, os.readlink(os.path.join(self.path, CURRENT_LINK))
+            )
+        except FileNotFoundError:
+            return None
+
+    def _new_generation(self) -> str:
+        generation = os.path.join(self.path, f"generation-{time.time_ns()}")
+        os.mkdir(generation)
+        return generation
+
+    def _publish(self, generation: str) -> None:
+        """Points `current` to `generation` atomically and removes the previous generation"""
+
+        previous = self._generation()
+        temporary_link = os.path.join(self.path, f"{CURRENT_LINK}.tmp")
+        os.symlink(os.path.basename(generation), temporary_link)
+        os.replace(temporary_link, os.path.join(self.path, CURRENT_LINK))
+        # Readers keep their maps of removed files until they notice the new generation
+        if previous is not None:
+            shutil.rmtree(previous)
+
+    def covers_from(self, generation: Optional[str] = None) -> Optional[int]:
+        generation = generation or self._generation()
+        try:
+            with open(os.path.join(generation or "", COVERS_FROM_FILE)) as file:
+                return int(file.read())
+        except FileNotFoundError:
+            return None
+
+    def currency_codes(self, generation: Optional[str] = None) -> List[str]:
+        generation = generation or self._generation()
+        if generation is None:
+            return []
+        return sorted(
+            name[: -len(".times")]
+            for name in os.listdir(generation)
+            if name.endswith(".times")
+        )
+
+    def read(
+        self, currency_code: str, generation: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the complete ticks of `currency_code`, ignoring a torn last write"""
+
+        base_path = os.path.join(generation or self._generation() or "", currency_code)
+        try:
+            times = np.fromfile(f"{base_path}.times", dtype=TIME_DTYPE)
+            rates = np.fromfile(f"{base_path}.rates", dtype=RATE_DTYPE)
+        except FileNotFoundError:
+            return _empty_ticks()
+        length = min(len(times), len(rates))
+        return times[:length], rates[:length]
+
+    @staticmethod
+    def _write(
+        generation: str,
+        currency_code: str,
+        times: np.ndarray,
+        rates: np.ndarray,
+    ) -> None:
+        base_path = os.path.join(generation, currency_code)
+        with open(f"{base_path}.rates", "ab") as file:
+            rates.astype(RATE_DTYPE).tofile(file)
+        with open(f"{base_path}.times", "ab") as file:
+            times.astype(TIME_DTYPE).tofile(file)
+
+    @staticmethod
+    def _write_covers_from(generation: str, covers_from: int) -> None:
+        with open(os.path.join(generation, COVERS_FROM_FILE), "w") as file:
+            file.write(str(covers_from))
+
+    def append(self, written_at: datetime, rates: Dict[str, float]) -> None:
+        """Appends one tick per currency, all written at `written_at`"""
+
+        written_at_microseconds = to_microseconds(written_at)
+        with self.locked():
+            if (generation := self._generation()) is None:
+                generation = self._new_generation()
+                self._write_covers_from(generation, written_at_microseconds)
+                self._publish(generation)
+            for currency_code, rate in rates.items():
+                self._write(
+                    generation,
+                    currency_code,
+                    times=np.array([written_at_microseconds]),
+                    rates=np.array([rate]),
+                )
+
+    def compact(self) -> None:
+        """Drops torn writes and repeated ticks, and restores time order after a clock step back"""
+
+        with self.locked():
+            if (covers_from := self.covers_from()) is None:
+                return
+            generation = self._new_generation()
+            for currency_code in self.currency_codes():
+                times, rates = self.read(currency_code)
+                order = np.argsort(times, kind="stable")
+                times, rates = times[order], rates[order]
+                # Of ticks sharing a time, the last written one wins
+                keep = np.append(times[1:] != times[:-1], True)[: len(times)]
+                self._write(generation, currency_code, times[keep], rates[keep])
+                logger.info(
+                    "Compacted %s from %d to %d ticks",
+                    currency_code,
+                    len(times),
+                    np.count_nonzero(keep),
+                )
+            self._write_covers_from(generation, covers_from)
+            self._publish(generation)
+
+    def rotate(self, before: datetime, archive_path: Optional[str] = None) -> None:
+        """Moves the ticks older than `before` to the store at `archive_path`, or drops them without one"""
+
+        before_microseconds = to_microseconds(before)
+        archive = TickStore(archive_path) if archive_path else None
+        with self.locked():
+            if (covers_from := self.covers_from()) is None:
+                return
+            generation = self._new_generation()
+            archived = {}
+            for currency_code in self.currency_codes():
+                times, rates = self.read(currency_code)
+                split = int(np.searchsorted(times, before_microseconds))
+                archived[currency_code] = times[:split], rates[:split]
+                self._write(generation, currency_code, times[split:], rates[split:])
+            if archive is not None:
+                archive.extend(archived, covers_from=covers_from)
+            self._write_covers_from(generation, max(covers_from, before_microseconds))
+            self._publish(generation)
+
+    def extend(
+        self, ticks: Dict[str, Tuple[np.ndarray, np.ndarray]], covers_from: int
+    ) -> None:
+        """Adds `ticks` newer than every tick already stored, as a new generation"""
+
+        with self.locked():
+            previous = self._generation()
+            generation = self._new_generation()
+            for currency_code in set(self.currency_codes()) | set(ticks):
+                times, rates = self.read(currency_code, generation=previous)
+                new_times, new_rates = ticks.get(currency_code, _empty_ticks())
+                self._write(
+                    generation,
+                    currency_code,
+                    np.concatenate([times, new_times]),
+                    np.concatenate([rates, new_rates]),
+                )
+            self._write_covers_from(
+                generation, min(filter(None, [self.covers_from(previous), covers_from]))
+            )
+            self._publish(generation)
+
+    def rebuild(self, connection: Connection, since: datetime) -> None:
+        """Replaces the store with the coinbase rate history Postgres holds since `since`"""
+
+        with self.locked():
+            generation = self._new_generation()
+            for currency_code, times, rates in _query_ticks(
+                connection, since=since, currency_codes=_coinbase_codes(connection)
+            ):
+                self._write(generation, currency_code, times, rates)
+            self._write_covers_from(generation, to_microseconds(since))
+            self._publish(generation)
+
+    def check(self, connection: Connection) -> List[str]:
+        """Compares the settled ticks of the store with the Postgres rate history, returning the mismatches"""
+
+        generation = self._generation()
+        if (covers_from := self.covers_from(generation)) is None:
+            return []
+        since = EPOCH + timedelta(microseconds=covers_from)
+        until = datetime.now(timezone.utc) - CHECK_SETTLE_TIME
+        currency_codes = set(self.currency_codes(generation)) | _coinbase_codes(
+            connection
+        )
+        expected = {
+            currency_code: (times, rates)
+            for currency_code, times, rates in _query_ticks(
+                connection, since=since, until=until, currency_codes=currency_codes
+            )
+        }
+
+        mismatches = []
+        for currency_code in sorted(currency_codes):
+            expected_times, expected_rates = expected.get(currency_code, _empty_ticks())
+            times, rates = self.read(currency_code, generation=generation)
+            settled = (times >= covers_from) & (times <= to_microseconds(until))
+            times, rates = times[settled], rates[settled]
+            if len(times) != len(expected_times):
+                mismatches.append(
+                    f"{currency_code}: {len(times)} ticks, Postgres has {len(expected_times)}"
+                )
+                continue
+            different = np.flatnonzero(
+                (times != expected_times) | (rates != expected_rates)
+            )
+            if different.size:
+                moment = EPOCH + timedelta(
+                    microseconds=int(expected_times[different[0]])
+                )
+                mismatches.append(
+                    f"{currency_code}: {different.size} ticks differ, first at {moment.isoformat()}"
+                )
+        return mismatches
+
+
+def _coinbase_codes(connection: Connection) -> Set[str]:
+    table = CoinbaseCurrenciesPublicApiModel.__table__
+    return set(
+        connection.execute(
+            select(table.c.currency_code).where(
+                table.c.currency_type == COINBASE_CURRENCY_TYPE
+            )
+        ).scalars()
+    )
+
+
+def _query_ticks(
+    connection: Connection,
+    since: datetime,
+    currency_codes: Set[str],
+    until: Optional[datetime] = None,
+) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+    """Yields the rate history of `currency_codes` since `since`, one currency at a time"""
+
+    table = RateHistoryModel.__table__
+    ticks_query = (
+        select(table.c.currency_code, table.c.updated_at, table.c.rate)
+        .where(
+            table.c.updated_at >= since,
+            table.c.currency_code.in_(sorted(currency_codes)),
+        )
+        .order_by(table.c.currency_code, table.c.updated_at, table.c.id)
+        .execution_options(stream_results=True, yield_per=10000)
+    )
+    if until is not None:
+        ticks_query = ticks_query.where(table.c.updated_at <= until)
+
+    currency_code, times, rates = None, [], []
+    for code, updated_at, rate in connection.execute(ticks_query):
+        if code != currency_code and currency_code is not None:
+            yield currency_code, np.array(times, TIME_DTYPE), np.array(
+                rates, RATE_DTYPE
+            )
+            times, rates = [], []
+        currency_code = code
+        times.append(to_microseconds(updated_at))
+        rates.append(rate)
+    if currency_code is not None:
+        yield currency_code, np.array(times, TIME_DTYPE), np.array(rates, RATE_DTYPE)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["check", "compact", "rotate", "rebuild"])
+    parser.add_argument(
+        "--path",
+        default=settings.tick_store_path,
+        required=not settings.tick_store_path,
+    )
+    parser.add_argument(
+        "--keep-days", type=int, default=365, help="rotate: days of ticks kept"
+    )
+    parser.add_argument("--archive", help="rotate: store receiving the older ticks")
+    parser.add_argument(
+        "--since", type=datetime.fromisoformat, help="rebuild: first moment copied"
+    )
+    args = parser.parse_args()
+
+    store = TickStore(args.path)
+    if args.command == "compact":
+        store.compact()
+    elif args.command == "rotate":
+        before = datetime.now(timezone.utc) - timedelta(days=args.keep_days)
+        store.rotate(before=before, archive_path=args.archive)
+    else:
+        engine = create_engine(
+            f"postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}"
+        )
+        with engine.connect() as connection:
+            if args.command == "rebuild":
+                since = args.since or datetime.now(timezone.utc) - timedelta(
+                    days=args.keep_days
+                )
+                if since.tzinfo is None:
+                    since = since.replace(tzinfo=timezone.utc)
+                store.rebuild(connection, since=since)
+            elif mismatches := store.check(connection):
+                for mismatch in mismatches:
+                    logger.error(mismatch)
+                sys.exit(1)
+            else:
+                logger.info("Store matches Postgres")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
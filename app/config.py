@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseSettings
 
 
@@ -7,6 +9,43 @@ class Settings(BaseSettings):
     database_password: str
     database_port: str
     database_name: str
+    database_async: bool = False
+    database_async_pool_size: int = 20
+    database_async_max_overflow: int = 10
+    # Comma separated `host` or `host:port` of read replicas, reads go to the primary when empty
+    database_replica_hostnames: str = ""
+    # `round_robin` or `least_busy`
+    database_replica_routing: str = "round_robin"
+    database_replica_max_lag: float = 5.0
+    database_replica_check_interval: float = 5.0
+    database_replica_pool_size: int = 500
+    rate_snapshot_refresh_interval: float = 5.0
+    rate_change_reconnect_interval: float = 1.0
+    bulk_convert_chunk_size: int = 10000
+    bulk_convert_max_line_length: int = 4096
+    history_max_buckets: int = 10000
+    history_index_window: float = 86400.0
+    history_index_overlap: float = 60.0
+    # Interval the coinbase feeder writes rates at, cached reads expire at its next tick
+    rate_update_interval: float = 60.0
+    # Store appended by the coinbase feeder, history and backtests read Postgres when unset
+    tick_store_path: Optional[str] = None
+    # Rate table shared by the workers of a host, each worker refreshes from the database when unset
+    shared_rates_path: Optional[str] = None
+    shared_rates_capacity: int = 4096
+    shared_rates_poll_interval: float = 0.1
+    # Currencies and point in time conversions cached in each process, then in Redis for every node
+    rate_cache_local_entries: int = 10000
+    rate_cache_local_ttl: float = 300.0
+    rate_cache_shared_ttl: float = 3600.0
+    # An in-memory stand-in replaces Redis when unset
+    rate_cache_redis_url: Optional[str] = None
+    rate_cache_redis_timeout: float = 0.05
+    # Longest wait of a request for a load started by a concurrent identical one
+    single_flight_timeout: float = 5.0
+    # Bounds of a snapshot refresh, reads keep the last good snapshot while the database is slow or down
+    rate_refresh_statement_timeout: Optional[float] = 2.0
+    rate_revalidate_timeout: float = 1.0
 
     class Config:
         env_file = ".env"
@@ -1,17 +1,225 @@
-from sqlalchemy import create_engine
+import itertools
+import logging
+import threading
+from typing import List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.expression import UpdateBase
 
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}"
+SQLALCHEMY_ASYNC_DATABASE_URL = f"postgresql+asyncpg://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}"
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=2500, max_overflow=20)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async engine needs asyncpg, so it is only created when the async request path is selected
+async_engine = (
+    create_async_engine(
+        SQLALCHEMY_ASYNC_DATABASE_URL,
+        pool_size=settings.database_async_pool_size,
+        max_overflow=settings.database_async_max_overflow,
+    )
+    if settings.database_async
+    else None
+)
+
+# Writes run through `AsyncSession.run_sync`, so expiring rows on commit never needs implicit IO
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autocommit=False,
+    autoflush=False,
+)
+
 Base = declarative_base()
 
+# Seconds of changes a replica received but did not replay yet, zero on the primary or once it caught up
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            CAST(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) AS float8),
+            'Infinity'::float8
+        )
+    END
+    """
+)
+
+
+class Replica:
+    """Engines of one read replica, with the lag of its last check"""
+
+    def __init__(self, hostname: str) -> None:
+        host, _, port = hostname.strip().partition(":")
+        credentials = f"{settings.database_username}:{settings.database_password}"
+        address = f"{host}:{port or settings.database_port}/{settings.database_name}"
+        self.hostname = hostname.strip()
+        self.engine = create_engine(
+            f"postgresql://{credentials}@{address}",
+            pool_size=settings.database_replica_pool_size,
+            max_overflow=20,
+        )
+        self.async_engine = (
+            create_async_engine(
+                f"postgresql+asyncpg://{credentials}@{address}",
+                pool_size=settings.database_async_pool_size,
+                max_overflow=settings.database_async_max_overflow,
+            )
+            if settings.database_async
+            else None
+        )
+        # `None` until checked, and while the replica cannot be reached
+        self.lag: Optional[float] = None
+
+    def bind(self, use_async_engine: bool) -> Engine:
+        return self.async_engine.sync_engine if use_async_engine else self.engine
+
+
+class ReplicaRouter:
+    """Picks the replica of each read session among the ones at most `max_lag` seconds behind the primary
+
+    Replicas are checked every `check_interval` seconds, and reads go to the primary while none is in sync.
+    """
+
+    def __init__(
+        self,
+        replicas: List[Replica],
+        routing: str,
+        max_lag: float,
+        check_interval: float,
+    ) -> None:
+        self.replicas = replicas
+        self.routing = routing
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._turns = itertools.count()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> None:
+        """Measures the lag of every replica"""
+
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as connection:
+                    replica.lag = connection.execute(REPLICA_LAG_QUERY).scalar_one()
+            except Exception:
+                logger.warning(
+                    "Could not check the lag of replica %s", replica.hostname
+                )
+                replica.lag = None
+
+    def pick(self, use_async_engine: bool = False) -> Optional[Engine]:
+        """Returns the engine of a replica in sync, `None` to read from the primary"""
+
+        replicas = [
+            replica
+            for replica in self.replicas
+            if replica.lag is not None and replica.lag <= self.max_lag
+        ]
+        if not replicas:
+            return None
+        if self.routing == "least_busy":
+            replica = min(
+                replicas,
+                key=lambda replica: replica.bind(use_async_engine).pool.checkedout(),
+            )
+        else:
+            replica = replicas[next(self._turns) % len(replicas)]
+        return replica.bind(use_async_engine)
+
+    def _check_periodically(self) -> None:
+        while True:
+            self.check()
+            if self._stop_event.wait(self.check_interval):
+                return
+
+    def start(self) -> None:
+        """Starts a daemon thread checking the replicas until `stop` is called"""
+
+        if self._thread is not None or not self.replicas:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._check_periodically,
+            name="replica-lag-check",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+replica_router = ReplicaRouter(
+    replicas=[
+        Replica(hostname)
+        for hostname in settings.database_replica_hostnames.split(",")
+        if hostname.strip()
+    ],
+    routing=settings.database_replica_routing,
+    max_lag=settings.database_replica_max_lag,
+    check_interval=settings.database_replica_check_interval,
+)
+
+
+class ReplicaSession(Session):
+    """Session reading from the replica `replica_router` picks for it, or from the primary
+
+    Writes go to the primary, and so does every statement after the first write, so a request reads its
+    own writes.
+    """
+
+    use_async_engine = False
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.wrote = False
+        self._replica: Optional[Engine] = None
+        self._picked = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.wrote or self._flushing or isinstance(clause, UpdateBase):
+            self.wrote = True
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        # One replica for the whole session, so its reads see one consistent state
+        if not self._picked:
+            self._replica = replica_router.pick(use_async_engine=self.use_async_engine)
+            self._picked = True
+        if self._replica is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        return self._replica
+
+
+class AsyncReplicaSession(ReplicaSession):
+    use_async_engine = True
+
+
+ReadSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, class_=ReplicaSession
+)
+
+AsyncReadSessionLocal = sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=AsyncReplicaSession,
+    autocommit=False,
+    autoflush=False,
+)
+
 
 def get_db():
     db = SessionLocal()
@@ -19,3 +227,23 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Session of read-only routes, served by a replica when one is in sync"""
+
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
@@ -1,8 +1,52 @@
 from fastapi import FastAPI, status
 
-from app.routers import convert, currency
+from app.config import settings
+from app.database import SessionLocal, replica_router
+from app.routers import convert, convert_async, currency, currency_async
+from app.services.rate_cache import rate_cache
+from app.services.rate_changes import rate_change_listener
+from app.services.shared_rates import shared_rate_table
+from app.services.snapshot import rate_snapshot_store
 
 app = FastAPI()
 
-app.include_router(currency.router)
-app.include_router(convert.router)
+# `DATABASE_ASYNC=true` serves the same routes with async handlers on the async engine
+if settings.database_async:
+    app.include_router(currency_async.router)
+    app.include_router(convert_async.router)
+else:
+    app.include_router(currency.router)
+    app.include_router(convert.router)
+
+
+def _start_database_refresh():
+    rate_snapshot_store.start(session_factory=SessionLocal)
+    rate_change_listener.start(session_factory=SessionLocal)
+
+
+@app.on_event("startup")
+def start_rate_snapshot_refresh():
+    replica_router.start()
+    # With `SHARED_RATES_PATH`, only the worker holding the shared table refreshes from the database
+    if shared_rate_table is not None:
+        shared_rate_table.start(
+            session_factory=SessionLocal, on_elected=_start_database_refresh
+        )
+    else:
+        _start_database_refresh()
+
+
+@app.on_event("shutdown")
+def stop_rate_snapshot_refresh():
+    if shared_rate_table is not None:
+        shared_rate_table.stop()
+    rate_change_listener.stop()
+    rate_snapshot_store.stop()
+    replica_router.stop()
+
+
+@app.get("/cache", status_code=status.HTTP_200_OK)
+def read_cache_stats():
+    """Return the hits, misses and evictions of the in-process and shared rate caches"""
+
+    return rate_cache.stats()
@@ -1,12 +1,18 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Float, Integer, String, text
+from sqlalchemy import (ARRAY, DDL, BigInteger, Column, DateTime, Float, Index,
+                        Integer, String, event, text)
 
 from app.database import Base
 
+COINBASE_CURRENCY_TYPE = "coinbase"
+FICTITIOUS_CURRENCY_TYPE = "fictitious"
 
-class CoinbaseCurrenciesPublicApiModel(Base):
-    __tablename__ = "coinbase_currencies_public_api"
+
+class CurrencyModel(Base):
+    """Every currency in one table, so a lookup is a single probe on the `currency_code` unique index"""
+
+    __tablename__ = "currencies"
 
     id = Column(Integer, primary_key=True)
     currency_code = Column(String, nullable=False, index=True, unique=True)
@@ -18,24 +24,72 @@ class CoinbaseCurrenciesPublicApiModel(Base):
         server_default=text("now()"),
         onupdate=datetime.utcnow,
     )
-    currency_type = Column(
-        String, nullable=False, index=True, server_default="coinbase"
+    currency_type = Column(String, nullable=False, index=True)
+
+    __mapper_args__ = {"polymorphic_on": currency_type}
+
+
+class CoinbaseCurrenciesPublicApiModel(CurrencyModel):
+    __mapper_args__ = {"polymorphic_identity": COINBASE_CURRENCY_TYPE}
+
+
+class FictitiousCoinModel(CurrencyModel):
+    __mapper_args__ = {"polymorphic_identity": FICTITIOUS_CURRENCY_TYPE}
+
+
+class CurrencyChangeModel(Base):
+    """Versioned log of the currency codes each rates update added, changed or removed"""
+
+    __tablename__ = "currency_changes"
+
+    version = Column(BigInteger, primary_key=True)
+    added = Column(ARRAY(String), nullable=False, server_default="{}")
+    changed = Column(ARRAY(String), nullable=False, server_default="{}")
+    removed = Column(ARRAY(String), nullable=False, server_default="{}")
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=text("now()")
     )
 
 
-class FictitiousCoinModel(Base):
-    __tablename__ = "fictitious_currencies"
+class RateHistoryModel(Base):
+    """Every rate a currency had, appended on each change and partitioned by day on `updated_at`"""
 
-    id = Column(Integer, primary_key=True)
-    currency_code = Column(String, nullable=False, index=True, unique=True)
-    rate = Column(Float, nullable=False)
-    backed_by = Column(String, nullable=False, server_default="USD")
+    __tablename__ = "rate_history"
+    __table_args__ = (
+        Index("ix_rate_history_updated_at", "updated_at", postgresql_using="brin"),
+        Index(
+            "ix_rate_history_currency_code_updated_at", "currency_code", "updated_at"
+        ),
+        {"postgresql_partition_by": "RANGE (updated_at)"},
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
     updated_at = Column(
         DateTime(timezone=True),
-        nullable=False,
+        primary_key=True,
         server_default=text("now()"),
-        onupdate=datetime.utcnow,
-    )
-    currency_type = Column(
-        String, nullable=False, index=True, server_default="fictitious"
     )
+    currency_code = Column(String, nullable=False)
+    rate = Column(Float, nullable=False)
+    backed_by = Column(String, nullable=False)
+
+
+# Daily partitions are created ahead by the feeder, rows of days without one land here
+event.listen(
+    RateHistoryModel.__table__,
+    "after_create",
+    DDL("CREATE TABLE rate_history_default PARTITION OF rate_history DEFAULT"),
+)
+
+
+class RateHistoryHourlyModel(Base):
+    """Open, high, low and close rate of each currency per hour in which its rate changed"""
+
+    __tablename__ = "rate_history_hourly"
+
+    currency_code = Column(String, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
@@ -0,0 +1,101 @@
+from typing import Optional, Union
+
+from fastapi import APIRouter, Depends, Header, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import ReadSessionLocal, SessionLocal, get_async_read_db
+from app.schemas.convert import (CompactCrossRateMatrixResponse,
+                                 ConvertModelResponse, CrossRateLayout,
+                                 CrossRateMatrixResponse,
+                                 InputConversionSchema,
+                                 MultipleConvertModelResponse)
+from app.services.backtest import BacktestOperator
+from app.services.bulk_convert import BulkConvertOperator, BulkConvertResponse
+from app.services.convert import AsyncConvertOperator
+from app.services.cross_rates import CrossRateOperator
+from app.services.fast_json import FastJSONResponse
+from app.services.http_cache import ConditionalRead
+from app.services.snapshot import rate_snapshot_store
+
+router = APIRouter(prefix="/convert", tags=["Convert"])
+
+
+@router.get(
+    "/",
+    status_code=status.HTTP_200_OK,
+    response_model=Union[ConvertModelResponse, MultipleConvertModelResponse],
+)
+async def convert(
+    request: Request,
+    params: InputConversionSchema = Depends(),
+    max_staleness: Optional[float] = Header(None, ge=0),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Converts `amount` into `to`, or into every currency of a comma separated `to`"""
+
+    snapshot = await rate_snapshot_store.within_staleness_async(
+        await rate_snapshot_store.current_async(db=db),
+        max_staleness=max_staleness,
+        session_factory=SessionLocal,
+    )
+    conditional = ConditionalRead(request=request, snapshot=snapshot)
+    if conditional.is_fresh():
+        return conditional.not_modified()
+
+    conversions = await AsyncConvertOperator.conversions(
+        **params.dict(), db=db, snapshot=snapshot
+    )
+    if len(conversions) > 1:
+        return FastJSONResponse({"data": conversions}, headers=conditional.headers)
+    return FastJSONResponse({"data": conversions[0]}, headers=conditional.headers)
+
+
+@router.get(
+    "/matrix",
+    status_code=status.HTTP_200_OK,
+    response_model=Union[CrossRateMatrixResponse, CompactCrossRateMatrixResponse],
+)
+async def cross_rate_matrix(
+    codes: Optional[str] = None,
+    layout: CrossRateLayout = CrossRateLayout.full,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Returns how much one unit of each currency buys of every other, for `codes` (comma separated) or all currencies"""
+
+    snapshot = await rate_snapshot_store.current_async(db=db)
+    operator = CrossRateOperator(codes=codes, db=None, snapshot=snapshot)
+    return FastJSONResponse(operator.cross_rates(layout=layout))
+
+
+@router.post(
+    "/bulk", status_code=status.HTTP_200_OK, response_class=BulkConvertResponse
+)
+async def bulk_convert(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    """Converts a streamed CSV or NDJSON body of `from_this`, `to` and `amount` rows, streaming NDJSON back"""
+
+    snapshot = await rate_snapshot_store.current_async(db=db)
+    # Every rate comes from the snapshot, so the connection goes back to the pool before the body is read
+    await db.close()
+
+    converter = BulkConvertOperator(
+        snapshot=snapshot, content_type=request.headers.get("content-type", "")
+    )
+    return BulkConvertResponse(converter.convert_stream(request.stream()))
+
+
+@router.post(
+    "/backtest", status_code=status.HTTP_200_OK, response_class=BulkConvertResponse
+)
+async def backtest(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    """Converts a streamed CSV or NDJSON body of `at`, `from_this`, `to` and `amount` rows with the rates in force at each `at`, streaming NDJSON back"""
+
+    snapshot = await rate_snapshot_store.current_async(db=db)
+    # History is read per chunk on its own session, so the connection goes back to the pool right away
+    await db.close()
+
+    converter = BacktestOperator(
+        snapshot=snapshot,
+        content_type=request.headers.get("content-type", ""),
+        session_factory=ReadSessionLocal,
+    )
+    return BulkConvertResponse(converter.convert_stream(request.stream()))
@@ -1,10 +1,20 @@
-from fastapi import APIRouter, Depends, status
+from datetime import datetime
+from typing import Optional
+
+from fastapi import (APIRouter, Depends, Header, Query, Request, Response,
+                     status)
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import SessionLocal, get_db, get_read_db
 from app.schemas.currency import (CurrencyInput, CurrencyOut, CurrencyResponse,
-                                  MultipleCurrencyResponse)
+                                  HistoryInterval, MultipleCurrencyResponse,
+                                  RateHistoryResponse)
 from app.services.currency import CurrencyService
+from app.services.encoded_body import currency_body, currency_list_body
+from app.services.fast_json import FastJSONResponse
+from app.services.history import RateHistoryOperator
+from app.services.http_cache import ConditionalRead
+from app.services.snapshot import rate_snapshot_store
 
 router = APIRouter(prefix="/currency", tags=["Currency"])
 
@@ -12,29 +22,80 @@ router = APIRouter(prefix="/currency", tags=["Currency"])
 @router.get(
     "/", status_code=status.HTTP_200_OK, response_model=MultipleCurrencyResponse
 )
-def read_all_currencies(db: Session = Depends(get_db)):
+def read_all_currencies(
+    request: Request,
+    max_staleness: Optional[float] = Header(None, ge=0),
+    db: Session = Depends(get_read_db),
+):
     """Return all currencies in both coinbase_api and fictitious tables"""
 
-    currency = CurrencyService()
-    currency_list = currency.read_all(db=db)
-    return MultipleCurrencyResponse(data=currency_list)
+    snapshot = rate_snapshot_store.within_staleness(
+        rate_snapshot_store.current(db=db),
+        max_staleness=max_staleness,
+        session_factory=SessionLocal,
+    )
+    conditional = ConditionalRead(request=request, snapshot=snapshot)
+    if conditional.is_fresh():
+        return conditional.not_modified()
+
+    # Serialized and compressed once per snapshot, each request only picks the encoding
+    return currency_list_body(snapshot).response(
+        request=request, headers=conditional.headers
+    )
 
 
 @router.get(
     "/{currency_code}", status_code=status.HTTP_200_OK, response_model=CurrencyResponse
 )
-def read_currency(currency_code: str, db: Session = Depends(get_db)):
+def read_currency(
+    currency_code: str,
+    request: Request,
+    max_staleness: Optional[float] = Header(None, ge=0),
+    db: Session = Depends(get_read_db),
+):
     """Return one specific currency information"""
 
+    snapshot = rate_snapshot_store.within_staleness(
+        rate_snapshot_store.current(db=db),
+        max_staleness=max_staleness,
+        session_factory=SessionLocal,
+    )
+    conditional = ConditionalRead(request=request, snapshot=snapshot)
+    if conditional.is_fresh():
+        return conditional.not_modified()
+
     currency = CurrencyService(currency_code=currency_code)
-    currency_db = currency.read(db=db)
-    currency_output = CurrencyOut(**currency_db.dict())
-    return CurrencyResponse(data=currency_output)
+    currency_db = currency.read(db=db, snapshot=snapshot)
+    return Response(
+        content=currency_body(snapshot, currency_db),
+        media_type="application/json",
+        headers=conditional.headers,
+    )
+
+
+@router.get(
+    "/{currency_code}/history",
+    status_code=status.HTTP_200_OK,
+    response_model=RateHistoryResponse,
+)
+def read_currency_history(
+    currency_code: str,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    interval: HistoryInterval = HistoryInterval.one_hour,
+    db: Session = Depends(get_read_db),
+):
+    """Return the open, high, low and close rates of one currency per `interval` between `from` and `to`"""
+
+    operator = RateHistoryOperator(
+        currency_code=currency_code, from_=from_, to=to, interval=interval, db=db
+    )
+    return FastJSONResponse(operator.history())
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=CurrencyResponse)
 def create_currency(currency_data: CurrencyInput, db: Session = Depends(get_db)):
-    """Create new currency in `fictitious_currencies` table"""
+    """Create new fictitious currency in `currencies` table"""
 
     currency = CurrencyService(**currency_data.dict(exclude_none=True))
     currency_db = currency.create(db=db)
@@ -48,7 +109,7 @@ def create_currency(currency_data: CurrencyInput, db: Session = Depends(get_db))
 def update_currency(
     currency_code: str, currency_data: CurrencyInput, db: Session = Depends(get_db)
 ):
-    """Updates existing currency in `fictitious_currencies`"""
+    """Updates existing fictitious currency in `currencies`"""
 
     currency = CurrencyService(**currency_data.dict(exclude_none=True))
     currency_db = currency.update(db=db, original_currency_code=currency_code)
@@ -58,7 +119,7 @@ def update_currency(
 
 @router.delete("/{currency_code}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_currency(currency_code: str, db: Session = Depends(get_db)):
-    """Deletes existing currency from `fictitious_currencies` table"""
+    """Deletes existing fictitious currency from `currencies` table"""
 
     currency = CurrencyService(currency_code=currency_code)
     return currency.delete(db=db)
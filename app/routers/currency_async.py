@@ -0,0 +1,137 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import (APIRouter, Depends, Header, Query, Request, Response,
+                     status)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import SessionLocal, get_async_db, get_async_read_db
+from app.schemas.currency import (CurrencyInput, CurrencyOut, CurrencyResponse,
+                                  HistoryInterval, MultipleCurrencyResponse,
+                                  RateHistoryResponse)
+from app.services.currency import AsyncCurrencyService
+from app.services.encoded_body import currency_body, currency_list_body
+from app.services.fast_json import FastJSONResponse
+from app.services.history import RateHistoryOperator
+from app.services.http_cache import ConditionalRead
+from app.services.snapshot import rate_snapshot_store
+
+router = APIRouter(prefix="/currency", tags=["Currency"])
+
+
+@router.get(
+    "/", status_code=status.HTTP_200_OK, response_model=MultipleCurrencyResponse
+)
+async def read_all_currencies(
+    request: Request,
+    max_staleness: Optional[float] = Header(None, ge=0),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Return all currencies in both coinbase_api and fictitious tables"""
+
+    snapshot = await rate_snapshot_store.within_staleness_async(
+        await rate_snapshot_store.current_async(db=db),
+        max_staleness=max_staleness,
+        session_factory=SessionLocal,
+    )
+    conditional = ConditionalRead(request=request, snapshot=snapshot)
+    if conditional.is_fresh():
+        return conditional.not_modified()
+
+    # Serialized and compressed once per snapshot, each request only picks the encoding
+    return currency_list_body(snapshot).response(
+        request=request, headers=conditional.headers
+    )
+
+
+@router.get(
+    "/{currency_code}", status_code=status.HTTP_200_OK, response_model=CurrencyResponse
+)
+async def read_currency(
+    currency_code: str,
+    request: Request,
+    max_staleness: Optional[float] = Header(None, ge=0),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Return one specific currency information"""
+
+    snapshot = await rate_snapshot_store.within_staleness_async(
+        await rate_snapshot_store.current_async(db=db),
+        max_staleness=max_staleness,
+        session_factory=SessionLocal,
+    )
+    conditional = ConditionalRead(request=request, snapshot=snapshot)
+    if conditional.is_fresh():
+        return conditional.not_modified()
+
+    currency = AsyncCurrencyService(currency_code=currency_code)
+    currency_db = await currency.read(db=db, snapshot=snapshot)
+    return Response(
+        content=currency_body(snapshot, currency_db),
+        media_type="application/json",
+        headers=conditional.headers,
+    )
+
+
+@router.get(
+    "/{currency_code}/history",
+    status_code=status.HTTP_200_OK,
+    response_model=RateHistoryResponse,
+)
+async def read_currency_history(
+    currency_code: str,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    interval: HistoryInterval = HistoryInterval.one_hour,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Return the open, high, low and close rates of one currency per `interval` between `from` and `to`"""
+
+    snapshot = await rate_snapshot_store.current_async(db=db)
+    history = await db.run_sync(
+        lambda session: RateHistoryOperator(
+            currency_code=currency_code,
+            from_=from_,
+            to=to,
+            interval=interval,
+            db=session,
+            snapshot=snapshot,
+        ).history()
+    )
+    return FastJSONResponse(history)
+
+
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=CurrencyResponse)
+async def create_currency(
+    currency_data: CurrencyInput, db: AsyncSession = Depends(get_async_db)
+):
+    """Create new fictitious currency in `currencies` table"""
+
+    currency = AsyncCurrencyService(**currency_data.dict(exclude_none=True))
+    currency_db = await currency.create(db=db)
+    currency_output = CurrencyOut(**currency_db.dict())
+    return CurrencyResponse(data=currency_output)
+
+
+@router.put(
+    "/{currency_code}", status_code=status.HTTP_200_OK, response_model=CurrencyResponse
+)
+async def update_currency(
+    currency_code: str,
+    currency_data: CurrencyInput,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Updates existing fictitious currency in `currencies`"""
+
+    currency = AsyncCurrencyService(**currency_data.dict(exclude_none=True))
+    currency_db = await currency.update(db=db, original_currency_code=currency_code)
+    currency_output = CurrencyOut(**currency_db.dict())
+    return CurrencyResponse(data=currency_output)
+
+
+@router.delete("/{currency_code}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_currency(currency_code: str, db: AsyncSession = Depends(get_async_db)):
+    """Deletes existing fictitious currency from `currencies` table"""
+
+    currency = AsyncCurrencyService(currency_code=currency_code)
+    return await currency.delete(db=db)
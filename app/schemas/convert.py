@@ -1,4 +1,6 @@
 from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, validator
 
@@ -7,6 +9,7 @@ class InputConversionSchema(BaseModel):
     from_this: str
     to: str
     amount: float
+    at: Optional[datetime] = None
 
     @validator("from_this")
     def do_uppercase_on_fromthis_field(cls, from_this: str):
@@ -14,7 +17,8 @@ class InputConversionSchema(BaseModel):
 
     @validator("to")
     def do_uppercase_on_to_field(cls, to: str):
-        return to.upper()
+        """Accepts one code or a comma separated list of codes"""
+        return ",".join(code.strip() for code in to.upper().split(",") if code.strip())
 
 
 class OutputConversionSchema(InputConversionSchema):
@@ -24,3 +28,21 @@ class OutputConversionSchema(InputConversionSchema):
 
 class ConvertModelResponse(BaseModel):
     data: OutputConversionSchema
+
+
+class MultipleConvertModelResponse(BaseModel):
+    data: List[OutputConversionSchema]
+
+
+class CrossRateLayout(str, Enum):
+    full = "full"
+    compact = "compact"
+
+
+class CrossRateMatrixResponse(BaseModel):
+    data: Dict[str, Dict[str, float]]
+
+
+class CompactCrossRateMatrixResponse(BaseModel):
+    codes: List[str]
+    rows: List[List[float]]
@@ -1,4 +1,5 @@
 from datetime import datetime
+from enum import Enum
 from typing import List, Optional
 
 from pydantic import BaseModel, Field, root_validator, validator
@@ -81,3 +82,23 @@ class CurrencyResponse(BaseModel):
 
 class MultipleCurrencyResponse(BaseModel):
     data: List[CurrencyOut]
+
+
+class HistoryInterval(str, Enum):
+    one_minute = "1m"
+    five_minutes = "5m"
+    fifteen_minutes = "15m"
+    one_hour = "1h"
+    one_day = "1d"
+
+
+class RateHistoryBucket(BaseModel):
+    bucket: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+
+
+class RateHistoryResponse(BaseModel):
+    data: List[RateHistoryBucket]
@@ -0,0 +1,55 @@
+from typing import Callable, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from app.schemas.currency import CurrencyDatabase
+
+
+class BackingChainResolver:
+    """Resolves how many units of a currency one USD buys, following its `backed_by` chain up to USD"""
+
+    def __init__(
+        self, find_currency: Callable[[str], Optional[CurrencyDatabase]]
+    ) -> None:
+        self._find_currency = find_currency
+        self._usd_rates: Dict[str, float] = {}
+
+    def usd_rate(self, currency_code: str) -> float:
+        """Returns the effective USD rate of `currency_code`, memoizing it and every intermediate link"""
+
+        if (rate := self._usd_rates.get(currency_code)) is not None:
+            return rate
+
+        chain: List[CurrencyDatabase] = []
+        visited_codes = set()
+        code = currency_code
+        rate = 1.0
+        while True:
+            if (memoized_rate := self._usd_rates.get(code)) is not None:
+                rate = memoized_rate
+                break
+
+            # Raises an HTTP exception if the chain loops back to a currency already visited
+            if code in visited_codes:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Currency code {currency_code} has a circular backed_by chain",
+                )
+            visited_codes.add(code)
+
+            # Raises an HTTP exception if a link of the chain is missing
+            if not (currency := self._find_currency(code)):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Currency code {code} not found",
+                )
+            chain.append(currency)
+
+            if currency.backed_by == "USD":
+                break
+            code = currency.backed_by
+
+        for currency in reversed(chain):
+            rate = currency.rate * rate
+            self._usd_rates[currency.currency_code] = rate
+        return rate
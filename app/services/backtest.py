@@ -0,0 +1,371 @@
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import COINBASE_CURRENCY_TYPE, RateHistoryModel
+from app.services.bulk_convert import BulkConvertOperator
+from app.services.history import as_utc
+from app.services.history_index import HistoricalRate, query_last_rates_before
+from app.services.snapshot import RateSnapshot
+from app.services.tick_store import tick_store
+
+BACKTEST_CSV_HEADER = ["at", "from_this", "to", "amount"]
+
+# A parsed row is either (line, at, at seconds, from_this, to, amount) or (line, error detail)
+BacktestRow = Union[Tuple[int, str, float, str, str, float], Tuple[int, str]]
+
+
+def _parse_moment(value: str) -> datetime:
+    """Parses an ISO 8601 timestamp, reading it as UTC when it has no timezone"""
+
+    return as_utc(datetime.fromisoformat(value.strip().replace("Z", "+00:00")))
+
+
+def _query_rates_between(
+    db: Session, starts_at: datetime, ends_at: datetime, skipped_codes: Set[str]
+) -> List[HistoricalRate]:
+    history_query = select(
+        RateHistoryModel.currency_code,
+        RateHistoryModel.rate,
+        RateHistoryModel.backed_by,
+        RateHistoryModel.updated_at,
+    ).where(
+        RateHistoryModel.updated_at >= starts_at,
+        RateHistoryModel.updated_at <= ends_at,
+    )
+    if skipped_codes:
+        history_query = history_query.where(
+            RateHistoryModel.currency_code.notin_(sorted(skipped_codes))
+        )
+    return [HistoricalRate(*row) for row in db.execute(history_query)]
+
+
+class RateHistoryColumns:
+    """Rates of every currency between two moments as columnar arrays sorted by currency and time
+
+    Each entry is keyed by `currency id * span + seconds since origin`, so the rate of many (currency, moment)
+    pairs is found with a single `searchsorted`. A currency without history by a moment resolves to its
+    current row when that row was last updated by then, as in `PointInTimeRates`.
+
+    `ticks` holds the epoch microseconds and rates read from the tick store by currency code, backed by the
+    currency of their current row.
+    """
+
+    def __init__(
+        self,
+        codes: Iterable[str],
+        rates: List[HistoricalRate],
+        snapshot: RateSnapshot,
+        starts_at: float,
+        ends_at: float,
+        ticks: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None,
+    ) -> None:
+        ticks = ticks or {}
+        self.starts_at = starts_at
+        self.ends_at = ends_at
+        # Codes without any rate get an id too, so they resolve as not found
+        self.codes = sorted(
+            set(codes)
+            | set(ticks)
+            | {rate.currency_code for rate in rates}
+            | {rate.backed_by for rate in rates}
+            | {currency.currency_code for currency in snapshot.currencies}
+            | {currency.backed_by for currency in snapshot.currencies}
+            | {"USD"}
+        )
+        self.code_ids = {code: code_id for code_id, code in enumerate(self.codes)}
+        self.usd_id = self.code_ids["USD"]
+
+        tick_backings = {
+            currency_code: self.code_ids[snapshot.get(currency_code).backed_by]
+            for currency_code in ticks
+        }
+        entry_codes = np.concatenate(
+            [np.array([self.code_ids[rate.currency_code] for rate in rates], np.int64)]
+            + [
+                np.full(len(times), self.code_ids[currency_code], np.int64)
+                for currency_code, (times, _) in ticks.items()
+            ]
+        )
+        entry_times = np.concatenate(
+            [np.array([rate.updated_at.timestamp() for rate in rates], np.float64)]
+            + [times / 1e6 for times, _ in ticks.values()]
+        )
+        self.origin = min(entry_times.min(initial=starts_at), starts_at)
+        self.span = max(entry_times.max(initial=ends_at), ends_at) - self.origin + 1.0
+        order = np.lexsort((entry_times, entry_codes))
+        self.entry_codes = entry_codes[order]
+        self.entry_keys = self._keys(self.entry_codes, entry_times[order])
+        self.entry_rates = np.concatenate(
+            [np.array([rate.rate for rate in rates], np.float64)]
+            + [tick_rates for _, tick_rates in ticks.values()]
+        )[order]
+        self.entry_backings = np.concatenate(
+            [np.array([self.code_ids[rate.backed_by] for rate in rates], np.int64)]
+            + [
+                np.full(len(times), tick_backings[currency_code], np.int64)
+                for currency_code, (times, _) in ticks.items()
+            ]
+        )[order]
+
+        self.current_rates = np.full(len(self.codes), np.nan)
+        self.current_times = np.full(len(self.codes), np.inf)
+        self.current_backings = np.full(len(self.codes), -1, dtype=np.int64)
+        for currency in snapshot.currencies:
+            code_id = self.code_ids[currency.currency_code]
+            self.current_rates[code_id] = currency.rate
+            self.current_times[code_id] = as_utc(currency.updated_at).timestamp()
+            self.current_backings[code_id] = self.code_ids[currency.backed_by]
+
+    def covers(self, codes: Iterable[str], starts_at: float, ends_at: float) -> bool:
+        return (
+            self.starts_at <= starts_at
+            and ends_at <= self.ends_at
+            and all(code in self.code_ids for code in codes)
+        )
+
+    def _keys(self, code_ids: np.ndarray, times: np.ndarray) -> np.ndarray:
+        return code_ids * self.span + (times - self.origin)
+
+    def lookup(
+        self, code_ids: np.ndarray, times: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the rate and backing id each currency had at each moment, and which ones had any"""
+
+        # The last entry keyed at or before each moment, which belongs to the currency if it had any rate by then
+        positions = (
+            np.searchsorted(self.entry_keys, self._keys(code_ids, times), side="right")
+            - 1
+        )
+        found = (positions >= 0) & (
+            self.entry_codes.take(positions, mode="clip") == code_ids
+        )
+        rates = np.where(found, self.entry_rates.take(positions, mode="clip"), np.nan)
+        backings = np.where(found, self.entry_backings.take(positions, mode="clip"), -1)
+
+        current = ~found & (self.current_times[code_ids] <= times)
+        rates = np.where(current, self.current_rates[code_ids], rates)
+        backings = np.where(current, self.current_backings[code_ids], backings)
+        return rates, backings, found | current
+
+    def usd_rates(
+        self, code_ids: np.ndarray, times: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Follows every `backed_by` chain at once, as `BackingChainResolver` does for one currency
+
+        Returns the USD rates, the id of the missing link of chains that broke (else -1), and which chains
+        loop back on themselves.
+        """
+
+        usd_rates = np.ones(len(code_ids))
+        missing = np.full(len(code_ids), -1, dtype=np.int64)
+        active = np.ones(len(code_ids), dtype=bool)
+        links = code_ids.copy()
+        # A chain longer than the number of currencies must have looped
+        for _ in range(len(self.codes) + 1):
+            indexes = np.flatnonzero(active)
+            if not len(indexes):
+                break
+            rates, backings, found = self.lookup(links[indexes], times[indexes])
+
+            broken = indexes[~found]
+            missing[broken] = links[broken]
+            active[broken] = False
+
+            indexes, rates, backings = indexes[found], rates[found], backings[found]
+            usd_rates[indexes] *= rates
+            reached_usd = backings == self.usd_id
+            active[indexes[reached_usd]] = False
+            links[indexes[~reached_usd]] = backings[~reached_usd]
+        return usd_rates, missing, active
+
+
+class BacktestOperator(BulkConvertOperator):
+    """Converts streamed `at`, `from_this`, `to`, `amount` rows with the rates in force at each `at`
+
+    Each chunk loads only the stretch of history its `at` values span into `RateHistoryColumns` and resolves
+    every row with array operations, so input sorted by `at` reads the history about once. Chunks inside the
+    stretch already loaded reuse it. Coinbase currencies are sliced out of the tick store when it covers the
+    stretch, so only fictitious currencies are read from Postgres.
+    """
+
+    csv_header = BACKTEST_CSV_HEADER
+
+    def __init__(
+        self,
+        snapshot: RateSnapshot,
+        content_type: str,
+        session_factory: Callable[[], Session],
+        chunk_size: Optional[int] = None,
+    ) -> None:
+        super().__init__(
+            snapshot=snapshot, content_type=content_type, chunk_size=chunk_size
+        )
+        self.session_factory = session_factory
+        self.columns: Optional[RateHistoryColumns] = None
+
+    def _parse_line(self, line: str) -> Tuple[str, float, str, str, float]:
+        at, *conversion = self._read_fields(line)
+        moment = _parse_moment(at)
+        return (
+            moment.isoformat(),
+            moment.timestamp(),
+            *self._parse_conversion(*conversion),
+        )
+
+    def _read_tick_store(
+        self, starts_at: datetime, ends_at: datetime
+    ) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Returns the ticks of the coinbase currencies from their last one before `starts_at` on"""
+
+        if tick_store is None:
+            return {}
+        covers_from = tick_store.covers_from()
+        if covers_from is None or covers_from > starts_at:
+            return {}
+        return {
+            currency.currency_code: tick_store.ticks_between(
+                currency_code=currency.currency_code,
+                starts_at=starts_at,
+                # Rows at exactly `ends_at` are part of the stretch
+                ends_at=ends_at + timedelta(microseconds=1),
+                with_previous=True,
+            )
+            for currency in self.snapshot.currencies
+            if currency.currency_type == COINBASE_CURRENCY_TYPE
+        }
+
+    def _load_columns(
+        self, codes: Set[str], starts_at: float, ends_at: float
+    ) -> RateHistoryColumns:
+        """Loads the history between `starts_at` and `ends_at` plus the last rate of each currency before it"""
+
+        starts_at_moment = datetime.fromtimestamp(starts_at, timezone.utc)
+        ends_at_moment = datetime.fromtimestamp(ends_at, timezone.utc)
+        ticks = self._read_tick_store(
+            starts_at=starts_at_moment, ends_at=ends_at_moment
+        )
+        db = self.session_factory()
+        try:
+            rates = _query_rates_between(
+                db=db,
+                starts_at=starts_at_moment,
+                ends_at=ends_at_moment,
+                skipped_codes=set(ticks),
+            )
+            codes = codes | {
+                currency.currency_code for currency in self.snapshot.currencies
+            }
+            # Ticks before the stretch are the seeds, Postgres seeds the currencies the store had none for
+            seeded_codes = {
+                currency_code
+                for currency_code, (times, _) in ticks.items()
+                if len(times) and times[0] < starts_at * 1e6
+            }
+            # Backing currencies may only appear in the seeds, so seeding repeats until the chains are closed
+            while unseeded_codes := codes - seeded_codes:
+                seeds = query_last_rates_before(
+                    db=db,
+                    currency_codes=sorted(unseeded_codes),
+                    before=starts_at_moment,
+                )
+                rates.extend(seeds)
+                seeded_codes |= unseeded_codes
+                codes = codes | {rate.backed_by for rate in rates}
+        finally:
+            db.close()
+        return RateHistoryColumns(
+            codes=codes,
+            rates=rates,
+            snapshot=self.snapshot,
+            starts_at=starts_at,
+            ends_at=ends_at,
+            ticks=ticks,
+        )
+
+    def _columns_for(
+        self, codes: Set[str], starts_at: float, ends_at: float
+    ) -> RateHistoryColumns:
+        if self.columns is None or not self.columns.covers(codes, starts_at, ends_at):
+            self.columns = self._load_columns(
+                codes=codes, starts_at=starts_at, ends_at=ends_at
+            )
+        return self.columns
+
+    def _convert_chunk(self, rows: List[BacktestRow]) -> bytes:
+        """Converts every valid row of the chunk at once and returns the NDJSON lines in input order"""
+
+        parsed_rows = [row for row in rows if len(row) == 6]
+        results = {}
+        if parsed_rows:
+            line_numbers, ats, times, from_codes, to_codes, amounts = zip(*parsed_rows)
+            times = np.array(times, dtype=np.float64)
+            columns = self._columns_for(
+                codes=set(from_codes) | set(to_codes),
+                starts_at=float(times.min()),
+                ends_at=float(times.max()),
+            )
+            from_ids = np.array([columns.code_ids[code] for code in from_codes])
+            to_ids = np.array([columns.code_ids[code] for code in to_codes])
+
+            from_rates, from_backings, from_found = columns.lookup(from_ids, times)
+            to_rates, to_backings, to_found = columns.lookup(to_ids, times)
+            from_usd_rates, from_missing, from_circular = columns.usd_rates(
+                from_ids, times
+            )
+            to_usd_rates, to_missing, to_circular = columns.usd_rates(to_ids, times)
+
+            # Currencies sharing a backing currency convert with their own rates, as in `ConvertOperator`
+            same_backing = from_backings == to_backings
+            from_rates = np.where(same_backing, from_rates, from_usd_rates)
+            to_rates = np.where(same_backing, to_rates, to_usd_rates)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                converted_values = np.round(
+                    np.array(amounts, dtype=np.float64) / from_rates * to_rates, 2
+                )
+            chains_resolved = (
+                (from_missing < 0) & ~from_circular & (to_missing < 0) & ~to_circular
+            )
+            resolved = from_found & to_found & (same_backing | chains_resolved)
+
+            codes = columns.codes
+            # Errors are the ones `ConvertOperator` would raise first: reading each currency, then their chains
+            for index in np.flatnonzero(~resolved).tolist():
+                if not from_found[index]:
+                    detail = f"Currency code {codes[from_ids[index]]} not found"
+                elif not to_found[index]:
+                    detail = f"Currency code {codes[to_ids[index]]} not found"
+                elif from_missing[index] >= 0:
+                    detail = f"Currency code {codes[from_missing[index]]} not found"
+                elif from_circular[index]:
+                    detail = f"Currency code {codes[from_ids[index]]} has a circular backed_by chain"
+                elif to_missing[index] >= 0:
+                    detail = f"Currency code {codes[to_missing[index]]} not found"
+                else:
+                    detail = f"Currency code {codes[to_ids[index]]} has a circular backed_by chain"
+                results[line_numbers[index]] = {
+                    "line": line_numbers[index],
+                    "detail": detail,
+                }
+            converted_values = converted_values.tolist()
+            for index in np.flatnonzero(resolved).tolist():
+                results[line_numbers[index]] = {
+                    "line": line_numbers[index],
+                    "at": ats[index],
+                    "from_this": from_codes[index],
+                    "to": to_codes[index],
+                    "amount": amounts[index],
+                    "converted_value": converted_values[index],
+                }
+
+        output_lines = [
+            json.dumps(
+                results[row[0]] if len(row) == 6 else {"line": row[0], "detail": row[1]}
+            )
+            for row in rows
+        ]
+        return ("\n".join(output_lines) + "\n").encode()
@@ -0,0 +1,235 @@
+import csv
+import json
+import math
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.config import settings
+from app.services.snapshot import RateSnapshot
+
+CSV_CONTENT_TYPE = "text/csv"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+CSV_HEADER = ["from_this", "to", "amount"]
+INVALID_ROW = "Invalid row"
+
+# A parsed row is either (line, from_this, to, amount) or (line, error detail)
+BulkRow = Union[Tuple[int, str, str, float], Tuple[int, str]]
+
+
+async def _iter_lines(
+    byte_stream: AsyncIterator[bytes], max_line_length: int
+) -> AsyncIterator[Optional[bytes]]:
+    """Splits an incoming byte stream into lines, yielding `None` for lines longer than `max_line_length`"""
+
+    buffer = bytearray()
+    skipping_line = False
+    async for chunk in byte_stream:
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            if not skipping_line:
+                buffer += chunk[start:end]
+                yield bytes(buffer) if len(buffer) <= max_line_length else None
+            skipping_line = False
+            buffer.clear()
+            start = end + 1
+
+        if not skipping_line:
+            buffer += chunk[start:]
+            # Drops an overlong line right away instead of buffering it until its end
+            if len(buffer) > max_line_length:
+                yield None
+                buffer.clear()
+                skipping_line = True
+
+    if buffer and not skipping_line:
+        yield bytes(buffer)
+
+
+class BulkConvertResponse(StreamingResponse):
+    """Streams the response while the request body is still being read
+
+    `StreamingResponse` listens for client disconnects by calling `receive`, which would consume the body
+    chunks the converter is reading. A disconnect already ends the body stream, so only the response is streamed.
+    """
+
+    media_type = NDJSON_CONTENT_TYPE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+
+
+class BulkConvertOperator:
+    """Converts streamed `from_this`, `to`, `amount` rows in vectorized chunks against one rate snapshot"""
+
+    csv_header = CSV_HEADER
+
+    def __init__(
+        self,
+        snapshot: RateSnapshot,
+        content_type: str,
+        chunk_size: Optional[int] = None,
+    ) -> None:
+        media_type = content_type.split(";")[0].strip().lower()
+        # Raises an HTTP exception if body is neither CSV nor NDJSON
+        if media_type not in (CSV_CONTENT_TYPE, NDJSON_CONTENT_TYPE):
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Content type {media_type} is not supported, use {CSV_CONTENT_TYPE} or {NDJSON_CONTENT_TYPE}",
+            )
+        self.is_csv = media_type == CSV_CONTENT_TYPE
+        self.snapshot = snapshot
+        self.chunk_size = chunk_size or settings.bulk_convert_chunk_size
+        self.max_line_length = settings.bulk_convert_max_line_length
+        self.csv_columns = tuple(range(len(self.csv_header)))
+
+    def _read_csv_header(self, line: str) -> bool:
+        """Maps CSV columns from a `csv_header` header, returning `False` if `line` is not a header"""
+
+        fields = [field.strip().lower() for field in next(csv.reader([line]), [])]
+        if sorted(fields) != sorted(self.csv_header):
+            return False
+        self.csv_columns = tuple(fields.index(column) for column in self.csv_header)
+        return True
+
+    def _read_fields(self, line: str) -> list:
+        """Returns the values of a CSV or NDJSON line in `csv_header` order"""
+
+        if self.is_csv:
+            fields = next(csv.reader([line]))
+            return [fields[column] for column in self.csv_columns]
+        row = json.loads(line)
+        return [row[column] for column in self.csv_header]
+
+    def _parse_conversion(self, from_this, to, amount) -> Tuple[str, str, float]:
+        if isinstance(amount, bool):
+            raise ValueError("Amount must be a number")
+        amount = float(amount)
+        if not math.isfinite(amount):
+            raise ValueError("Amount must be finite")
+        return from_this.strip().upper(), to.strip().upper(), amount
+
+    def _parse_line(self, line: str) -> Tuple[str, str, float]:
+        return self._parse_conversion(*self._read_fields(line))
+
+    def _resolve_codes(
+        self, codes: np.ndarray
+    ) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, List[str]]:
+        """Resolves each distinct code once, returning error details, rates, USD rates, backing ids and `updated_at`"""
+
+        errors, rates, usd_rates, backings, updated_ats = [], [], [], [], []
+        backing_ids: Dict[str, int] = {}
+        for code in codes.tolist():
+            currency = self.snapshot.get(code)
+            try:
+                usd_rate = self.snapshot.resolver.usd_rate(code)
+            except HTTPException as exception:
+                errors.append(exception.detail)
+                rates.append(np.nan)
+                usd_rates.append(np.nan)
+                backings.append(-1)
+                updated_ats.append("")
+                continue
+            errors.append("")
+            rates.append(currency.rate)
+            usd_rates.append(usd_rate)
+            backings.append(
+                backing_ids.setdefault(currency.backed_by, len(backing_ids))
+            )
+            updated_ats.append(currency.updated_at.isoformat())
+        return (
+            errors,
+            np.array(rates, dtype=np.float64),
+            np.array(usd_rates, dtype=np.float64),
+            np.array(backings, dtype=np.int64),
+            updated_ats,
+        )
+
+    def _convert_chunk(self, rows: List[BulkRow]) -> bytes:
+        """Converts every valid row of the chunk at once and returns the NDJSON lines in input order"""
+
+        parsed_rows = [row for row in rows if len(row) == 4]
+        converted: Dict[int, dict] = {}
+        if parsed_rows:
+            line_numbers, from_codes, to_codes, amounts = zip(*parsed_rows)
+            codes, code_indexes = np.unique(
+                np.array(from_codes + to_codes), return_inverse=True
+            )
+            from_indexes = code_indexes[: len(parsed_rows)]
+            to_indexes = code_indexes[len(parsed_rows) :]
+            errors, rates, usd_rates, backings, updated_ats = self._resolve_codes(codes)
+            codes = codes.tolist()
+
+            # Currencies sharing a backing currency convert with their own rates, as in `ConvertOperator`
+            same_backing = backings[from_indexes] == backings[to_indexes]
+            from_rates = np.where(
+                same_backing, rates[from_indexes], usd_rates[from_indexes]
+            )
+            to_rates = np.where(same_backing, rates[to_indexes], usd_rates[to_indexes])
+            converted_values = np.round(
+                np.array(amounts, dtype=np.float64) / from_rates * to_rates, 2
+            )
+
+            for line_number, from_index, to_index, amount, converted_value in zip(
+                line_numbers,
+                from_indexes.tolist(),
+                to_indexes.tolist(),
+                amounts,
+                converted_values.tolist(),
+            ):
+                if detail := errors[from_index] or errors[to_index]:
+                    converted[line_number] = {"line": line_number, "detail": detail}
+                    continue
+                converted[line_number] = {
+                    "line": line_number,
+                    "from_this": codes[from_index],
+                    "to": codes[to_index],
+                    "amount": amount,
+                    "converted_value": converted_value,
+                    "updated_at": updated_ats[from_index],
+                }
+
+        output_lines = [
+            json.dumps(
+                converted[row[0]]
+                if len(row) == 4
+                else {"line": row[0], "detail": row[1]}
+            )
+            for row in rows
+        ]
+        return ("\n".join(output_lines) + "\n").encode()
+
+    async def convert_stream(
+        self, byte_stream: AsyncIterator[bytes]
+    ) -> AsyncIterator[bytes]:
+        """Yields converted NDJSON lines chunk by chunk as rows arrive, keeping the input order"""
+
+        rows: List[BulkRow] = []
+        line_number = 0
+        looking_for_header = self.is_csv
+        async for raw_line in _iter_lines(byte_stream, self.max_line_length):
+            line_number += 1
+            try:
+                if raw_line is None:
+                    raise ValueError("Line too long")
+                line = raw_line.decode().lstrip("\ufeff").rstrip("\r")
+                if not line.strip():
+                    continue
+                if looking_for_header:
+                    looking_for_header = False
+                    if self._read_csv_header(line):
+                        continue
+                rows.append((line_number, *self._parse_line(line)))
+            except (ValueError, KeyError, TypeError, AttributeError, IndexError):
+                rows.append((line_number, INVALID_ROW))
+
+            if len(rows) >= self.chunk_size:
+                yield await run_in_threadpool(self._convert_chunk, rows)
+                rows = []
+
+        if rows:
+            yield await run_in_threadpool(self._convert_chunk, rows)
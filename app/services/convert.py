@@ -1,39 +1,180 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.models import CoinbaseCurrenciesPublicApiModel
+from app.config import settings
 from app.schemas.convert import OutputConversionSchema
+from app.schemas.currency import CurrencyDatabase
 from app.services.currency import CurrencyService
+from app.services.history import as_utc
+from app.services.history_index import PointInTimeRates, rate_history_index
+from app.services.rate_cache import rate_cache
+from app.services.single_flight import SingleFlight
+from app.services.snapshot import RateSnapshot, rate_snapshot_store
+
+
+def _conversion_cache_key(
+    from_this: str, to: str, amount: float, at: datetime, snapshot: RateSnapshot
+) -> str:
+    return f"convert:{snapshot.fingerprint[0]}:{from_this.upper()}:{to.upper()}:{amount!r}:{as_utc(at).isoformat()}"
+
+
+def _decode_conversions(rows: List[dict]) -> List[OutputConversionSchema]:
+    return [
+        OutputConversionSchema.construct(
+            **{
+                **row,
+                "at": datetime.fromisoformat(row["at"]),
+                "updated_at": datetime.fromisoformat(row["updated_at"]),
+            }
+        )
+        for row in rows
+    ]
 
 
 class ConvertOperator:
-    """Handle the conversion operation between two currencies"""
+    """Handle the conversion operation between one currency and one or more currencies
 
-    def __init__(self, from_this: str, to: str, amount: float, db: Session) -> None:
-        self.from_this = CurrencyService(currency_code=from_this).read(db=db)
-        self.to = CurrencyService(currency_code=to).read(db=db)
-        self.amount = amount
-        self.db = db
+    With `at`, every currency and its `backed_by` chain are resolved as they were at that moment.
+    """
 
-    def _convert_to_usd(self, currency: CoinbaseCurrenciesPublicApiModel) -> None:
-        if currency.backed_by != "USD":
-            backed_currency = CurrencyService(currency_code=currency.backed_by).read(
-                db=self.db
+    def __init__(
+        self,
+        from_this: str,
+        to: str,
+        amount: float,
+        db: Session,
+        snapshot: Optional[RateSnapshot] = None,
+        at: Optional[datetime] = None,
+    ) -> None:
+        snapshot = snapshot or rate_snapshot_store.current(db=db)
+        if at is not None:
+            snapshot = PointInTimeRates(
+                at=at, db=db, snapshot=snapshot, index=rate_history_index
             )
-            currency.rate = currency.rate * backed_currency.rate
-            currency.backed_by = "USD"
+        self.snapshot = snapshot
+        self.at = at
+        self.from_this = CurrencyService(currency_code=from_this).read(
+            db=db, snapshot=self.snapshot
+        )
+        # `to` may be a comma separated list of codes, all read from the same snapshot
+        self.targets = [
+            CurrencyService(currency_code=code).read(db=db, snapshot=self.snapshot)
+            for code in to.split(",")
+        ]
+        self.to = self.targets[0]
+        self.amount = amount
+        self.db = db
 
-    def convert_currencies(self) -> OutputConversionSchema:
-        if self.from_this.backed_by != self.to.backed_by:
-            self._convert_to_usd(currency=self.from_this)
-            self._convert_to_usd(currency=self.to)
+    def _convert_to(self, to: CurrencyDatabase) -> OutputConversionSchema:
+        if self.from_this.backed_by != to.backed_by:
+            from_rate = self.snapshot.resolver.usd_rate(self.from_this.currency_code)
+            to_rate = self.snapshot.resolver.usd_rate(to.currency_code)
+        else:
+            from_rate = self.from_this.rate
+            to_rate = to.rate
 
-        amount_in_usd = self.amount / self.from_this.rate
-        converted_value = amount_in_usd * self.to.rate
+        amount_in_usd = self.amount / from_rate
+        converted_value = amount_in_usd * to_rate
 
-        return OutputConversionSchema(
+        # Every field comes from trusted snapshot rows, so the output is not validated again
+        return OutputConversionSchema.construct(
             from_this=self.from_this.currency_code,
-            to=self.to.currency_code,
+            to=to.currency_code,
             amount=self.amount,
+            at=self.at,
             converted_value=round(converted_value, 2),
             updated_at=self.from_this.updated_at,
         )
+
+    def convert_currencies(self) -> OutputConversionSchema:
+        return self._convert_to(to=self.to)
+
+    def convert_currencies_many(self) -> List[OutputConversionSchema]:
+        """Converts the amount into every requested currency"""
+
+        return [self._convert_to(to=to) for to in self.targets]
+
+    @classmethod
+    def conversions(
+        cls,
+        from_this: str,
+        to: str,
+        amount: float,
+        db: Session,
+        snapshot: Optional[RateSnapshot] = None,
+        at: Optional[datetime] = None,
+    ) -> List[OutputConversionSchema]:
+        """Converts the amount into every requested currency, conversions `at` a moment going through the
+        rate cache, since their rates are read from the history
+
+        Every write appending history also changes the current rows, so keying by the snapshot fingerprint
+        drops cached conversions whenever the history they were read from moves.
+        """
+
+        snapshot = snapshot or rate_snapshot_store.current(db=db)
+
+        def convert() -> List[OutputConversionSchema]:
+            return cls(
+                from_this=from_this,
+                to=to,
+                amount=amount,
+                db=db,
+                snapshot=snapshot,
+                at=at,
+            ).convert_currencies_many()
+
+        if at is None:
+            return convert()
+        return rate_cache.get_or_build(
+            _conversion_cache_key(
+                from_this=from_this, to=to, amount=amount, at=at, snapshot=snapshot
+            ),
+            convert,
+            encode=lambda conversions: [
+                conversion.__dict__ for conversion in conversions
+            ],
+            decode=_decode_conversions,
+        )
+
+
+class AsyncConvertOperator(ConvertOperator):
+    """Async counterpart of `ConvertOperator`, only awaiting the database when the rate snapshot is not loaded yet"""
+
+    @classmethod
+    async def conversions(
+        cls,
+        from_this: str,
+        to: str,
+        amount: float,
+        db: AsyncSession,
+        snapshot: Optional[RateSnapshot] = None,
+        at: Optional[datetime] = None,
+    ) -> List[OutputConversionSchema]:
+        snapshot = snapshot or await rate_snapshot_store.current_async(db=db)
+        if at is None:
+            return cls(
+                from_this=from_this, to=to, amount=amount, db=db, snapshot=snapshot
+            ).convert_currencies_many()
+        # Rates older than the in-memory history are read from the database, once for concurrent
+        # identical conversions, which would otherwise block the event loop on each other in the cache
+        return await async_conversion_loads.do_async(
+            _conversion_cache_key(
+                from_this=from_this, to=to, amount=amount, at=at, snapshot=snapshot
+            ),
+            lambda: db.run_sync(
+                lambda session: ConvertOperator.conversions(
+                    from_this=from_this,
+                    to=to,
+                    amount=amount,
+                    db=session,
+                    snapshot=snapshot,
+                    at=at,
+                )
+            ),
+        )
+
+
+async_conversion_loads = SingleFlight(timeout=settings.single_flight_timeout)
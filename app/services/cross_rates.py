@@ -0,0 +1,82 @@
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.schemas.convert import (
+    CompactCrossRateMatrixResponse,
+    CrossRateLayout,
+    CrossRateMatrixResponse,
+)
+from app.services.snapshot import RateSnapshot, rate_snapshot_store
+
+
+class CrossRateOperator:
+    """Builds the cross-rate matrix between currencies in one vectorized pass over their USD rates"""
+
+    def __init__(
+        self,
+        codes: Optional[str],
+        db: Optional[Session],
+        snapshot: Optional[RateSnapshot] = None,
+    ) -> None:
+        self.snapshot = snapshot or rate_snapshot_store.current(db=db)
+        self.codes = (
+            tuple(
+                dict.fromkeys(
+                    code.strip().upper() for code in codes.split(",") if code.strip()
+                )
+            )
+            if codes
+            else None
+        )
+
+    def _usd_rates(self) -> Tuple[List[str], np.ndarray]:
+        """Returns requested codes with their USD rates, or every resolvable currency when no codes were requested"""
+
+        resolver = self.snapshot.resolver
+        if self.codes:
+            usd_rates = [resolver.usd_rate(code) for code in self.codes]
+            for code, usd_rate in zip(self.codes, usd_rates):
+                # Raises an HTTP exception if a currency cannot be divided by
+                if usd_rate <= 0:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail=f"Currency code {code} has no valid rate",
+                    )
+            return list(self.codes), np.array(usd_rates, dtype=np.float64)
+
+        codes, usd_rates = [], []
+        for currency in self.snapshot.currencies:
+            try:
+                usd_rate = resolver.usd_rate(currency.currency_code)
+            except HTTPException:
+                continue
+            if usd_rate > 0:
+                codes.append(currency.currency_code)
+                usd_rates.append(usd_rate)
+        return codes, np.array(usd_rates, dtype=np.float64)
+
+    def _build_matrix(
+        self, layout: CrossRateLayout
+    ) -> Union[CrossRateMatrixResponse, CompactCrossRateMatrixResponse]:
+        codes, usd_rates = self._usd_rates()
+        # Row currency to column currency: units of `codes[j]` bought by one unit of `codes[i]`
+        matrix = usd_rates[np.newaxis, :] / usd_rates[:, np.newaxis]
+        rows = matrix.tolist()
+
+        if layout == CrossRateLayout.compact:
+            return CompactCrossRateMatrixResponse.construct(codes=codes, rows=rows)
+        return CrossRateMatrixResponse.construct(
+            data={code: dict(zip(codes, row)) for code, row in zip(codes, rows)}
+        )
+
+    def cross_rates(
+        self, layout: CrossRateLayout
+    ) -> Union[CrossRateMatrixResponse, CompactCrossRateMatrixResponse]:
+        """Returns the matrix for the current snapshot, computing it only once per snapshot version"""
+
+        return self.snapshot.cached(
+            ("cross_rates", self.codes, layout), lambda: self._build_matrix(layout)
+        )
@@ -3,10 +3,16 @@ from typing import List, Optional, Union
 
 from fastapi import HTTPException, status
 from pydantic import BaseModel, validator
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Query, Session
 
-from app.models import CoinbaseCurrenciesPublicApiModel, FictitiousCoinModel
-from app.schemas.currency import CurrencyDatabase
+from app.models import (COINBASE_CURRENCY_TYPE,
+                        CoinbaseCurrenciesPublicApiModel, CurrencyModel,
+                        FictitiousCoinModel)
+from app.schemas.currency import Currency, CurrencyDatabase
+from app.services.history import record_rate_history
+from app.services.rate_changes import publish_currency_change
+from app.services.snapshot import RateSnapshot, rate_snapshot_store
 
 
 class CurrencyService(BaseModel):
@@ -20,59 +26,69 @@ class CurrencyService(BaseModel):
 
         return currency_code.upper()
 
-    def _query_coinbase_api_fictitious_union(self, db: Session) -> Query:
+    def _find_currency_in_db(self, db: Session) -> Union[CurrencyDatabase, None]:
+        """If currency exists in `currencies` returns it else return `None`"""
 
-        coinbase_api_table_query = db.query(CoinbaseCurrenciesPublicApiModel).filter(
-            CoinbaseCurrenciesPublicApiModel.currency_code == self.currency_code
-        )
-        fictitious_table_query = db.query(FictitiousCoinModel).filter(
-            FictitiousCoinModel.currency_code == self.currency_code
+        return (
+            db.query(CurrencyModel)
+            .filter(CurrencyModel.currency_code == self.currency_code)
+            .one_or_none()
         )
-        return coinbase_api_table_query.union(fictitious_table_query)
 
-    def _find_currency_in_db(self, db: Session) -> Union[CurrencyDatabase, None]:
-        """If currency exists in `coinbase_api_currencies` or `fictitious_currencies` returns it else return `None`"""
+    def _find_backed_currency_in_db(self, db: Session) -> Union[CurrencyDatabase, None]:
+        """If backed currency exists in `currencies` returns it else returns `None`"""
 
-        return self._query_coinbase_api_fictitious_union(db=db).first()
+        return CurrencyService(currency_code=self.backed_by)._find_currency_in_db(db=db)
 
-    def _find_backed_currency_in_db(self, db: Session) -> Union[CurrencyDatabase, None]:
-        """If backed currency exists in `coinbase_api_currencies` returns it else returns `None`"""
+    def _find_dependant_currency_in_db(
+        self, db: Session, currency_code: str
+    ) -> Union[FictitiousCoinModel, None]:
+        """If a fictitious currency is backed by `currency_code` returns it else returns `None`"""
 
-        coinbase_api_table_query = db.query(CoinbaseCurrenciesPublicApiModel).filter(
-            CoinbaseCurrenciesPublicApiModel.currency_code == self.backed_by
+        return (
+            db.query(FictitiousCoinModel)
+            .filter(
+                FictitiousCoinModel.backed_by == currency_code,
+                FictitiousCoinModel.currency_code != currency_code,
+            )
+            .first()
         )
-        return coinbase_api_table_query.first()
-
-    def read_all(self, db: Session) -> List:
-        """Returns a list of currencies from `coinbase_api_currencies` and `fictitious_currencies` tables"""
-
-        coinbase_api_table_query = db.query(
-            CoinbaseCurrenciesPublicApiModel.currency_code.label("currency_code"),
-            CoinbaseCurrenciesPublicApiModel.rate,
-            CoinbaseCurrenciesPublicApiModel.backed_by,
-            CoinbaseCurrenciesPublicApiModel.updated_at,
-            CoinbaseCurrenciesPublicApiModel.currency_type,
-        ).order_by(CoinbaseCurrenciesPublicApiModel.currency_code)
-
-        fictitious_table_query = db.query(
-            FictitiousCoinModel.currency_code.label("currency_code"),
-            FictitiousCoinModel.rate,
-            FictitiousCoinModel.backed_by,
-            FictitiousCoinModel.updated_at,
-            FictitiousCoinModel.currency_type,
-        ).order_by(FictitiousCoinModel.currency_code)
 
-        return (
-            coinbase_api_table_query.union(fictitious_table_query)
-            .order_by("currency_code")
-            .all()
+    def _backed_currency_chain_reaches(self, db: Session, currency_codes: set) -> bool:
+        """Returns `True` if the `backed_by` chain starting at the backed currency goes through any of `currency_codes`"""
+
+        visited_codes = set()
+        code = self.backed_by
+        while code not in visited_codes:
+            if code in currency_codes:
+                return True
+            visited_codes.add(code)
+            currency = CurrencyService(currency_code=code)._find_currency_in_db(db=db)
+            if not currency:
+                return False
+            code = currency.backed_by
+        return False
+
+    def _history_entry(self) -> Currency:
+        return Currency(
+            currency_code=self.currency_code, rate=self.rate, backed_by=self.backed_by
         )
 
-    def read(self, db: Session) -> CurrencyDatabase:
-        """If currency exists in `coinbase_api_currencies` or `fictitious_currencies` returns it else return `None`"""
+    def read_all(
+        self, db: Session, snapshot: Optional[RateSnapshot] = None
+    ) -> List[CurrencyDatabase]:
+        """Returns a list of currencies from `currencies` table"""
+
+        return (snapshot or rate_snapshot_store.current(db=db)).currencies
+
+    def read(
+        self, db: Session, snapshot: Optional[RateSnapshot] = None
+    ) -> CurrencyDatabase:
+        """If currency exists in `currencies` returns it else return `None`"""
 
-        if currency := self._find_currency_in_db(db=db):
-            return CurrencyDatabase.from_orm(currency)
+        snapshot = snapshot or rate_snapshot_store.current(db=db)
+        if currency := snapshot.get(self.currency_code):
+            return currency
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -80,7 +96,7 @@ class CurrencyService(BaseModel):
             )
 
     def create(self, db: Session) -> CurrencyDatabase:
-        """Creates a new currency in `fictitious_currencies` if not found in database"""
+        """Creates a new fictitious currency in `currencies` if not found in database"""
 
         # Raises an HTTP exception if currency already exists
         if self._find_currency_in_db(db=db):
@@ -98,12 +114,15 @@ class CurrencyService(BaseModel):
 
         currency = FictitiousCoinModel(**self.dict())
         db.add(currency)
+        record_rate_history(db=db, currencies=[self._history_entry()])
+        publish_currency_change(db=db, added=[self.currency_code])
         db.commit()
         db.refresh(currency)
+        rate_snapshot_store.refresh(db=db)
         return CurrencyDatabase.from_orm(currency)
 
     def update(self, db: Session, original_currency_code: str) -> CurrencyDatabase:
-        """Updated currency in `fictitious_currencies` if found in database"""
+        """Updated fictitious currency in `currencies` if found in database"""
 
         original_currency_code = original_currency_code.upper()
         if (
@@ -133,6 +152,14 @@ class CurrencyService(BaseModel):
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"Original currency code {original_currency_code} not found",
                 )
+            # Raises an HTTP exception if other currencies are backed by the original currency code
+            if dependant := self._find_dependant_currency_in_db(
+                db=db, currency_code=original_currency_code
+            ):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Currency code {original_currency_code} backs currency {dependant.currency_code} and cannot be renamed",
+                )
             # Raises an HTTP exception if new currency code is not found
             if self._find_currency_in_db(db=db):
                 raise HTTPException(
@@ -152,6 +179,15 @@ class CurrencyService(BaseModel):
                 detail=f"Backed currency code {self.backed_by} not found",
             )
 
+        # Raises an HTTP exception if the new backed currency is backed by the updated currency itself
+        if self._backed_currency_chain_reaches(
+            db=db, currency_codes={original_currency_code, self.currency_code}
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Backed currency code {self.backed_by} is backed by {self.currency_code}",
+            )
+
         if original_currency_code != self.currency_code:
             currency_code_db = original_currency_code
         else:
@@ -161,13 +197,21 @@ class CurrencyService(BaseModel):
             FictitiousCoinModel.currency_code == currency_code_db
         )
         currency_db.update(self.dict())
+        record_rate_history(db=db, currencies=[self._history_entry()])
+        if original_currency_code != self.currency_code:
+            publish_currency_change(
+                db=db, added=[self.currency_code], removed=[original_currency_code]
+            )
+        else:
+            publish_currency_change(db=db, changed=[self.currency_code])
         db.commit()
+        rate_snapshot_store.refresh(db=db)
 
         updated_currency = self._find_currency_in_db(db=db)
         return CurrencyDatabase.from_orm(updated_currency)
 
     def delete(self, db: Session):
-        """Delete currency from `fictitious_currencies` if found in database"""
+        """Delete fictitious currency from `currencies` if found in database"""
 
         currency = self._find_currency_in_db(db=db)
 
@@ -179,15 +223,60 @@ class CurrencyService(BaseModel):
             )
 
         # Raises an HTTP exception if currency is an coinbase_api currency
-        if currency.currency_type == "coinbase_api":
+        if currency.currency_type == COINBASE_CURRENCY_TYPE:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail=f"Currency code {self.currency_code} is an coinbase_api currency and cannot be deleted",
             )
 
+        # Raises an HTTP exception if other currencies are backed by this currency
+        if dependant := self._find_dependant_currency_in_db(
+            db=db, currency_code=self.currency_code
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Currency code {self.currency_code} backs currency {dependant.currency_code} and cannot be deleted",
+            )
+
         currency_query = db.query(FictitiousCoinModel).filter(
             FictitiousCoinModel.currency_code == self.currency_code
         )
         currency_query.delete()
+        publish_currency_change(db=db, removed=[self.currency_code])
         db.commit()
+        rate_snapshot_store.refresh(db=db)
         return {"message": f"Currency code {self.currency_code} deleted"}
+
+
+class AsyncCurrencyService(CurrencyService):
+    """Async counterpart of `CurrencyService`: reads come from the rate snapshot and writes run on an `AsyncSession`"""
+
+    async def read_all(
+        self, db: AsyncSession, snapshot: Optional[RateSnapshot] = None
+    ) -> List[CurrencyDatabase]:
+        return (snapshot or await rate_snapshot_store.current_async(db=db)).currencies
+
+    async def read(
+        self, db: AsyncSession, snapshot: Optional[RateSnapshot] = None
+    ) -> CurrencyDatabase:
+        snapshot = snapshot or await rate_snapshot_store.current_async(db=db)
+        return CurrencyService.read(self, db=None, snapshot=snapshot)
+
+    async def create(self, db: AsyncSession) -> CurrencyDatabase:
+        return await db.run_sync(
+            lambda session: CurrencyService.create(self, db=session)
+        )
+
+    async def update(
+        self, db: AsyncSession, original_currency_code: str
+    ) -> CurrencyDatabase:
+        return await db.run_sync(
+            lambda session: CurrencyService.update(
+                self, db=session, original_currency_code=original_currency_code
+            )
+        )
+
+    async def delete(self, db: AsyncSession):
+        return await db.run_sync(
+            lambda session: CurrencyService.delete(self, db=session)
+        )
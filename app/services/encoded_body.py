@@ -0,0 +1,96 @@
+import gzip
+import json
+from typing import Dict, List, Tuple
+
+import brotli
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.schemas.currency import (CurrencyDatabase, CurrencyOut,
+                                  MultipleCurrencyResponse)
+from app.services.fast_json import dumps
+from app.services.snapshot import RateSnapshot
+
+# Preferred first when the client accepts several equally
+ENCODINGS = ("br", "gzip", "identity")
+
+
+def _accepted_encodings(accept_encoding: str) -> List[str]:
+    """Returns the encodings of `ENCODINGS` the client accepts, the most preferred first"""
+
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, parameters = item.strip().partition(";")
+        weight = 1.0
+        if parameters.strip().startswith("q="):
+            try:
+                weight = float(parameters.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    def weight_of(encoding: str) -> float:
+        return weights.get(
+            encoding, weights.get("*", 0.0 if encoding != "identity" else 1.0)
+        )
+
+    accepted = [encoding for encoding in ENCODINGS if weight_of(encoding) > 0]
+    return sorted(accepted, key=lambda encoding: -weight_of(encoding))
+
+
+class EncodedBody:
+    """A JSON response serialized once, with its gzip and Brotli encodings, served as raw bytes
+
+    Serialization matches the one FastAPI applies to `response_model` responses.
+    """
+
+    def __init__(self, model: BaseModel) -> None:
+        content = json.dumps(
+            jsonable_encoder(model),
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode()
+        # Built once per snapshot, so the slowest and smallest settings are worth it
+        self.bodies: Dict[str, bytes] = {
+            "br": brotli.compress(content, quality=11),
+            "gzip": gzip.compress(content, compresslevel=9, mtime=0),
+            "identity": content,
+        }
+
+    def negotiate(self, accept_encoding: str) -> Tuple[str, bytes]:
+        encodings = _accepted_encodings(accept_encoding) or ["identity"]
+        return encodings[0], self.bodies[encodings[0]]
+
+    def response(self, request: Request, headers: Dict[str, str]) -> Response:
+        encoding, body = self.negotiate(request.headers.get("accept-encoding", ""))
+        headers = {**headers, "Vary": "Accept-Encoding"}
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def currency_list_body(snapshot: RateSnapshot) -> EncodedBody:
+    """Returns the body of `GET /currency`, built only once per snapshot version"""
+
+    return snapshot.cached(
+        "currency_list_body",
+        lambda: EncodedBody(
+            MultipleCurrencyResponse(
+                data=[
+                    CurrencyOut(**currency.dict()) for currency in snapshot.currencies
+                ]
+            )
+        ),
+    )
+
+
+def currency_body(snapshot: RateSnapshot, currency: CurrencyDatabase) -> bytes:
+    """Returns the body of `GET /currency/{currency_code}`, built only once per snapshot version"""
+
+    return snapshot.cached(
+        ("currency_body", currency.currency_code),
+        lambda: dumps({"data": CurrencyOut.construct(**currency.dict(exclude={"id"}))}),
+    )
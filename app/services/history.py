@@ -0,0 +1,219 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import ARRAY, Float, func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import (
+    COINBASE_CURRENCY_TYPE,
+    RateHistoryHourlyModel,
+    RateHistoryModel,
+)
+from app.schemas.currency import (
+    Currency,
+    HistoryInterval,
+    RateHistoryBucket,
+    RateHistoryResponse,
+)
+from app.services.snapshot import RateSnapshot, rate_snapshot_store
+from app.services.tick_store import from_microseconds, tick_store
+
+INTERVAL_SECONDS = {
+    HistoryInterval.one_minute: 60,
+    HistoryInterval.five_minutes: 300,
+    HistoryInterval.fifteen_minutes: 900,
+    HistoryInterval.one_hour: 3600,
+    HistoryInterval.one_day: 86400,
+}
+
+
+def record_rate_history(db: Session, currencies: Iterable[Currency]) -> None:
+    """Appends the rates to `rate_history` and folds them into their `rate_history_hourly` bucket"""
+
+    rows = [
+        {
+            "currency_code": currency.currency_code,
+            "rate": currency.rate,
+            "backed_by": currency.backed_by,
+        }
+        for currency in currencies
+    ]
+    if not rows:
+        return
+
+    history = (
+        insert(RateHistoryModel)
+        .values(rows)
+        .returning(RateHistoryModel.currency_code, RateHistoryModel.rate)
+        .cte("history")
+    )
+    hourly_insert = insert(RateHistoryHourlyModel).from_select(
+        ["currency_code", "bucket", "open", "high", "low", "close"],
+        select(
+            history.c.currency_code,
+            func.date_trunc("hour", func.now()),
+            history.c.rate,
+            history.c.rate,
+            history.c.rate,
+            history.c.rate,
+        ),
+    )
+    hourly_query = hourly_insert.on_conflict_do_update(
+        index_elements=[
+            RateHistoryHourlyModel.currency_code,
+            RateHistoryHourlyModel.bucket,
+        ],
+        set_={
+            "high": func.greatest(
+                RateHistoryHourlyModel.high, hourly_insert.excluded.high
+            ),
+            "low": func.least(RateHistoryHourlyModel.low, hourly_insert.excluded.low),
+            "close": hourly_insert.excluded.close,
+        },
+    )
+    db.execute(hourly_query)
+
+
+def as_utc(moment: datetime) -> datetime:
+    """Reads timestamps without a timezone as UTC"""
+
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _bucket_start(column, interval_seconds: int):
+    return func.to_timestamp(
+        func.floor(func.extract("epoch", column) / interval_seconds) * interval_seconds
+    )
+
+
+def _first(column, order_by):
+    return func.array_agg(aggregate_order_by(column, order_by), type_=ARRAY(Float))[1]
+
+
+class RateHistoryOperator:
+    """Reads the rate history of one currency downsampled into open, high, low and close buckets
+
+    Buckets of one hour or longer are aggregated from `rate_history_hourly`, so long ranges never scan raw
+    ticks. Shorter buckets of coinbase currencies are aggregated from the memory mapped tick store when it
+    covers the range. Buckets in which the rate did not change are left out, the rate stayed at the previous
+    close.
+    """
+
+    def __init__(
+        self,
+        currency_code: str,
+        from_: Optional[datetime],
+        to: Optional[datetime],
+        interval: HistoryInterval,
+        db: Session,
+        snapshot: Optional[RateSnapshot] = None,
+    ) -> None:
+        self.snapshot = snapshot or rate_snapshot_store.current(db=db)
+        self.currency_code = currency_code.upper()
+        self.interval_seconds = INTERVAL_SECONDS[interval]
+        self.to = as_utc(to) if to else datetime.now(timezone.utc)
+        self.from_ = as_utc(from_) if from_ else self.to - timedelta(days=1)
+        self.db = db
+
+        # Raises an HTTP exception if currency is not found
+        if not self.snapshot.get(self.currency_code):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Currency code {self.currency_code} not found",
+            )
+
+        # Raises an HTTP exception if the range is empty or too long for the interval
+        if self.from_ >= self.to:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="`from` must be before `to`",
+            )
+        buckets = (self.to - self.from_).total_seconds() / self.interval_seconds
+        if buckets > settings.history_max_buckets:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Range spans more than {settings.history_max_buckets} buckets, use a longer interval",
+            )
+
+    def _history_query(self):
+        if self.interval_seconds >= INTERVAL_SECONDS[HistoryInterval.one_hour]:
+            hourly = RateHistoryHourlyModel
+            currency_code, moment = hourly.currency_code, hourly.bucket
+            open_, high, low, close = hourly.open, hourly.high, hourly.low, hourly.close
+            # The hourly bucket holding `from_` starts before it
+            range_start = func.date_trunc("hour", self.from_)
+        else:
+            history = RateHistoryModel
+            currency_code, moment = history.currency_code, history.updated_at
+            open_ = high = low = close = history.rate
+            range_start = self.from_
+
+        bucket = _bucket_start(moment, self.interval_seconds).label("bucket")
+        return (
+            select(
+                bucket,
+                _first(open_, moment.asc()).label("open"),
+                func.max(high).label("high"),
+                func.min(low).label("low"),
+                _first(close, moment.desc()).label("close"),
+            )
+            .where(
+                currency_code == self.currency_code,
+                moment >= range_start,
+                moment < self.to,
+            )
+            .group_by(bucket)
+            .order_by(bucket)
+        )
+
+    def _reads_tick_store(self) -> bool:
+        if (
+            tick_store is None
+            or self.interval_seconds >= INTERVAL_SECONDS[HistoryInterval.one_hour]
+            or self.snapshot.get(self.currency_code).currency_type
+            != COINBASE_CURRENCY_TYPE
+        ):
+            return False
+        covers_from = tick_store.covers_from()
+        return covers_from is not None and covers_from <= self.from_
+
+    def _tick_store_buckets(self) -> List[RateHistoryBucket]:
+        """Aggregates the raw ticks of the range with array operations over the mapped columns"""
+
+        times, rates = tick_store.ticks_between(
+            currency_code=self.currency_code, starts_at=self.from_, ends_at=self.to
+        )
+        if not len(times):
+            return []
+        interval_microseconds = self.interval_seconds * 1_000_000
+        buckets = times // interval_microseconds
+        starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        ends = np.append(starts[1:], len(times)) - 1
+        return [
+            RateHistoryBucket.construct(
+                bucket=from_microseconds(bucket * interval_microseconds),
+                open=open_,
+                high=high,
+                low=low,
+                close=close,
+            )
+            for bucket, open_, high, low, close in zip(
+                buckets[starts].tolist(),
+                rates[starts].tolist(),
+                np.maximum.reduceat(rates, starts).tolist(),
+                np.minimum.reduceat(rates, starts).tolist(),
+                rates[ends].tolist(),
+            )
+        ]
+
+    def history(self) -> RateHistoryResponse:
+        if self._reads_tick_store():
+            return RateHistoryResponse.construct(data=self._tick_store_buckets())
+        rows = self.db.execute(self._history_query()).all()
+        return RateHistoryResponse.construct(
+            data=[RateHistoryBucket.construct(**row._mapping) for row in rows]
+        )
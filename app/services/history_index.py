@@ -0,0 +1,243 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import cast, column, func, select, true
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+from sqlalchemy.types import String
+
+from app.config import settings
+from app.models import RateHistoryModel
+from app.services.backing_chain import BackingChainResolver
+from app.services.history import as_utc
+from app.services.snapshot import RateSnapshot
+
+
+class HistoricalRate(NamedTuple):
+    currency_code: str
+    rate: float
+    backed_by: str
+    updated_at: datetime
+
+
+def _history_columns():
+    return (
+        RateHistoryModel.currency_code,
+        RateHistoryModel.rate,
+        RateHistoryModel.backed_by,
+        RateHistoryModel.updated_at,
+    )
+
+
+def query_last_rates_before(
+    db: Session, currency_codes: List[str], before: datetime
+) -> List[HistoricalRate]:
+    """Returns the last rate each currency had before `before`, one probe of the history index per code"""
+
+    codes = (
+        func.unnest(cast(currency_codes, ARRAY(String)))
+        .table_valued(column("currency_code", String))
+        .render_derived()
+    )
+    last_rate = (
+        select(*_history_columns())
+        .where(
+            RateHistoryModel.currency_code == codes.c.currency_code,
+            RateHistoryModel.updated_at < before,
+        )
+        .order_by(RateHistoryModel.updated_at.desc())
+        .limit(1)
+        .lateral()
+    )
+    rows = db.execute(
+        select(last_rate).select_from(codes).join(last_rate, true())
+    ).all()
+    return [HistoricalRate(*row) for row in rows]
+
+
+def _query_last_rate_at(
+    db: Session, currency_code: str, at: datetime
+) -> Optional[HistoricalRate]:
+    row = db.execute(
+        select(*_history_columns())
+        .where(
+            RateHistoryModel.currency_code == currency_code,
+            RateHistoryModel.updated_at <= at,
+        )
+        .order_by(RateHistoryModel.updated_at.desc())
+        .limit(1)
+    ).one_or_none()
+    return HistoricalRate(*row) if row else None
+
+
+class RateHistoryIndex:
+    """In-memory copy of the last `window` seconds of `rate_history`, one sorted array per currency
+
+    Each array also starts with the last rate its currency had before the window, so any moment inside the
+    window is answered by a single bisect. Older moments are read from the database. The index is synced
+    whenever the rate snapshot changes, re-reading the last `overlap` seconds so rows committed late by
+    long transactions are not missed.
+    """
+
+    def __init__(self, window: float, overlap: float) -> None:
+        self.window = timedelta(seconds=window)
+        self.overlap = timedelta(seconds=overlap)
+        # Held while loading from the database, so only one request syncs at a time
+        self._sync_lock = threading.Lock()
+        # Held while the arrays are read or changed
+        self._lock = threading.Lock()
+        self._times: Dict[str, List[float]] = {}
+        self._rates: Dict[str, List[HistoricalRate]] = {}
+        # Currencies whose last rate before `starts_at` was looked up
+        self._seeded: Set[str] = set()
+        self.starts_at: Optional[datetime] = None
+        self.loaded_until: Optional[datetime] = None
+        self.version: Optional[int] = None
+
+    def clear(self) -> None:
+        """Drops the loaded history so the next sync loads it again"""
+
+        with self._lock:
+            self._times, self._rates, self._seeded = {}, {}, set()
+            self.starts_at = self.loaded_until = self.version = None
+
+    def _append(self, rates: Iterable[HistoricalRate]) -> None:
+        for rate in rates:
+            self._times.setdefault(rate.currency_code, []).append(
+                rate.updated_at.timestamp()
+            )
+            self._rates.setdefault(rate.currency_code, []).append(rate)
+
+    def _prepend(self, rates: Iterable[HistoricalRate]) -> None:
+        for rate in rates:
+            self._times.setdefault(rate.currency_code, []).insert(
+                0, rate.updated_at.timestamp()
+            )
+            self._rates.setdefault(rate.currency_code, []).insert(0, rate)
+
+    def _truncate(self, since: datetime) -> None:
+        """Drops every rate from `since` on"""
+
+        since_timestamp = since.timestamp()
+        for currency_code, times in self._times.items():
+            index = bisect_left(times, since_timestamp)
+            del times[index:]
+            del self._rates[currency_code][index:]
+
+    def _trim(self, before: datetime) -> None:
+        """Drops the rates older than `before`, keeping the last one before it as the seed"""
+
+        before_timestamp = before.timestamp()
+        for currency_code, times in self._times.items():
+            index = bisect_right(times, before_timestamp) - 1
+            if index > 0:
+                del times[:index]
+                del self._rates[currency_code][:index]
+        self.starts_at = before
+
+    def sync(self, db: Session, snapshot: RateSnapshot) -> None:
+        """Loads the rates appended since the last sync, unless the index already matches `snapshot`"""
+
+        if self.version == snapshot.version:
+            return
+        with self._sync_lock:
+            if self.version == snapshot.version:
+                return
+
+            now = db.execute(select(func.now())).scalar_one()
+            starts_at = self.starts_at or now - self.window
+            if self.loaded_until is None:
+                since = starts_at
+            else:
+                since = max(self.loaded_until - self.overlap, starts_at)
+            history_query = (
+                select(*_history_columns())
+                .where(RateHistoryModel.updated_at >= since)
+                .order_by(RateHistoryModel.updated_at, RateHistoryModel.id)
+            )
+            rates = [HistoricalRate(*row) for row in db.execute(history_query)]
+            unseeded_codes = [
+                currency.currency_code
+                for currency in snapshot.currencies
+                if currency.currency_code not in self._seeded
+            ]
+            seeds = (
+                query_last_rates_before(
+                    db=db, currency_codes=unseeded_codes, before=starts_at
+                )
+                if unseeded_codes
+                else []
+            )
+
+            with self._lock:
+                self.starts_at = starts_at
+                self._truncate(since=since)
+                self._append(rates)
+                self._prepend(seeds)
+                self._seeded.update(unseeded_codes)
+                if now - starts_at > 2 * self.window:
+                    self._trim(before=now - self.window)
+                self.loaded_until = now
+                self.version = snapshot.version
+
+    def rate_at(
+        self, db: Session, currency_code: str, at: datetime
+    ) -> Optional[HistoricalRate]:
+        """Returns the last rate `currency_code` had at `at`, or `None` when it has no history by then"""
+
+        with self._lock:
+            if (
+                self.starts_at is not None
+                and at >= self.starts_at
+                and currency_code in self._seeded
+            ):
+                times = self._times.get(currency_code, [])
+                index = bisect_right(times, at.timestamp()) - 1
+                return self._rates[currency_code][index] if index >= 0 else None
+        return _query_last_rate_at(db=db, currency_code=currency_code, at=at)
+
+
+class PointInTimeRates:
+    """Rates of every currency as they were at `at`, read like a `RateSnapshot`
+
+    A currency without history by `at` resolves to its current row when that row was last updated by then,
+    which covers currencies written before the history was recorded.
+    """
+
+    def __init__(
+        self, at: datetime, db: Session, snapshot: RateSnapshot, index: RateHistoryIndex
+    ) -> None:
+        self.at = as_utc(at)
+        self.db = db
+        self.snapshot = snapshot
+        self.index = index
+        self._currencies: Dict[str, Optional[HistoricalRate]] = {}
+        self.resolver = BackingChainResolver(find_currency=self.get)
+        index.sync(db=db, snapshot=snapshot)
+
+    def _find_currency(self, currency_code: str) -> Optional[HistoricalRate]:
+        if rate := self.index.rate_at(
+            db=self.db, currency_code=currency_code, at=self.at
+        ):
+            return rate
+        current = self.snapshot.get(currency_code)
+        if current and as_utc(current.updated_at) <= self.at:
+            return HistoricalRate(
+                current.currency_code,
+                current.rate,
+                current.backed_by,
+                current.updated_at,
+            )
+        return None
+
+    def get(self, currency_code: str) -> Optional[HistoricalRate]:
+        if currency_code not in self._currencies:
+            self._currencies[currency_code] = self._find_currency(currency_code)
+        return self._currencies[currency_code]
+
+
+rate_history_index = RateHistoryIndex(
+    window=settings.history_index_window, overlap=settings.history_index_overlap
+)
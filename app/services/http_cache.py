@@ -0,0 +1,69 @@
+import time
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict
+
+from fastapi import Request, Response, status
+
+from app.config import settings
+from app.services.snapshot import RateSnapshot, rate_snapshot_store
+
+
+class ConditionalRead:
+    """Validators of a read served from `snapshot`, answering 304 when the client already holds it
+
+    The response only changes with the snapshot, so the check needs neither the database nor the handler.
+    """
+
+    def __init__(self, request: Request, snapshot: RateSnapshot) -> None:
+        self.request = request
+        self.snapshot = snapshot
+
+    def _max_age(self) -> int:
+        """Seconds until the next tick of the feeder, which is when the rates may change"""
+
+        interval = settings.rate_update_interval
+        if self.snapshot.fed_at is None:
+            return int(interval)
+        elapsed = time.time() - self.snapshot.fed_at.timestamp()
+        return max(int(interval - elapsed % interval), 0)
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "ETag": self.snapshot.etag,
+            "Cache-Control": f"public, max-age={self._max_age()}",
+            # Age of the rates, clients reject older ones with a `Max-Staleness` request header
+            "Staleness": str(int(self.snapshot.staleness())),
+        }
+        if rate_snapshot_store.failing_since is not None:
+            # Served from the last good snapshot while the database cannot be read
+            headers["Warning"] = '111 - "Revalidation Failed"'
+        if self.snapshot.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(
+                self.snapshot.last_modified.astimezone(timezone.utc), usegmt=True
+            )
+        return headers
+
+    def is_fresh(self) -> bool:
+        """Evaluates `If-None-Match`, or `If-Modified-Since` when it is absent"""
+
+        if if_none_match := self.request.headers.get("if-none-match"):
+            etags = {
+                etag.strip().removeprefix("W/") for etag in if_none_match.split(",")
+            }
+            return "*" in etags or self.snapshot.etag in etags
+        if_modified_since = self.request.headers.get("if-modified-since")
+        if not if_modified_since or self.snapshot.last_modified is None:
+            return False
+        try:
+            modified_since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if modified_since.tzinfo is None:
+            return False
+        # HTTP dates have no fraction of a second
+        return self.snapshot.last_modified.timestamp() < modified_since.timestamp() + 1
+
+    def not_modified(self) -> Response:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=self.headers)
@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import orjson
+
+from app.config import settings
+from app.services.single_flight import SingleFlight
+
+# Returned by `LocalCache.get` on a miss, values themselves may be `None`
+_MISSING = object()
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class LocalCache:
+    """In-process LRU cache of at most `max_entries` entries, each expiring `ttl` seconds after being set"""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Returns the value of `key`, or `_MISSING` when it is absent or expired"""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.stats.evictions += 1
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class FakeRedis:
+    """In-memory stand-in for the few Redis commands `SharedCache` sends, for tests and single node runs
+
+    Bounded to `max_entries` keys, evicting the least recently used one like Redis' `allkeys-lru` policy.
+    """
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._evicted_keys = 0
+        self._expired_keys = 0
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                del self._entries[name]
+                self._expired_keys += 1
+                return None
+            self._entries.move_to_end(name)
+            return entry[1]
+
+    def set(self, name: str, value: bytes, ex: Optional[float] = None) -> bool:
+        with self._lock:
+            expires_at = time.monotonic() + ex if ex is not None else None
+            self._entries[name] = (expires_at, value)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evicted_keys += 1
+        return True
+
+    def info(self, section: Optional[str] = None) -> Dict[str, int]:
+        return {
+            "evicted_keys": self._evicted_keys,
+            "expired_keys": self._expired_keys,
+        }
+
+    def flushdb(self) -> bool:
+        with self._lock:
+            self._entries.clear()
+        return True
+
+
+class SharedCache:
+    """Cache shared by every API node through a Redis protocol `client`, values stored as bytes
+
+    Unreachable Redis counts as a miss, so nodes fall back to the database instead of failing requests.
+    """
+
+    def __init__(self, client: Any, ttl: float, prefix: str = "rates:") -> None:
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception:
+            self.errors += 1
+            value = None
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        try:
+            self.client.set(self.prefix + key, value, ex=self.ttl)
+        except Exception:
+            self.errors += 1
+
+    def evictions(self) -> int:
+        """Keys Redis dropped for lack of memory, over every client of the server"""
+
+        try:
+            return int(self.client.info("stats").get("evicted_keys", 0))
+        except Exception:
+            self.errors += 1
+            return 0
+
+
+class TieredCache:
+    """Looks values up in the process' `local` cache, then in the `shared` one, and only then builds them
+
+    Keys hold the fingerprint of the snapshot the value was built from, so entries of older snapshots stop
+    being read as soon as the rates change, and every node loading the same rows shares the same keys.
+    """
+
+    def __init__(
+        self, local: LocalCache, shared: SharedCache, build_timeout: float = 5.0
+    ) -> None:
+        self.local = local
+        self.shared = shared
+        self.builds = SingleFlight(timeout=build_timeout)
+
+    def get_or_build(
+        self,
+        key: str,
+        build: Callable[[], Any],
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value,
+    ) -> Any:
+        """Returns the value of `key`, building it with `build` when no tier holds it
+
+        `encode` turns the value into what `orjson` serializes for the shared tier, `decode` reverses it.
+        """
+
+        value = self.local.get(key)
+        if value is not _MISSING:
+            return value
+
+        def load() -> Any:
+            if (shared_value := self.shared.get(key)) is not None:
+                value = decode(orjson.loads(shared_value))
+            else:
+                value = build()
+                self.shared.set(key, orjson.dumps(encode(value)))
+            self.local.set(key, value)
+            return value
+
+        # Concurrent misses of `key` share one load
+        return self.builds.do(key, load)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        shared_stats = self.shared.stats.as_dict()
+        shared_stats["evictions"] = self.shared.evictions()
+        shared_stats["errors"] = self.shared.errors
+        return {"local": self.local.stats.as_dict(), "shared": shared_stats}
+
+
+def _shared_client() -> Any:
+    if settings.rate_cache_redis_url is None:
+        return FakeRedis(max_entries=settings.rate_cache_local_entries)
+    # Only needed by deployments sharing the cache between nodes
+    import redis
+
+    return redis.Redis.from_url(
+        settings.rate_cache_redis_url,
+        socket_timeout=settings.rate_cache_redis_timeout,
+        socket_connect_timeout=settings.rate_cache_redis_timeout,
+    )
+
+
+rate_cache = TieredCache(
+    local=LocalCache(
+        max_entries=settings.rate_cache_local_entries,
+        ttl=settings.rate_cache_local_ttl,
+    ),
+    shared=SharedCache(client=_shared_client(), ttl=settings.rate_cache_shared_ttl),
+    build_timeout=settings.single_flight_timeout,
+)
@@ -0,0 +1,134 @@
+import json
+import logging
+import threading
+from select import select as wait_readable
+from typing import Callable, Iterable, Optional
+
+import psycopg2
+from sqlalchemy import String, cast, func, insert, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SQLALCHEMY_DATABASE_URL
+from app.models import CurrencyChangeModel
+from app.services.snapshot import RateSnapshotStore, rate_snapshot_store
+
+logger = logging.getLogger(__name__)
+
+CURRENCY_CHANGES_CHANNEL = "currency_changes"
+
+
+def publish_currency_change(
+    db: Session,
+    added: Iterable[str] = (),
+    changed: Iterable[str] = (),
+    removed: Iterable[str] = (),
+) -> int:
+    """Logs the change in `currency_changes` and notifies every listener once the transaction commits
+
+    Returns the version of the logged change.
+    """
+
+    added, changed, removed = list(added), list(changed), list(removed)
+    change = (
+        insert(CurrencyChangeModel)
+        .values(added=added, changed=changed, removed=removed)
+        .returning(CurrencyChangeModel.version)
+        .cte("change")
+    )
+    # Arguments are cast explicitly, as asyncpg cannot infer types for `json_build_object`
+    payload = func.json_build_object(
+        cast("version", String),
+        change.c.version,
+        cast("codes", String),
+        cast(added + changed + removed, ARRAY(String)),
+    )
+    notify_query = select(
+        change.c.version,
+        func.pg_notify(CURRENCY_CHANGES_CHANNEL, cast(payload, String)),
+    )
+    return db.execute(notify_query).scalar_one()
+
+
+class RateChangeListener:
+    """Refreshes a `RateSnapshotStore` as soon as a rate change is notified on `CURRENCY_CHANGES_CHANNEL`
+
+    Notifications sent while disconnected are lost, so every connection starts with a full resync.
+    """
+
+    poll_timeout = 1.0
+
+    def __init__(
+        self, dsn: str, store: RateSnapshotStore, reconnect_interval: float
+    ) -> None:
+        self.dsn = dsn
+        self.store = store
+        self.reconnect_interval = reconnect_interval
+        self.last_version: Optional[int] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _refresh(self, session_factory: Callable[[], Session]) -> None:
+        db = session_factory()
+        try:
+            self.store.refresh(db=db, force=False)
+        finally:
+            db.close()
+
+    def _listen(self, session_factory: Callable[[], Session]) -> None:
+        connection = psycopg2.connect(self.dsn)
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CURRENCY_CHANGES_CHANNEL}")
+            self._refresh(session_factory=session_factory)
+
+            while not self._stop_event.is_set():
+                if not wait_readable([connection], [], [], self.poll_timeout)[0]:
+                    continue
+                connection.poll()
+                if not connection.notifies:
+                    continue
+                # Every pending notification is served by a single refresh
+                for notify in connection.notifies:
+                    self.last_version = json.loads(notify.payload)["version"]
+                connection.notifies.clear()
+                self._refresh(session_factory=session_factory)
+        finally:
+            connection.close()
+
+    def _listen_forever(self, session_factory: Callable[[], Session]) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self._listen(session_factory=session_factory)
+            except Exception:
+                logger.exception("Rate change listener failed, reconnecting")
+                self._stop_event.wait(self.reconnect_interval)
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """Starts a daemon thread listening for rate changes until `stop` is called"""
+
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._listen_forever,
+            args=(session_factory,),
+            name="rate-change-listener",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+rate_change_listener = RateChangeListener(
+    dsn=SQLALCHEMY_DATABASE_URL,
+    store=rate_snapshot_store,
+    reconnect_interval=settings.rate_change_reconnect_interval,
+)
@@ -0,0 +1,336 @@
+import fcntl
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.schemas.currency import CurrencyDatabase
+from app.services.snapshot import RateSnapshot, RateSnapshotStore, rate_snapshot_store
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MAGIC = b"RATES001"
+CODE_SIZE = 32
+# Count of a copy whose snapshot did not fit, readers load it from the database instead
+OVERFLOW = np.iinfo(np.uint64).max
+NO_CHANGE = np.iinfo(np.int64).min
+
+HEADER_DTYPE = np.dtype(
+    [("magic", "S8"), ("capacity", "<u8"), ("sequence", "<u8")], align=True
+)
+SLOT_DTYPE = np.dtype(
+    [
+        ("currency_code", f"S{CODE_SIZE}"),
+        ("backed_by", f"S{CODE_SIZE}"),
+        ("currency_type", "S16"),
+        ("id", "<i8"),
+        ("rate", "<f8"),
+        # Epoch microseconds and UTC offset in seconds, so every worker renders the same `updated_at`
+        ("updated_at", "<i8"),
+        ("utc_offset", "<i8"),
+    ],
+    align=True,
+)
+
+
+def _copy_dtype(capacity: int) -> np.dtype:
+    return np.dtype(
+        [
+            ("count", "<u8"),
+            ("fingerprint", "S32"),
+            ("changed_at", "<i8"),
+            ("slots", SLOT_DTYPE, (capacity,)),
+        ],
+        align=True,
+    )
+
+
+def _file_size(capacity: int) -> int:
+    return HEADER_DTYPE.itemsize + 2 * _copy_dtype(capacity).itemsize
+
+
+def _to_microseconds(moment: datetime) -> int:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_slot(updated_at: int, utc_offset: int) -> datetime:
+    moment = EPOCH + timedelta(microseconds=updated_at)
+    return moment.astimezone(timezone(timedelta(seconds=utc_offset)))
+
+
+class SharedRates(NamedTuple):
+    currencies: List[CurrencyDatabase]
+    fingerprint: Tuple
+    changed_at: Optional[datetime]
+
+
+class SharedRateTable:
+    """Rates of every currency in a memory mapped file shared by the API workers of a host
+
+    One worker per host holds the lock file and is the only one refreshing from the database, publishing
+    each new snapshot into the table. The other workers poll the table's sequence and swap in its rates,
+    never querying the database for them.
+
+    The table holds two copies of the rates behind a latch sequence: the writer bumps the sequence, so
+    readers move to the second copy, rewrites the first, bumps it again, and rewrites the second. Readers
+    never wait, they read the copy picked by the sequence and retry when it moved meanwhile, so a torn copy
+    is never used. The sequence is one aligned word, written and read whole.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int,
+        poll_interval: float,
+        store: RateSnapshotStore,
+    ) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+        self.store = store
+        self.is_writer = False
+        self._lock_file = None
+        self._inode: Optional[int] = None
+        self._header = None
+        self._copies = None
+        self._read_sequence: Optional[int] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _create(self) -> None:
+        """Writes an empty table in a new file and swaps it in, so readers never map a partial one"""
+
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        table = np.memmap(
+            temporary_path,
+            dtype=np.uint8,
+            mode="w+",
+            shape=(_file_size(self.capacity),),
+        )
+        header = table[: HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        header["magic"], header["capacity"] = MAGIC, self.capacity
+        table.flush()
+        del table
+        os.replace(temporary_path, self.path)
+
+    def _map(self) -> bool:
+        """Maps the table file again when it was replaced, returning whether one is mapped"""
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._header = self._copies = self._inode = None
+            return False
+        if stat.st_ino == self._inode:
+            return True
+        table = np.memmap(self.path, dtype=np.uint8, mode="r+")
+        header = table[: HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        capacity = int(header["capacity"][0])
+        if header["magic"][0] != MAGIC or len(table) != _file_size(capacity):
+            logger.error("Ignoring shared rate table %s with another layout", self.path)
+            return False
+        self._header = header
+        self._copies = table[HEADER_DTYPE.itemsize :].view(_copy_dtype(capacity))
+        self._inode = stat.st_ino
+        self._read_sequence = None
+        return True
+
+    def _try_lock(self) -> bool:
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    @staticmethod
+    def _write_copy(copy, snapshot: RateSnapshot, capacity: int) -> None:
+        currencies = snapshot.currencies
+        copy["fingerprint"] = (snapshot.fingerprint[0] or "").encode()
+        copy["changed_at"] = (
+            _to_microseconds(snapshot.changed_at)
+            if snapshot.changed_at is not None
+            else NO_CHANGE
+        )
+        fits = len(currencies) <= capacity and all(
+            len(currency.currency_code.encode()) <= CODE_SIZE
+            and len(currency.backed_by.encode()) <= CODE_SIZE
+            for currency in currencies
+        )
+        if not fits:
+            copy["count"] = OVERFLOW
+            return
+        slots = copy["slots"]
+        for index, currency in enumerate(currencies):
+            updated_at = currency.updated_at
+            utc_offset = updated_at.utcoffset() if updated_at.tzinfo else None
+            slots[index] = (
+                currency.currency_code.encode(),
+                currency.backed_by.encode(),
+                currency.currency_type.encode(),
+                currency.id,
+                currency.rate,
+                _to_microseconds(updated_at),
+                int(utc_offset.total_seconds()) if utc_offset else 0,
+            )
+        copy["count"] = len(currencies)
+
+    def publish(self, snapshot: RateSnapshot) -> None:
+        """Writes `snapshot` into both copies of the table, readers always having one consistent copy"""
+
+        if not self._map():
+            return
+        sequence = int(self._header["sequence"][0])
+        capacity = len(self._copies[0]["slots"])
+        self._header["sequence"] = sequence + 1
+        self._write_copy(self._copies[sequence & 1], snapshot, capacity)
+        self._header["sequence"] = sequence + 2
+        self._write_copy(self._copies[(sequence + 1) & 1], snapshot, capacity)
+        if len(snapshot.currencies) > capacity:
+            logger.error(
+                "%d currencies do not fit the shared rate table of %d, workers read them from the database",
+                len(snapshot.currencies),
+                capacity,
+            )
+
+    def read(self) -> Optional[Tuple[int, Optional[SharedRates]]]:
+        """Returns the sequence and rates of the table, or `None` rates when they overflowed it
+
+        Returns `None` while no table was published yet.
+        """
+
+        if not self._map():
+            return None
+        while True:
+            sequence = int(self._header["sequence"][0])
+            if sequence == 0:
+                return None
+            copy = self._copies[sequence & 1]
+            count = int(copy["count"])
+            fingerprint, changed_at = bytes(copy["fingerprint"]), int(
+                copy["changed_at"]
+            )
+            slots = copy["slots"][: count if count != OVERFLOW else 0].copy()
+            if int(self._header["sequence"][0]) == sequence:
+                break
+        if count == OVERFLOW:
+            return sequence, None
+
+        currencies = [
+            CurrencyDatabase.construct(
+                id=int(slot["id"]),
+                currency_code=slot["currency_code"].decode(),
+                rate=float(slot["rate"]),
+                backed_by=slot["backed_by"].decode(),
+                updated_at=_from_slot(int(slot["updated_at"]), int(slot["utc_offset"])),
+                currency_type=slot["currency_type"].decode(),
+            )
+            for slot in slots
+        ]
+        return sequence, SharedRates(
+            currencies=currencies,
+            fingerprint=(fingerprint.decode() or None,),
+            changed_at=(
+                EPOCH + timedelta(microseconds=changed_at)
+                if changed_at != NO_CHANGE
+                else None
+            ),
+        )
+
+    def _follow(self, session_factory: Callable[[], Session]) -> None:
+        """Swaps in the rates of the table whenever its sequence moved"""
+
+        if not self._map():
+            return
+        if int(self._header["sequence"][0]) == self._read_sequence:
+            return
+        if (table := self.read()) is None:
+            return
+        self._read_sequence, rates = table
+        if rates is not None:
+            self.store.install(*rates)
+            return
+        db = session_factory()
+        try:
+            self.store.refresh(db=db, force=False)
+        finally:
+            db.close()
+
+    def _run(
+        self,
+        session_factory: Callable[[], Session],
+        on_elected: Callable[[], None],
+    ) -> None:
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                # Workers keep trying the lock, so one takes over when the writer exits
+                if self._try_lock():
+                    if not self._map():
+                        self._create()
+                        self._map()
+                    self.is_writer = True
+                    self.store.subscribe(self.publish)
+                    # Publishes right away, rather than after the first periodic refresh
+                    db = session_factory()
+                    try:
+                        self.store.refresh(db=db, force=False)
+                    finally:
+                        db.close()
+                    on_elected()
+                    logger.info("Writing the shared rate table %s", self.path)
+                    return
+                self._follow(session_factory=session_factory)
+            except Exception:
+                logger.exception("Could not read the shared rate table %s", self.path)
+
+    def start(
+        self,
+        session_factory: Callable[[], Session],
+        on_elected: Callable[[], None],
+    ) -> None:
+        """Starts a daemon thread following the table until this worker takes the lock, then calls
+        `on_elected` to start refreshing from the database
+        """
+
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(session_factory, on_elected),
+            name="shared-rate-table",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+            self.is_writer = False
+
+
+shared_rate_table = (
+    SharedRateTable(
+        path=settings.shared_rates_path,
+        capacity=settings.shared_rates_capacity,
+        poll_interval=settings.shared_rates_poll_interval,
+        store=rate_snapshot_store,
+    )
+    if settings.shared_rates_path
+    else None
+)
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from fastapi import HTTPException, status
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs one load per key at a time, concurrent callers of the same key waiting for it and sharing its
+    result or its error
+
+    Callers waiting longer than `timeout` seconds get a 503 instead of queueing up behind a stuck load.
+    """
+
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        # Callers served by a load another caller started
+        self.coalesced = 0
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._tasks: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._lock = threading.Lock()
+
+    def _timed_out(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Rates are still loading, try again",
+        )
+
+    def do(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """Returns `load()`, or the result of the load of `key` already running in another thread"""
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                flight.result = load()
+                return flight.result
+            except BaseException as error:
+                flight.error = error
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        if not flight.done.wait(self.timeout):
+            raise self._timed_out()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    async def do_async(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Same as `do` for coroutines of one event loop, waiting callers never blocking the loop"""
+
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            # Shielded, so a cancelled leader leaves the load running for the others
+            return await asyncio.shield(task)
+
+        self.coalesced += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out()
@@ -0,0 +1,365 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import (COINBASE_CURRENCY_TYPE, CurrencyChangeModel,
+                        CurrencyModel)
+from app.schemas.currency import CurrencyDatabase
+from app.services.backing_chain import BackingChainResolver
+from app.services.rate_cache import rate_cache
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class RateSnapshot:
+    """Immutable in-memory copy of every currency found in `currencies`
+
+    Currencies are shared between requests and must not be mutated. `etag` hashes the content, so every
+    worker loading the same rows agrees on it, and `last_modified` also moves on removals logged at
+    `changed_at`.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        currencies: List[CurrencyDatabase],
+        fingerprint: Tuple,
+        changed_at: Optional[datetime] = None,
+    ) -> None:
+        self.version = version
+        self.currencies = currencies
+        self.fingerprint = fingerprint
+        self.changed_at = changed_at
+        self.etag = f'"{fingerprint[0] or "empty"}"'
+        updates = [currency.updated_at for currency in currencies]
+        self.last_modified = max(updates + [changed_at], default=None, key=_timestamp)
+        # Last coinbase update, in phase with the ticks of the feeder
+        self.fed_at = max(
+            (
+                currency.updated_at
+                for currency in currencies
+                if currency.currency_type == COINBASE_CURRENCY_TYPE
+            ),
+            default=self.last_modified,
+            key=_timestamp,
+        )
+        self._currencies_by_code: Dict[str, CurrencyDatabase] = {
+            currency.currency_code: currency for currency in currencies
+        }
+        self.resolver = BackingChainResolver(find_currency=self.get)
+        self._derived: Dict[Hashable, Any] = {}
+
+    def get(self, currency_code: str) -> Optional[CurrencyDatabase]:
+        return self._currencies_by_code.get(currency_code)
+
+    def staleness(self) -> float:
+        """Seconds since the last rate update, so how old the served rates may be"""
+
+        if self.fed_at is None:
+            return 0.0
+        return max(time.time() - _timestamp(self.fed_at), 0.0)
+
+    def cached(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """Returns the value built from this snapshot under `key`, building it on first use"""
+
+        if key not in self._derived:
+            self._derived[key] = build()
+        return self._derived[key]
+
+
+def _timestamp(moment: Optional[datetime]) -> float:
+    if moment is None:
+        return float("-inf")
+    return (
+        moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+    ).timestamp()
+
+
+def _query_last_change(db: Session) -> Optional[datetime]:
+    return db.execute(select(func.max(CurrencyChangeModel.created_at))).scalar_one()
+
+
+def _query_fingerprint(db: Session) -> Tuple:
+    """Returns a content hash of `currencies`, so any insert, update or delete changes it"""
+
+    row_text = func.concat_ws(
+        "|",
+        CurrencyModel.currency_code,
+        CurrencyModel.rate,
+        CurrencyModel.backed_by,
+        CurrencyModel.updated_at,
+        CurrencyModel.currency_type,
+    )
+    fingerprint_query = select(
+        func.md5(
+            func.string_agg(
+                row_text, aggregate_order_by(",", CurrencyModel.currency_code)
+            )
+        )
+    )
+    return tuple(db.execute(fingerprint_query).one())
+
+
+def _query_all_currencies(db: Session) -> List[CurrencyDatabase]:
+    """Returns every currency ordered by `currency_code`, read in one scan of its unique index"""
+
+    currencies = db.query(CurrencyModel).order_by(CurrencyModel.currency_code).all()
+    return [CurrencyDatabase.from_orm(currency) for currency in currencies]
+
+
+def _load_all_currencies(db: Session, fingerprint: Tuple) -> List[CurrencyDatabase]:
+    """Returns the currencies hashed to `fingerprint`, read from the rate cache when another process or
+    node already loaded them
+    """
+
+    if fingerprint[0] is None:
+        return _query_all_currencies(db=db)
+    return rate_cache.get_or_build(
+        f"currencies:{fingerprint[0]}",
+        lambda: _query_all_currencies(db=db),
+        encode=lambda currencies: [currency.dict() for currency in currencies],
+        decode=lambda rows: [
+            CurrencyDatabase.construct(
+                **{**row, "updated_at": datetime.fromisoformat(row["updated_at"])}
+            )
+            for row in rows
+        ],
+    )
+
+
+class RateSnapshotStore:
+    """Keeps the current `RateSnapshot` and swaps it whenever `currencies` changes"""
+
+    def __init__(
+        self,
+        refresh_interval: float,
+        load_timeout: float = 5.0,
+        statement_timeout: Optional[float] = None,
+        revalidate_timeout: float = 1.0,
+    ) -> None:
+        self.refresh_interval = refresh_interval
+        self.statement_timeout = statement_timeout
+        self.revalidate_timeout = revalidate_timeout
+        # Moment of the first refresh failing since the last one that worked, `None` while they work
+        self.failing_since: Optional[float] = None
+        self._loads = SingleFlight(timeout=load_timeout)
+        self._revalidation: Optional[threading.Thread] = None
+        self._revalidation_lock = threading.Lock()
+        self._snapshot: Optional[RateSnapshot] = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[RateSnapshot], None]] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def current(self, db: Session) -> RateSnapshot:
+        """Returns the loaded snapshot, only querying `db` when nothing was loaded yet"""
+
+        snapshot = self._snapshot
+        if snapshot is None:
+            # Concurrent first reads share one load instead of each querying their own `db`
+            snapshot = self._loads.do(
+                "refresh", lambda: self.refresh(db=db, force=False)
+            )
+        return snapshot
+
+    def refresh(self, db: Session, force: bool = True) -> RateSnapshot:
+        """Reloads the snapshot from `db`, skipping the reload when nothing changed unless `force` is set"""
+
+        with self._lock:
+            try:
+                if self.statement_timeout is not None:
+                    # A stalled database fails the refresh, rather than holding the lock until it recovers
+                    db.execute(
+                        text(
+                            f"SET LOCAL statement_timeout = {int(self.statement_timeout * 1000)}"
+                        )
+                    )
+                fingerprint = _query_fingerprint(db=db)
+                if (
+                    force
+                    or self._snapshot is None
+                    or self._snapshot.fingerprint != fingerprint
+                ):
+                    self._swap(
+                        currencies=_load_all_currencies(db=db, fingerprint=fingerprint),
+                        fingerprint=fingerprint,
+                        changed_at=_query_last_change(db=db),
+                    )
+            except Exception:
+                self.failing_since = self.failing_since or time.time()
+                raise
+            self.failing_since = None
+            return self._snapshot
+
+    def _swap(
+        self,
+        currencies: List[CurrencyDatabase],
+        fingerprint: Tuple,
+        changed_at: Optional[datetime],
+    ) -> RateSnapshot:
+        self._version += 1
+        self._snapshot = RateSnapshot(
+            version=self._version,
+            currencies=currencies,
+            fingerprint=fingerprint,
+            changed_at=changed_at,
+        )
+        for subscriber in self._subscribers:
+            subscriber(self._snapshot)
+        return self._snapshot
+
+    def install(
+        self,
+        currencies: List[CurrencyDatabase],
+        fingerprint: Tuple,
+        changed_at: Optional[datetime],
+    ) -> RateSnapshot:
+        """Swaps in rates loaded by another process, unless they match the loaded snapshot"""
+
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.fingerprint == fingerprint:
+                return self._snapshot
+            return self._swap(
+                currencies=currencies, fingerprint=fingerprint, changed_at=changed_at
+            )
+
+    def subscribe(self, subscriber: Callable[[RateSnapshot], None]) -> None:
+        """Calls `subscriber` with the loaded snapshot, if any, and then with every new one"""
+
+        with self._lock:
+            self._subscribers.append(subscriber)
+            if self._snapshot is not None:
+                subscriber(self._snapshot)
+
+    def _revalidate(self, session_factory: Callable[[], Session]) -> None:
+        db = session_factory()
+        try:
+            self.refresh(db=db, force=False)
+        except Exception:
+            logger.exception("Could not revalidate rate snapshot")
+        finally:
+            db.close()
+
+    def within_staleness(
+        self,
+        snapshot: RateSnapshot,
+        max_staleness: Optional[float],
+        session_factory: Callable[[], Session],
+    ) -> RateSnapshot:
+        """Returns `snapshot` when its rates are at most `max_staleness` seconds old, otherwise refreshes it
+        in the background and waits up to `revalidate_timeout` seconds for newer rates
+
+        Raises a 503 when the rates are still older than accepted, so a slow database bounds the wait.
+        """
+
+        if max_staleness is None or snapshot.staleness() <= max_staleness:
+            return snapshot
+
+        with self._revalidation_lock:
+            if self._revalidation is None or not self._revalidation.is_alive():
+                self._revalidation = threading.Thread(
+                    target=self._revalidate,
+                    args=(session_factory,),
+                    name="rate-snapshot-revalidation",
+                    daemon=True,
+                )
+                self._revalidation.start()
+            revalidation = self._revalidation
+        revalidation.join(self.revalidate_timeout)
+
+        snapshot = self._snapshot
+        if snapshot.staleness() > max_staleness:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Rates are {int(snapshot.staleness())} seconds old, older than the {max_staleness:g} accepted",
+            )
+        return snapshot
+
+    async def within_staleness_async(
+        self,
+        snapshot: RateSnapshot,
+        max_staleness: Optional[float],
+        session_factory: Callable[[], Session],
+    ) -> RateSnapshot:
+        """Same as `within_staleness` for the async request path, waiting off the event loop"""
+
+        if max_staleness is None or snapshot.staleness() <= max_staleness:
+            return snapshot
+        return await run_in_threadpool(
+            self.within_staleness,
+            snapshot=snapshot,
+            max_staleness=max_staleness,
+            session_factory=session_factory,
+        )
+
+    async def current_async(self, db: AsyncSession) -> RateSnapshot:
+        """Same as `current` for the async request path"""
+
+        snapshot = self._snapshot
+        if snapshot is None:
+            # Waiting on the lock of `refresh` would block the event loop the first load runs on
+            snapshot = await self._loads.do_async(
+                "refresh", lambda: self.refresh_async(db=db, force=False)
+            )
+        return snapshot
+
+    async def refresh_async(self, db: AsyncSession, force: bool = True) -> RateSnapshot:
+        """Same as `refresh` for the async request path"""
+
+        return await db.run_sync(lambda session: self.refresh(db=session, force=force))
+
+    def clear(self) -> None:
+        """Drops the loaded snapshot so the next read loads it again"""
+
+        with self._lock:
+            self._snapshot = None
+
+    def _refresh_periodically(self, session_factory: Callable[[], Session]) -> None:
+        while not self._stop_event.wait(self.refresh_interval):
+            db = session_factory()
+            try:
+                self.refresh(db=db, force=False)
+            except Exception:
+                logger.exception("Could not refresh rate snapshot")
+            finally:
+                db.close()
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """Starts a daemon thread that checks `currencies` for changes every `refresh_interval` seconds"""
+
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._refresh_periodically,
+            args=(session_factory,),
+            name="rate-snapshot-refresh",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+rate_snapshot_store = RateSnapshotStore(
+    refresh_interval=settings.rate_snapshot_refresh_interval,
+    load_timeout=settings.single_flight_timeout,
+    statement_timeout=settings.rate_refresh_statement_timeout,
+    revalidate_timeout=settings.rate_revalidate_timeout,
+)
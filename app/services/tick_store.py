@@ -0,0 +1,128 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+# Layout written by `app/coinbase_data_feeder/tick_store.py`
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+TIME_DTYPE = np.dtype("<i8")
+RATE_DTYPE = np.dtype("<f8")
+CURRENT_LINK = "current"
+COVERS_FROM_FILE = "covers_from"
+
+
+def to_microseconds(moment: datetime) -> int:
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def from_microseconds(microseconds: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(microseconds))
+
+
+def _empty_ticks() -> Tuple[np.ndarray, np.ndarray]:
+    return np.empty(0, TIME_DTYPE), np.empty(0, RATE_DTYPE)
+
+
+def _map(file_path: str, dtype: np.dtype) -> np.ndarray:
+    if os.stat(file_path).st_size < dtype.itemsize:
+        return np.empty(0, dtype)
+    return np.memmap(file_path, dtype=dtype, mode="r")
+
+
+class TickStore:
+    """Read-only view of the coinbase ticks the feeder appends to the store at `path`
+
+    Each currency is one pair of memory mapped columns, so ranges are sliced out of the page cache without
+    copying or querying Postgres. Columns are mapped again when they grew or a maintenance command swapped
+    the generation of the store.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._generation: Optional[str] = None
+        self._covers_from: Optional[int] = None
+        # Mapped times and rates by currency code, with the file sizes they were mapped at
+        self._maps: Dict[str, Tuple[Tuple[int, int], np.ndarray, np.ndarray]] = {}
+
+    def _sync_generation(self) -> Optional[str]:
+        """Drops the maps of a generation replaced since the last read"""
+
+        try:
+            generation = os.readlink(os.path.join(self.path, CURRENT_LINK))
+        except FileNotFoundError:
+            generation = None
+        if generation != self._generation:
+            self._generation, self._maps, self._covers_from = generation, {}, None
+            if generation is not None:
+                try:
+                    with open(
+                        os.path.join(self.path, generation, COVERS_FROM_FILE)
+                    ) as file:
+                        self._covers_from = int(file.read())
+                except FileNotFoundError:
+                    # Removed by a newer generation, picked up on the next read
+                    self._generation = None
+        return self._generation
+
+    def covers_from(self) -> Optional[datetime]:
+        """Moment since which the store holds every coinbase tick, `None` while it is empty"""
+
+        with self._lock:
+            self._sync_generation()
+            if self._covers_from is None:
+                return None
+            return from_microseconds(self._covers_from)
+
+    def ticks(self, currency_code: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the epoch microseconds and rates of every complete tick of `currency_code`"""
+
+        with self._lock:
+            if (generation := self._sync_generation()) is None:
+                return _empty_ticks()
+            base_path = os.path.join(self.path, generation, currency_code)
+            try:
+                sizes = (
+                    os.stat(f"{base_path}.times").st_size,
+                    os.stat(f"{base_path}.rates").st_size,
+                )
+                mapped = self._maps.get(currency_code)
+                if mapped is None or mapped[0] != sizes:
+                    mapped = (
+                        sizes,
+                        _map(f"{base_path}.times", TIME_DTYPE),
+                        _map(f"{base_path}.rates", RATE_DTYPE),
+                    )
+                    self._maps[currency_code] = mapped
+            except FileNotFoundError:
+                return _empty_ticks()
+        _, times, rates = mapped
+        # A tick is complete once its time is written, its rate is written first
+        length = min(len(times), len(rates))
+        return times[:length], rates[:length]
+
+    def ticks_between(
+        self,
+        currency_code: str,
+        starts_at: datetime,
+        ends_at: datetime,
+        with_previous: bool = False,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the ticks from `starts_at` up to but excluding `ends_at`, led by the last tick before
+        `starts_at` when `with_previous` is set
+        """
+
+        times, rates = self.ticks(currency_code)
+        start, end = np.searchsorted(
+            times, [to_microseconds(starts_at), to_microseconds(ends_at)]
+        )
+        if with_previous and start > 0:
+            start -= 1
+        return times[start:end], rates[start:end]
+
+
+tick_store = TickStore(settings.tick_store_path) if settings.tick_store_path else None
@@ -0,0 +1,91 @@
+"""Per-request serialization cost of currency and conversion reads, before and after the fast JSON path
+
+    python -m app.tests.stress_tests.serialization_benchmark --currencies 300 --number 2000
+"""
+import argparse
+import asyncio
+import timeit
+from datetime import datetime, timezone
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models import COINBASE_CURRENCY_TYPE
+from app.schemas.convert import ConvertModelResponse, OutputConversionSchema
+from app.schemas.currency import CurrencyDatabase, CurrencyOut, CurrencyResponse
+from app.services.encoded_body import currency_body
+from app.services.fast_json import FastJSONResponse
+from app.services.snapshot import RateSnapshot
+
+loop = asyncio.new_event_loop()
+
+
+# Created once per route by FastAPI
+response_fields = {
+    response_model: create_response_field(name="response", type_=response_model)
+    for response_model in (CurrencyResponse, ConvertModelResponse)
+}
+
+
+def _fastapi_render(response_model, content) -> bytes:
+    """What FastAPI does with a model returned by a route declaring `response_model`"""
+
+    encoded = loop.run_until_complete(
+        serialize_response(
+            field=response_fields[response_model], response_content=content
+        )
+    )
+    return JSONResponse(encoded).body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--currencies", type=int, default=300)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    updated_at = datetime.now(timezone.utc)
+    currencies = [
+        CurrencyDatabase(
+            id=index,
+            currency_code=f"C{index:03}",
+            rate=1.5 + index * 1.37,
+            backed_by="USD",
+            updated_at=updated_at,
+            currency_type=COINBASE_CURRENCY_TYPE,
+        )
+        for index in range(args.currencies)
+    ]
+    snapshot = RateSnapshot(version=1, currencies=currencies, fingerprint=("x",))
+    currency = currencies[-1]
+    conversion = dict(
+        from_this=currency.currency_code,
+        to="USD",
+        amount=37.5,
+        at=None,
+        converted_value=12.34,
+        updated_at=updated_at,
+    )
+
+    cases = {
+        "currency, before": lambda: _fastapi_render(
+            CurrencyResponse,
+            CurrencyResponse(data=CurrencyOut(**currency.dict())),
+        ),
+        "currency, after": lambda: currency_body(snapshot, currency),
+        "convert, before": lambda: _fastapi_render(
+            ConvertModelResponse,
+            ConvertModelResponse(data=OutputConversionSchema(**conversion)),
+        ),
+        "convert, after": lambda: FastJSONResponse(
+            {"data": OutputConversionSchema.construct(**conversion)}
+        ).body,
+    }
+    for name, case in cases.items():
+        seconds = timeit.timeit(case, number=args.number) / args.number
+        print(f"{name:<20} {seconds * 1e6:10.1f} µs per request")
+
+
+if __name__ == "__main__":
+    main()
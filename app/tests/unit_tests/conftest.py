@@ -1,11 +1,20 @@
+import os
+
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
-from app.database import Base, SessionLocal, engine, get_db
+from app.database import Base, SessionLocal, engine, get_db, get_read_db
 from app.main import app
 from app.models import CoinbaseCurrenciesPublicApiModel, FictitiousCoinModel
 from app.schemas.currency import Currency
+from app.services import backtest, history
+from app.services.history_index import rate_history_index
+from app.services.rate_cache import rate_cache
+from app.services.snapshot import rate_snapshot_store
+from app.services.tick_store import (COVERS_FROM_FILE, CURRENT_LINK, TickStore,
+                                     to_microseconds)
 from app.tests.stubs import CURRENCY_VALUES_TEST_DATA
 
 client = TestClient(app)
@@ -51,6 +60,12 @@ def client(session: Session, insert_test_data):
 
     # Change get_db dependency to override_get_db in order to manipulate test database
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    # Drop rates cached by previous tests so the snapshot is loaded from this test database
+    rate_snapshot_store.clear()
+    rate_history_index.clear()
+    rate_cache.local.clear()
+    rate_cache.shared.client.flushdb()
     yield TestClient(app)
 
 
@@ -92,3 +107,26 @@ def create_test_currency(
     session.add(currency_db)
     session.commit()
     return fictitious_currency_data_test
+
+
+@pytest.fixture
+def write_tick_store(tmp_path, monkeypatch):
+    """Writes a tick store in the feeder layout and makes the history and backtest operators read it"""
+
+    store = TickStore(str(tmp_path))
+    monkeypatch.setattr(history, "tick_store", store)
+    monkeypatch.setattr(backtest, "tick_store", store)
+
+    def write(covers_from, **ticks):
+        generation = tmp_path / "generation-1"
+        generation.mkdir()
+        (generation / COVERS_FROM_FILE).write_text(str(to_microseconds(covers_from)))
+        for currency_code, currency_ticks in ticks.items():
+            times = [to_microseconds(moment) for moment, _ in currency_ticks]
+            rates = [rate for _, rate in currency_ticks]
+            np.array(times, "<i8").tofile(generation / f"{currency_code}.times")
+            np.array(rates, "<f8").tofile(generation / f"{currency_code}.rates")
+        os.symlink(generation.name, tmp_path / CURRENT_LINK)
+        return store
+
+    return write
@@ -1,5 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models import CoinbaseCurrenciesPublicApiModel, FictitiousCoinModel
 
 
 @pytest.mark.parametrize(
@@ -57,3 +60,90 @@ def test_should_not_find_currency_in_database(
         convert_api_response.json()["detail"]
         == f"Currency code {missing_currency} not found"
     )
+
+
+@pytest.mark.parametrize(
+    "from_this, to, amount, converted_value",
+    [
+        ("NEST", "BRL", 16, 2.0),
+        ("NEST", "HURB", 16, 8.0),
+        ("NEST", "TEST", 16, 0.8),
+        ("USD", "NEST", 1, 40.96),
+    ],
+)
+def test_should_convert_currency_backed_by_fictitious_currency(
+    client: TestClient,
+    session: Session,
+    from_this,
+    to,
+    amount,
+    converted_value,
+    create_hurb_currency,
+    create_test_currency,
+):
+    session.add(FictitiousCoinModel(currency_code="NEST", rate=2.0, backed_by="HURB"))
+    session.commit()
+
+    convert_response = client.get(
+        f"/convert/?from_this={from_this}&to={to}&amount={amount}"
+    )
+
+    assert convert_response.status_code == 200
+    assert convert_response.json()["data"]["converted_value"] == converted_value
+
+
+def test_should_not_convert_currency_with_circular_backed_by_chain(
+    client: TestClient, session: Session
+):
+    session.add(FictitiousCoinModel(currency_code="LOOPA", rate=2.0, backed_by="LOOPB"))
+    session.add(FictitiousCoinModel(currency_code="LOOPB", rate=2.0, backed_by="LOOPA"))
+    session.commit()
+
+    convert_response = client.get("/convert/?from_this=LOOPA&to=USD&amount=1")
+
+    assert convert_response.status_code == 409
+    assert (
+        convert_response.json()["detail"]
+        == "Currency code LOOPA has a circular backed_by chain"
+    )
+
+
+def test_should_convert_currency_from_snapshot(client: TestClient, session: Session):
+    assert client.get("/convert/?from_this=BRL&to=EUR&amount=10").status_code == 200
+
+    session.query(CoinbaseCurrenciesPublicApiModel).delete()
+    session.commit()
+
+    convert_response = client.get("/convert/?from_this=BRL&to=EUR&amount=10")
+
+    assert convert_response.status_code == 200
+    assert convert_response.json()["data"]["converted_value"] == 1.97
+
+
+def test_should_convert_currency_into_many_currencies(
+    client: TestClient, create_hurb_currency
+):
+    convert_response = client.get("/convert/?from_this=BRL&to=eur, hurb,USD&amount=10")
+    convert_response_data = convert_response.json()["data"]
+
+    assert convert_response.status_code == 200
+    assert [conversion["to"] for conversion in convert_response_data] == [
+        "EUR",
+        "HURB",
+        "USD",
+    ]
+    assert [conversion["converted_value"] for conversion in convert_response_data] == [
+        1.97,
+        40.0,
+        1.95,
+    ]
+    assert all(conversion["from_this"] == "BRL" for conversion in convert_response_data)
+
+
+def test_should_not_convert_currency_into_many_currencies_with_missing_target(
+    client: TestClient,
+):
+    convert_response = client.get("/convert/?from_this=BRL&to=EUR,NOTFOUND&amount=10")
+
+    assert convert_response.status_code == 404
+    assert convert_response.json()["detail"] == "Currency code NOTFOUND not found"
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models import RateHistoryModel
+from app.services.history_index import rate_history_index
+
+NOW = datetime.now(timezone.utc)
+
+
+def _add_history(session: Session, *rates):
+    for currency_code, rate, backed_by, moment in rates:
+        session.add(
+            RateHistoryModel(
+                currency_code=currency_code,
+                rate=rate,
+                backed_by=backed_by,
+                updated_at=moment,
+            )
+        )
+    session.commit()
+
+
+def _convert_at(client: TestClient, from_this: str, to: str, amount: float, at):
+    return client.get(
+        "/convert/",
+        params={
+            "from_this": from_this,
+            "to": to,
+            "amount": amount,
+            "at": at.isoformat(),
+        },
+    )
+
+
+def test_should_convert_with_rates_of_that_moment(client: TestClient, session: Session):
+    """
+    Try to convert with the rates in force at `at`, served from the in-memory history
+    """
+    _add_history(
+        session,
+        ("USD", 1.0, "USD", NOW - timedelta(hours=3)),
+        ("BRL", 5.0, "USD", NOW - timedelta(hours=3)),
+        ("BRL", 6.0, "USD", NOW - timedelta(hours=1)),
+    )
+
+    res = _convert_at(client, "BRL", "USD", 10, at=NOW - timedelta(hours=2))
+    assert res.status_code == 200
+    assert res.json()["data"]["converted_value"] == 2.0
+    assert res.json()["data"]["at"] == (NOW - timedelta(hours=2)).isoformat()
+
+    res = _convert_at(client, "BRL", "USD", 10, at=NOW - timedelta(minutes=30))
+    assert res.json()["data"]["converted_value"] == 1.67
+
+    # Moments inside the window never reach the database
+    assert (
+        rate_history_index.rate_at(
+            db=None, currency_code="BRL", at=NOW - timedelta(hours=2)
+        ).rate
+        == 5.0
+    )
+
+
+def test_should_convert_with_rates_older_than_the_index(
+    client: TestClient, session: Session
+):
+    """
+    Try to convert at a moment older than the in-memory history window
+    """
+    _add_history(
+        session,
+        ("USD", 1.0, "USD", NOW - timedelta(days=3)),
+        ("BRL", 4.0, "USD", NOW - timedelta(days=3)),
+        ("BRL", 6.0, "USD", NOW - timedelta(hours=1)),
+    )
+
+    res = _convert_at(client, "BRL", "USD", 10, at=NOW - timedelta(days=2))
+
+    assert res.status_code == 200
+    assert res.json()["data"]["converted_value"] == 2.5
+
+
+def test_should_resolve_backed_by_chain_at_that_moment(
+    client: TestClient, session: Session, create_hurb_currency
+):
+    """
+    Try to convert a fictitious currency whose backing currency changed over time
+    """
+    _add_history(
+        session,
+        ("USD", 1.0, "USD", NOW - timedelta(hours=3)),
+        ("BRL", 5.0, "USD", NOW - timedelta(hours=3)),
+        ("HURB", 4.0, "BRL", NOW - timedelta(hours=3)),
+        ("HURB", 2.0, "USD", NOW - timedelta(hours=1)),
+    )
+
+    res = _convert_at(client, "HURB", "USD", 20, at=NOW - timedelta(hours=2))
+    assert res.status_code == 200
+    assert res.json()["data"]["converted_value"] == 1.0
+
+    res = _convert_at(client, "HURB", "USD", 20, at=NOW - timedelta(minutes=30))
+    assert res.json()["data"]["converted_value"] == 10.0
+
+
+def test_should_fall_back_to_current_rates_without_history(client: TestClient):
+    """
+    Try to convert at a moment after the last update of currencies without history
+    """
+    res = _convert_at(client, "BRL", "EUR", 10, at=NOW + timedelta(minutes=1))
+
+    assert res.status_code == 200
+    assert res.json()["data"]["converted_value"] == 1.97
+
+
+def test_should_not_find_rate_before_currency_existed(
+    client: TestClient, session: Session
+):
+    """
+    Try to convert at a moment in which the currency had no rate
+    """
+    _add_history(session, ("BRL", 5.0, "USD", NOW - timedelta(hours=3)))
+
+    res = _convert_at(client, "BRL", "BTC", 10, at=NOW - timedelta(hours=2))
+
+    assert res.status_code == 404
+    assert res.json()["detail"] == "Currency code BTC not found"
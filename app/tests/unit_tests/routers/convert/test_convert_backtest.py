@@ -0,0 +1,149 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models import RateHistoryModel
+
+NOW = datetime.now(timezone.utc)
+
+
+def _read_ndjson(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def _add_history(session: Session, *rates):
+    for currency_code, rate, backed_by, moment in rates:
+        session.add(
+            RateHistoryModel(
+                currency_code=currency_code,
+                rate=rate,
+                backed_by=backed_by,
+                updated_at=moment,
+            )
+        )
+    session.commit()
+
+
+def _at(**delta) -> str:
+    return (NOW - timedelta(**delta)).isoformat()
+
+
+def test_should_backtest_rows_with_rates_of_each_moment(
+    client: TestClient, session: Session, create_hurb_currency
+):
+    _add_history(
+        session,
+        ("USD", 1.0, "USD", NOW - timedelta(days=3)),
+        ("BRL", 4.0, "USD", NOW - timedelta(days=3)),
+        ("BRL", 5.0, "USD", NOW - timedelta(hours=3)),
+        ("HURB", 4.0, "BRL", NOW - timedelta(hours=3)),
+        ("HURB", 2.0, "USD", NOW - timedelta(hours=1)),
+    )
+    body = "\n".join(
+        [
+            "at,from_this,to,amount",
+            f"{_at(days=2)},BRL,USD,10",
+            f"{_at(hours=2)},brl,usd,10",
+            f"{_at(hours=2)},HURB,USD,20",
+            f"{_at(minutes=30)},HURB,USD,20",
+            f"{_at(days=4)},BRL,USD,10",
+            f"{_at(hours=2)},BRL,BTC,10",
+            "yesterday,BRL,USD,10",
+        ]
+    )
+    res = client.post(
+        "/convert/backtest", data=body, headers={"Content-Type": "text/csv"}
+    )
+    rows = _read_ndjson(res)
+
+    assert res.status_code == 200
+    assert [row["line"] for row in rows] == [2, 3, 4, 5, 6, 7, 8]
+    assert [row.get("converted_value") for row in rows[:4]] == [2.5, 2.0, 1.0, 10.0]
+    assert rows[0] == {
+        "line": 2,
+        "at": _at(days=2),
+        "from_this": "BRL",
+        "to": "USD",
+        "amount": 10.0,
+        "converted_value": 2.5,
+    }
+    assert rows[4]["detail"] == "Currency code BRL not found"
+    assert rows[5]["detail"] == "Currency code BTC not found"
+    assert rows[6]["detail"] == "Invalid row"
+
+
+def test_should_match_point_in_time_conversion(
+    client: TestClient, session: Session, create_hurb_currency
+):
+    _add_history(
+        session,
+        ("USD", 1.0, "USD", NOW - timedelta(hours=6)),
+        ("EUR", 1.1, "USD", NOW - timedelta(hours=6)),
+        ("EUR", 0.9, "USD", NOW - timedelta(hours=2)),
+        ("BRL", 5.0, "USD", NOW - timedelta(hours=6)),
+        ("BRL", 5.4, "USD", NOW - timedelta(hours=4)),
+        ("HURB", 4.0, "BRL", NOW - timedelta(hours=5)),
+    )
+    records = [
+        (_at(hours=hours), from_this, to, 37.5)
+        for hours in (5.5, 4.5, 3, 1)
+        for from_this, to in [("BRL", "EUR"), ("HURB", "EUR"), ("EUR", "HURB")]
+    ]
+    body = "\n".join(
+        json.dumps({"at": at, "from_this": from_this, "to": to, "amount": amount})
+        for at, from_this, to, amount in records
+    )
+    res = client.post(
+        "/convert/backtest",
+        data=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    for row, (at, from_this, to, amount) in zip(_read_ndjson(res), records):
+        single = client.get(
+            "/convert/",
+            params={"from_this": from_this, "to": to, "amount": amount, "at": at},
+        )
+        if single.status_code == 200:
+            assert row["converted_value"] == single.json()["data"]["converted_value"]
+        else:
+            assert row["detail"] == single.json()["detail"]
+
+
+def test_should_backtest_coinbase_currencies_from_tick_store(
+    client: TestClient, session: Session, create_hurb_currency, write_tick_store
+):
+    write_tick_store(
+        covers_from=NOW - timedelta(days=2),
+        USD=[(NOW - timedelta(days=3), 1.0)],
+        BRL=[(NOW - timedelta(days=3), 4.0), (NOW - timedelta(hours=3), 5.0)],
+    )
+    # Fictitious currencies are still read from Postgres, coinbase ones only from the store
+    _add_history(
+        session,
+        ("BRL", 100.0, "USD", NOW - timedelta(hours=2)),
+        ("HURB", 4.0, "BRL", NOW - timedelta(hours=3)),
+        ("HURB", 2.0, "USD", NOW - timedelta(hours=1)),
+    )
+    body = "\n".join(
+        [
+            "at,from_this,to,amount",
+            f"{_at(days=1)},BRL,USD,10",
+            f"{_at(hours=1, minutes=30)},BRL,USD,10",
+            f"{_at(hours=1, minutes=30)},HURB,USD,20",
+            f"{_at(minutes=30)},HURB,USD,20",
+        ]
+    )
+    res = client.post(
+        "/convert/backtest", data=body, headers={"Content-Type": "text/csv"}
+    )
+
+    assert res.status_code == 200
+    assert [row["converted_value"] for row in _read_ndjson(res)] == [
+        2.5,
+        2.0,
+        1.0,
+        10.0,
+    ]
@@ -0,0 +1,157 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.services.bulk_convert import _iter_lines
+
+
+def _read_ndjson(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_should_bulk_convert_csv_body(
+    client: TestClient, create_hurb_currency, create_test_currency
+):
+    body = "from_this,to,amount\nBRL,EUR,10\nhurb,test,2\nHURB,USD,23.50\n"
+    res = client.post("/convert/bulk", data=body, headers={"Content-Type": "text/csv"})
+    rows = _read_ndjson(res)
+
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/x-ndjson"
+    assert [row["line"] for row in rows] == [2, 3, 4]
+    assert [row["converted_value"] for row in rows] == [1.97, 0.2, 1.15]
+    assert rows[1]["from_this"] == "HURB"
+    assert rows[1]["to"] == "TEST"
+    assert set(rows[0]) == {
+        "line",
+        "from_this",
+        "to",
+        "amount",
+        "converted_value",
+        "updated_at",
+    }
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        "\ufefffrom_this,to,amount",
+        "from_this, to, amount",
+        '"from_this","to","amount"',
+        "amount,from_this,to",
+    ],
+)
+def test_should_bulk_convert_csv_body_with_header_variants(client: TestClient, header):
+    values = {"from_this": "BRL", "to": "EUR", "amount": "10"}
+    columns = [column.strip(' "\ufeff') for column in header.split(",")]
+    body = f"{header}\n" + ",".join(values[column] for column in columns)
+    res = client.post(
+        "/convert/bulk", data=body.encode(), headers={"Content-Type": "text/csv"}
+    )
+
+    rows = _read_ndjson(res)
+
+    assert len(rows) == 1
+    assert rows[0]["line"] == 2
+    assert rows[0]["converted_value"] == 1.97
+
+
+def test_should_bulk_convert_ndjson_body(client: TestClient):
+    body = "\n".join(
+        json.dumps({"from_this": from_this, "to": to, "amount": amount})
+        for from_this, to, amount in [("BTC", "USD", 19.27), ("EUR", "ETH", 157.76)]
+    )
+    res = client.post(
+        "/convert/bulk", data=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+
+    assert res.status_code == 200
+    assert [row["converted_value"] for row in _read_ndjson(res)] == [385400.0, 0.09]
+
+
+def test_should_keep_input_order_across_chunks(client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_convert_chunk_size", 2)
+    monkeypatch.setattr(settings, "bulk_convert_max_line_length", 32)
+    body = b"\n".join(
+        [
+            b"BRL,EUR,1",
+            b"BRL,EUR,2",
+            b"FOO,EUR,3",
+            b"BRL,EUR,x",
+            b"BRL,EUR,4",
+            b"BRL,EUR,nan",
+            b"BRL,EUR,inf",
+            b"\xff\xfe,EUR,1",
+            b"BRL,EUR," + b"1" * 64,
+            b"BRL,EUR,5",
+        ]
+    )
+    res = client.post("/convert/bulk", data=body, headers={"Content-Type": "text/csv"})
+    rows = _read_ndjson(res)
+
+    assert res.status_code == 200
+    assert [row["line"] for row in rows] == list(range(1, 11))
+    assert [row.get("amount", row.get("detail")) for row in rows] == [
+        1.0,
+        2.0,
+        "Currency code FOO not found",
+        "Invalid row",
+        4.0,
+        "Invalid row",
+        "Invalid row",
+        "Invalid row",
+        "Invalid row",
+        5.0,
+    ]
+
+
+def test_should_not_bulk_convert_non_numeric_ndjson_amount(client: TestClient):
+    body = "\n".join(
+        json.dumps({"from_this": "BRL", "to": "EUR", "amount": amount})
+        for amount in [True, None, "1e400", 10]
+    )
+    res = client.post(
+        "/convert/bulk", data=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+
+    assert [row.get("detail") for row in _read_ndjson(res)] == [
+        "Invalid row",
+        "Invalid row",
+        "Invalid row",
+        None,
+    ]
+
+
+@pytest.mark.parametrize("content_type", ["text/plain", "application/json"])
+def test_should_not_bulk_convert_unsupported_body(client: TestClient, content_type):
+    res = client.post(
+        "/convert/bulk", data="BRL,EUR,10", headers={"Content-Type": content_type}
+    )
+    assert res.status_code == 415
+
+
+def test_should_split_lines_across_body_chunks():
+    async def byte_stream():
+        for chunk in [
+            b"BRL,E",
+            b"UR,1\nBRL",
+            b",EUR,",
+            b"2\n",
+            b"1" * 20,
+            b"1" * 20,
+            b"\nBRL,EUR,3",
+        ]:
+            yield chunk
+
+    async def read_lines():
+        return [line async for line in _iter_lines(byte_stream(), max_line_length=16)]
+
+    assert asyncio.run(read_lines()) == [
+        b"BRL,EUR,1",
+        b"BRL,EUR,2",
+        None,
+        b"BRL,EUR,3",
+    ]
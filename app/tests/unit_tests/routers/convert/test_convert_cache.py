@@ -0,0 +1,106 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models import RateHistoryModel
+from app.services.encoded_body import currency_list_body
+from app.services.rate_cache import (
+    FakeRedis,
+    LocalCache,
+    SharedCache,
+    TieredCache,
+    rate_cache,
+)
+from app.services.snapshot import rate_snapshot_store
+
+NOW = datetime.now(timezone.utc)
+
+
+def test_should_evict_least_recently_used_and_expired_entries():
+    """
+    Try to read entries past the size bound and the TTL of the local cache
+    """
+    cache = TieredCache(
+        local=LocalCache(max_entries=2, ttl=60),
+        shared=SharedCache(client=FakeRedis(max_entries=2), ttl=60),
+    )
+    built = []
+    for key in ("a", "b", "a", "c"):
+        cache.get_or_build(key, lambda: built.append(key) or key.upper())
+
+    # "b" was the least recently used when "c" came in
+    assert built == ["a", "b", "c"]
+    assert cache.stats()["local"] == {"hits": 1, "misses": 3, "evictions": 1}
+    assert cache.stats()["shared"]["evictions"] == 1
+
+    cache.local.ttl = 0
+    assert cache.get_or_build("d", lambda: "D") == "D"
+    time.sleep(0.001)
+    # Expired locally, then served by the shared tier without building it again
+    assert cache.get_or_build("d", lambda: "rebuilt") == "D"
+    assert cache.stats()["shared"]["hits"] == 1
+
+
+def test_should_warm_cold_snapshot_from_shared_cache(client: TestClient):
+    """
+    Try to load the rates of a cold process whose snapshot was loaded by another one
+    """
+    client.get("/currency")
+    snapshot = rate_snapshot_store.current(db=None)
+    rate_snapshot_store.clear()
+    rate_cache.local.clear()
+    shared_hits = rate_cache.shared.stats.hits
+
+    res = client.get("/currency", headers={"Accept-Encoding": "identity"})
+    assert res.status_code == 200
+    assert rate_cache.shared.stats.hits == shared_hits + 1
+    warmed = rate_snapshot_store.current(db=None)
+    assert warmed is not snapshot
+    assert (
+        currency_list_body(warmed).bodies["identity"]
+        == currency_list_body(snapshot).bodies["identity"]
+    )
+
+
+def test_should_cache_conversions_at_moment(client: TestClient, session: Session):
+    """
+    Try to convert twice at the same moment, the second time without reading the history again
+    """
+    for currency_code, rate, moment in (
+        ("USD", 1.0, NOW - timedelta(hours=3)),
+        ("BRL", 5.0, NOW - timedelta(hours=3)),
+        ("BRL", 6.0, NOW - timedelta(hours=1)),
+    ):
+        session.add(
+            RateHistoryModel(
+                currency_code=currency_code,
+                rate=rate,
+                backed_by="USD",
+                updated_at=moment,
+            )
+        )
+    session.commit()
+    params = {
+        "from_this": "BRL",
+        "to": "USD",
+        "amount": 10,
+        "at": (NOW - timedelta(hours=2)).isoformat(),
+    }
+
+    first = client.get("/convert/", params=params)
+    local_hits = rate_cache.local.stats.hits
+    assert client.get("/convert/", params=params).json() == first.json()
+    assert rate_cache.local.stats.hits == local_hits + 1
+
+    # Another node only finds it in the shared tier
+    rate_cache.local.clear()
+    shared_hits = rate_cache.shared.stats.hits
+    assert client.get("/convert/", params=params).json() == first.json()
+    assert rate_cache.shared.stats.hits == shared_hits + 1
+    assert first.json()["data"]["converted_value"] == 2.0
+
+    stats = client.get("/cache").json()
+    assert set(stats) == {"local", "shared"}
+    assert stats["shared"]["hits"] == rate_cache.shared.stats.hits
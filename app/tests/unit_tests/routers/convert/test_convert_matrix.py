@@ -0,0 +1,45 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+def test_should_return_cross_rate_matrix_for_codes(
+    client: TestClient, create_hurb_currency
+):
+    res = client.get("/convert/matrix?codes=brl,HURB,USD")
+    data = res.json()["data"]
+
+    assert res.status_code == 200
+    assert list(data) == ["BRL", "HURB", "USD"]
+    assert data["BRL"]["BRL"] == 1.0
+    assert data["BRL"]["HURB"] == pytest.approx(4.0)
+    assert data["HURB"]["USD"] == pytest.approx(1 / (4.0 * 5.12))
+    assert data["USD"]["BRL"] == pytest.approx(5.12)
+
+
+def test_should_return_compact_cross_rate_matrix_for_all_codes(
+    client: TestClient, create_hurb_currency
+):
+    res = client.get("/convert/matrix?layout=compact")
+    res_data = res.json()
+
+    assert res.status_code == 200
+    assert res_data["codes"] == ["BRL", "BTC", "ETH", "EUR", "HURB", "USD"]
+    assert len(res_data["rows"]) == 6
+    assert all(len(row) == 6 for row in res_data["rows"])
+    assert res_data["rows"][3][0] == pytest.approx(5.12 / 1.01)
+
+
+def test_should_match_single_conversions(client: TestClient):
+    matrix = client.get("/convert/matrix?codes=EUR,ETH").json()["data"]
+    converted_value = client.get("/convert/?from_this=EUR&to=ETH&amount=157.76").json()[
+        "data"
+    ]["converted_value"]
+
+    assert round(157.76 * matrix["EUR"]["ETH"], 2) == converted_value
+
+
+def test_should_not_return_cross_rate_matrix_for_missing_code(client: TestClient):
+    res = client.get("/convert/matrix?codes=BRL,NOTFOUND")
+
+    assert res.status_code == 404
+    assert res.json()["detail"] == "Currency code NOTFOUND not found"
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import SQLALCHEMY_DATABASE_URL, SessionLocal
+from app.models import CoinbaseCurrenciesPublicApiModel, CurrencyChangeModel
+from app.services.rate_changes import (RateChangeListener,
+                                       publish_currency_change)
+from app.services.snapshot import rate_snapshot_store
+
+
+@pytest.fixture
+def listener(client: TestClient):
+    rate_change_listener = RateChangeListener(
+        dsn=SQLALCHEMY_DATABASE_URL, store=rate_snapshot_store, reconnect_interval=0.1
+    )
+    rate_change_listener.start(session_factory=SessionLocal)
+    yield rate_change_listener
+    rate_change_listener.stop()
+
+
+def _wait_for_rate(client: TestClient, currency_code: str, rate: float) -> float:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        current_rate = client.get(f"/currency/{currency_code}/").json()["data"]["rate"]
+        if current_rate == rate:
+            break
+        time.sleep(0.05)
+    return current_rate
+
+
+def _update_brl_rate(session: Session, rate: float) -> None:
+    session.query(CoinbaseCurrenciesPublicApiModel).filter(
+        CoinbaseCurrenciesPublicApiModel.currency_code == "BRL"
+    ).update({"rate": rate})
+
+
+def test_writes_log_currency_changes(
+    client: TestClient, session: Session, fictitious_currency_data_hurb: dict
+):
+    """
+    Try to create, rename and delete a currency and asserts every write logged a versioned change
+    """
+    client.post("/currency/", json=fictitious_currency_data_hurb)
+    client.put(
+        "/currency/HURB",
+        json={**fictitious_currency_data_hurb, "currency_code": "HURB2"},
+    )
+    client.delete("/currency/HURB2")
+
+    changes = session.query(CurrencyChangeModel).order_by(CurrencyChangeModel.version)
+    assert [(change.added, change.changed, change.removed) for change in changes] == [
+        (["HURB"], [], []),
+        (["HURB2"], [], ["HURB"]),
+        ([], [], ["HURB2"]),
+    ]
+
+
+def test_listener_refreshes_snapshot_on_notification(
+    client: TestClient, session: Session, listener: RateChangeListener
+):
+    """
+    Try to read a rate changed outside the API right after its change was published
+    """
+    assert _wait_for_rate(client, "BRL", 5.12) == 5.12
+
+    _update_brl_rate(session=session, rate=6.0)
+    version = publish_currency_change(db=session, changed=["BRL"])
+    session.commit()
+
+    assert _wait_for_rate(client, "BRL", 6.0) == 6.0
+    assert listener.last_version == version
+
+
+def test_listener_resyncs_after_reconnect(
+    client: TestClient, session: Session, listener: RateChangeListener
+):
+    """
+    Try to read a rate changed without notification while the listener was disconnected
+    """
+    assert _wait_for_rate(client, "BRL", 5.12) == 5.12
+
+    session.execute(
+        text(
+            "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE query LIKE 'LISTEN%'"
+        )
+    )
+    _update_brl_rate(session=session, rate=7.0)
+    session.commit()
+
+    assert _wait_for_rate(client, "BRL", 7.0) == 7.0
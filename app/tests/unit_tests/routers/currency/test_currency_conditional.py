@@ -0,0 +1,81 @@
+from email.utils import parsedate_to_datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.services.snapshot import rate_snapshot_store
+
+
+def test_should_answer_not_modified_for_known_etag(client: TestClient):
+    """
+    Try to poll the currency list again with the ETag of the previous response
+    """
+    res = client.get("/currency")
+    etag = res.headers["etag"]
+    assert res.status_code == 200
+    assert res.headers["cache-control"].startswith("public, max-age=")
+    assert "last-modified" in res.headers
+
+    res = client.get("/currency", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.content == b""
+    assert res.headers["etag"] == etag
+
+    res = client.get("/currency/BRL", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert res.status_code == 304
+
+
+def test_should_answer_not_modified_since_last_update(client: TestClient):
+    """
+    Try to poll the currency list with the Last-Modified of the previous response
+    """
+    last_modified = client.get("/currency").headers["last-modified"]
+
+    res = client.get("/currency", headers={"If-Modified-Since": last_modified})
+    assert res.status_code == 304
+
+    res = client.get(
+        "/currency", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}
+    )
+    assert res.status_code == 200
+
+
+def test_should_answer_not_modified_without_database(client: TestClient, monkeypatch):
+    """
+    Try to poll a conversion once the snapshot is loaded, with every database read failing
+    """
+    etag = client.get("/convert/?from_this=BRL&to=EUR&amount=10").headers["etag"]
+
+    def refresh(*args, **kwargs):
+        raise AssertionError("The database was read")
+
+    monkeypatch.setattr(rate_snapshot_store, "refresh", refresh)
+    res = client.get(
+        "/convert/?from_this=BRL&to=EUR&amount=10", headers={"If-None-Match": etag}
+    )
+    assert res.status_code == 304
+
+
+def test_should_change_validators_when_currencies_change(
+    client: TestClient, session: Session, fictitious_currency_data_hurb: dict
+):
+    """
+    Try to poll with validators older than a created and then deleted currency
+    """
+    first = client.get("/currency")
+    client.post("/currency/", json=fictitious_currency_data_hurb)
+
+    res = client.get("/currency", headers={"If-None-Match": first.headers["etag"]})
+    assert res.status_code == 200
+    assert len(res.json()["data"]) == 6
+
+    created = client.get("/currency")
+    client.delete("/currency/HURB")
+
+    res = client.get("/currency", headers={"If-None-Match": created.headers["etag"]})
+    assert res.status_code == 200
+    # The ETag hashes the content, so the same rows have the same ETag again
+    assert res.headers["etag"] == first.headers["etag"]
+    assert parsedate_to_datetime(res.headers["last-modified"]) >= parsedate_to_datetime(
+        created.headers["last-modified"]
+    )
@@ -1,7 +1,7 @@
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
-from app.models import CoinbaseCurrenciesPublicApiModel
+from app.models import CoinbaseCurrenciesPublicApiModel, FictitiousCoinModel
 from app.schemas.currency import CurrencyInput
 
 TEST_FICTITIOUS_CURRENCY_CODE = "HURB"
@@ -43,3 +43,40 @@ def test_not_found_in_db(client: TestClient, session: Session):
         .first()
     )
     assert currency_db is None
+
+
+def test_backing_other_currency(
+    client: TestClient, session: Session, create_hurb_currency: dict
+):
+    """
+    Try to delete a fictitious currency that backs another currency and asserts an error
+    """
+    session.add(FictitiousCoinModel(currency_code="NEST", rate=2.0, backed_by="HURB"))
+    session.commit()
+
+    res = client.delete(f"/currency/{TEST_FICTITIOUS_CURRENCY_CODE}")
+
+    assert res.status_code == 409
+    assert (
+        res.json()["detail"]
+        == f"Currency code {TEST_FICTITIOUS_CURRENCY_CODE} backs currency NEST and cannot be deleted"
+    )
+    assert client.get("/convert/?from_this=NEST&to=BRL&amount=16").status_code == 200
+
+
+def test_coinbase_currency(client: TestClient, session: Session):
+    """
+    Try to delete a coinbase currency and asserts an error
+    """
+    res = client.delete(f"/currency/{TEST_COINBASE_CURRENCY_CODE}")
+
+    assert res.status_code == 409
+    assert (
+        session.query(CoinbaseCurrenciesPublicApiModel)
+        .filter(
+            CoinbaseCurrenciesPublicApiModel.currency_code
+            == TEST_COINBASE_CURRENCY_CODE
+        )
+        .first()
+        is not None
+    )
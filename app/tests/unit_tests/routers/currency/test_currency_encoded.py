@@ -0,0 +1,60 @@
+import gzip
+
+import brotli
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.schemas.currency import CurrencyOut, MultipleCurrencyResponse
+from app.services.encoded_body import EncodedBody, currency_list_body
+from app.services.snapshot import rate_snapshot_store
+
+
+def test_should_serve_currency_list_in_accepted_encoding(client: TestClient):
+    """
+    Try to read the currency list as Brotli, gzip and uncompressed JSON
+    """
+    plain = client.get("/currency", headers={"Accept-Encoding": "identity"})
+    assert plain.status_code == 200
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+    assert len(plain.json()["data"]) == 5
+
+    res = client.get("/currency", headers={"Accept-Encoding": "gzip, br"})
+    assert res.headers["content-encoding"] == "br"
+    assert res.json() == plain.json()
+
+    res = client.get("/currency", headers={"Accept-Encoding": "br;q=0.5, gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.json() == plain.json()
+
+
+def test_should_build_currency_list_body_once_per_snapshot(client: TestClient):
+    """
+    Try to read the currency list twice from the same snapshot
+    """
+    client.get("/currency")
+    snapshot = rate_snapshot_store.current(db=None)
+    body = currency_list_body(snapshot)
+
+    assert currency_list_body(snapshot) is body
+    assert gzip.decompress(body.bodies["gzip"]) == body.bodies["identity"]
+    assert brotli.decompress(body.bodies["br"]) == body.bodies["identity"]
+    # Same bytes FastAPI would have serialized from the response model
+    expected = MultipleCurrencyResponse(
+        data=[CurrencyOut(**currency.dict()) for currency in snapshot.currencies]
+    )
+    assert body.bodies["identity"] == JSONResponse(jsonable_encoder(expected)).body
+
+
+def test_should_negotiate_encoding():
+    """
+    Try to pick an encoding from several `Accept-Encoding` headers
+    """
+    body = EncodedBody(MultipleCurrencyResponse(data=[]))
+
+    assert body.negotiate("")[0] == "identity"
+    assert body.negotiate("*")[0] == "br"
+    assert body.negotiate("gzip;q=1.0, br;q=0.8")[0] == "gzip"
+    assert body.negotiate("br;q=0, gzip;q=0, deflate")[0] == "identity"
+    assert body.negotiate("compress")[0] == "identity"
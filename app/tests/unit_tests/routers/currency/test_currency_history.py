@@ -0,0 +1,220 @@
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models import RateHistoryHourlyModel, RateHistoryModel
+
+
+def _utc(hour: int, minute: int = 0, second: int = 0, day: int = 1) -> datetime:
+    return datetime(2024, 3, day, hour, minute, second, tzinfo=timezone.utc)
+
+
+def test_history_downsamples_raw_ticks(client: TestClient, session: Session):
+    """
+    Try to read minute buckets built from raw ticks
+    """
+    for moment, rate in [
+        (_utc(10, 0, 5), 5.0),
+        (_utc(10, 0, 30), 5.5),
+        (_utc(10, 0, 50), 4.8),
+        (_utc(10, 1, 10), 5.2),
+        (_utc(10, 5), 9.9),
+    ]:
+        session.add(
+            RateHistoryModel(
+                currency_code="BRL", rate=rate, backed_by="USD", updated_at=moment
+            )
+        )
+    session.commit()
+
+    res = client.get(
+        "/currency/brl/history",
+        params={
+            "from": "2024-03-01T10:00:00Z",
+            "to": "2024-03-01T10:05:00Z",
+            "interval": "1m",
+        },
+    )
+
+    assert res.status_code == 200
+    assert res.json()["data"] == [
+        {
+            "bucket": "2024-03-01T10:00:00+00:00",
+            "open": 5.0,
+            "high": 5.5,
+            "low": 4.8,
+            "close": 4.8,
+        },
+        {
+            "bucket": "2024-03-01T10:01:00+00:00",
+            "open": 5.2,
+            "high": 5.2,
+            "low": 5.2,
+            "close": 5.2,
+        },
+    ]
+
+
+def test_history_aggregates_hourly_rollup(client: TestClient, session: Session):
+    """
+    Try to read daily buckets built from the hourly rollup
+    """
+    for bucket, open_, high, low, close in [
+        (_utc(10), 5.0, 5.6, 4.9, 5.1),
+        (_utc(11), 5.1, 5.3, 4.7, 5.2),
+        (_utc(0, day=2), 5.2, 5.2, 5.2, 5.2),
+    ]:
+        session.add(
+            RateHistoryHourlyModel(
+                currency_code="BRL",
+                bucket=bucket,
+                open=open_,
+                high=high,
+                low=low,
+                close=close,
+            )
+        )
+    session.commit()
+
+    res = client.get(
+        "/currency/BRL/history",
+        params={
+            "from": "2024-03-01T00:00:00Z",
+            "to": "2024-03-03T00:00:00Z",
+            "interval": "1d",
+        },
+    )
+
+    assert res.status_code == 200
+    assert res.json()["data"] == [
+        {
+            "bucket": "2024-03-01T00:00:00+00:00",
+            "open": 5.0,
+            "high": 5.6,
+            "low": 4.7,
+            "close": 5.2,
+        },
+        {
+            "bucket": "2024-03-02T00:00:00+00:00",
+            "open": 5.2,
+            "high": 5.2,
+            "low": 5.2,
+            "close": 5.2,
+        },
+    ]
+
+
+def test_history_records_api_writes(
+    client: TestClient, fictitious_currency_data_hurb: dict
+):
+    """
+    Try to read the history of a fictitious currency created and updated through the API
+    """
+    client.post("/currency/", json=fictitious_currency_data_hurb)
+    client.put("/currency/HURB", json={**fictitious_currency_data_hurb, "rate": 8.0})
+
+    res = client.get("/currency/HURB/history", params={"interval": "1h"})
+    data = res.json()["data"]
+
+    assert res.status_code == 200
+    assert len(data) == 1
+    assert (data[0]["open"], data[0]["high"], data[0]["low"], data[0]["close"]) == (
+        4.0,
+        8.0,
+        4.0,
+        8.0,
+    )
+
+
+def test_history_not_found(client: TestClient):
+    """
+    Try to read the history of a currency not found in database
+    """
+    res = client.get("/currency/FOO/history")
+    assert res.status_code == 404
+
+
+def test_history_invalid_range(client: TestClient):
+    """
+    Try to read history with an empty range or too many buckets
+    """
+    res = client.get(
+        "/currency/BRL/history",
+        params={"from": "2024-03-02T00:00:00Z", "to": "2024-03-01T00:00:00Z"},
+    )
+    assert res.status_code == 422
+
+    res = client.get(
+        "/currency/BRL/history",
+        params={
+            "from": "2023-01-01T00:00:00Z",
+            "to": "2024-03-01T00:00:00Z",
+            "interval": "1m",
+        },
+    )
+    assert res.status_code == 422
+
+
+def test_history_reads_raw_ticks_from_tick_store(
+    client: TestClient, session: Session, write_tick_store
+):
+    """
+    Try to read minute buckets of a coinbase currency from the memory mapped tick store
+    """
+    write_tick_store(
+        covers_from=_utc(9),
+        BRL=[
+            (_utc(9, 59, 59), 1.0),
+            (_utc(10, 0, 5), 5.0),
+            (_utc(10, 0, 30), 5.5),
+            (_utc(10, 0, 50), 4.8),
+            (_utc(10, 1, 10), 5.2),
+            (_utc(10, 5), 9.9),
+        ],
+    )
+    # Never read, the store covers the range
+    session.add(
+        RateHistoryModel(
+            currency_code="BRL", rate=7.0, backed_by="USD", updated_at=_utc(10, 2)
+        )
+    )
+    session.commit()
+
+    res = client.get(
+        "/currency/brl/history",
+        params={
+            "from": "2024-03-01T10:00:00Z",
+            "to": "2024-03-01T10:05:00Z",
+            "interval": "1m",
+        },
+    )
+
+    assert res.status_code == 200
+    assert res.json()["data"] == [
+        {
+            "bucket": "2024-03-01T10:00:00+00:00",
+            "open": 5.0,
+            "high": 5.5,
+            "low": 4.8,
+            "close": 4.8,
+        },
+        {
+            "bucket": "2024-03-01T10:01:00+00:00",
+            "open": 5.2,
+            "high": 5.2,
+            "low": 5.2,
+            "close": 5.2,
+        },
+    ]
+
+    # Ranges starting before the store covers them are read from Postgres
+    res = client.get(
+        "/currency/brl/history",
+        params={
+            "from": "2024-03-01T08:00:00Z",
+            "to": "2024-03-01T10:05:00Z",
+            "interval": "1m",
+        },
+    )
+    assert [bucket["open"] for bucket in res.json()["data"]] == [7.0]
@@ -1,7 +1,12 @@
+import json
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
 
-from app.schemas.currency import Currency
+from app.models import CoinbaseCurrenciesPublicApiModel
+from app.schemas.currency import Currency, CurrencyOut, CurrencyResponse
+from app.services.snapshot import rate_snapshot_store
 
 
 @pytest.mark.parametrize(
@@ -84,3 +89,64 @@ def test_fictitious_found_in_db(client: TestClient, create_hurb_currency: dict):
     res_data = res.json()["data"]
     assert res.status_code == 200
     assert res_data["currency_code"] == currency.currency_code
+
+
+def test_read_served_from_snapshot(client: TestClient, session: Session):
+    """
+    Try to read a currency removed from database without going through the API and asserts the snapshot answers
+    """
+    assert client.get("/currency/BRL/").status_code == 200
+
+    session.query(CoinbaseCurrenciesPublicApiModel).filter(
+        CoinbaseCurrenciesPublicApiModel.currency_code == "BRL"
+    ).delete()
+    session.commit()
+
+    res = client.get("/currency/BRL/")
+    assert res.status_code == 200
+    assert res.json()["data"]["currency_code"] == "BRL"
+
+
+def test_read_after_create_refreshes_snapshot(
+    client: TestClient, fictitious_currency_data_hurb: dict
+):
+    """
+    Try to read a fictitious currency right after creating it
+    """
+    assert client.get("/currency/HURB/").status_code == 404
+
+    client.post("/currency/", json=fictitious_currency_data_hurb)
+    res = client.get("/currency/HURB/")
+
+    assert res.status_code == 200
+    assert res.json()["data"]["rate"] == fictitious_currency_data_hurb["rate"]
+
+
+def test_snapshot_refresh_detects_change_outside_api(
+    client: TestClient, session: Session
+):
+    """
+    Try to read a rate changed directly in database after the change check ran
+    """
+    assert client.get("/currency/BRL/").json()["data"]["rate"] == 5.12
+
+    # Rate changes without touching `updated_at` or the row count
+    session.query(CoinbaseCurrenciesPublicApiModel).filter(
+        CoinbaseCurrenciesPublicApiModel.currency_code == "BRL"
+    ).update({"rate": 6.0})
+    session.commit()
+    assert client.get("/currency/BRL/").json()["data"]["rate"] == 5.12
+
+    rate_snapshot_store.refresh(db=session, force=False)
+    assert client.get("/currency/BRL/").json()["data"]["rate"] == 6.0
+
+
+def test_read_body_matches_response_model(client: TestClient):
+    """
+    Try to read a currency through the pre-built body and compare it with the validated response model
+    """
+    res = client.get("/currency/BTC")
+    currency = rate_snapshot_store.current(db=None).get("BTC")
+
+    expected = CurrencyResponse(data=CurrencyOut(**currency.dict()))
+    assert res.json() == json.loads(expected.json())
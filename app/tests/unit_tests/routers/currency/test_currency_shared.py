@@ -0,0 +1,136 @@
+import multiprocessing
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal
+from app.schemas.currency import CurrencyDatabase
+from app.services.encoded_body import currency_list_body
+from app.services.shared_rates import SharedRateTable
+from app.services.snapshot import (RateSnapshot, RateSnapshotStore,
+                                   rate_snapshot_store)
+
+
+def _table(path, capacity: int = 16) -> SharedRateTable:
+    table = SharedRateTable(
+        path=str(path),
+        capacity=capacity,
+        poll_interval=0.01,
+        store=RateSnapshotStore(refresh_interval=60),
+    )
+    if not table._map():
+        table._create()
+    return table
+
+
+def _snapshot(version: int, rate: float) -> RateSnapshot:
+    updated_at = datetime(2022, 10, 1, tzinfo=timezone(timedelta(hours=-3)))
+    return RateSnapshot(
+        version=version,
+        currencies=[
+            CurrencyDatabase(
+                id=index,
+                currency_code=f"C{index:02}",
+                rate=rate,
+                backed_by="USD",
+                updated_at=updated_at,
+                currency_type="coinbase",
+            )
+            for index in range(16)
+        ],
+        fingerprint=(f"{version:032}",),
+    )
+
+
+def _publish_many(path: str, count: int) -> None:
+    table = _table(path)
+    for version in range(1, count + 1):
+        table.publish(_snapshot(version=version, rate=float(version)))
+
+
+def test_should_serve_rates_of_shared_table(client: TestClient, tmp_path):
+    """
+    Try to serve the currency list of a worker following the table of another one
+    """
+    client.get("/currency")
+    snapshot = rate_snapshot_store.current(db=None)
+    writer = _table(tmp_path / "rates")
+    writer.publish(snapshot)
+
+    follower = _table(tmp_path / "rates")
+    follower._follow(session_factory=SessionLocal)
+    followed = follower.store.current(db=None)
+
+    assert followed.fingerprint == snapshot.fingerprint
+    assert followed.last_modified == snapshot.last_modified
+    assert (
+        currency_list_body(followed).bodies["identity"]
+        == currency_list_body(snapshot).bodies["identity"]
+    )
+    # Nothing moved, so the follower keeps its snapshot
+    follower._follow(session_factory=SessionLocal)
+    assert follower.store.current(db=None) is followed
+
+
+def test_should_read_from_database_when_rates_overflow_table(
+    client: TestClient, tmp_path
+):
+    """
+    Try to follow a table too small for every currency
+    """
+    client.get("/currency")
+    snapshot = rate_snapshot_store.current(db=None)
+    writer = _table(tmp_path / "rates", capacity=2)
+    writer.publish(snapshot)
+
+    follower = _table(tmp_path / "rates")
+    assert follower.read()[1] is None
+    follower._follow(session_factory=SessionLocal)
+
+    assert follower.store.current(db=None).fingerprint == snapshot.fingerprint
+
+
+def test_should_never_read_torn_rates(tmp_path):
+    """
+    Try to read the table while another process keeps publishing into it
+    """
+    path = str(tmp_path / "rates")
+    reader = _table(path)
+    writer = multiprocessing.get_context("fork").Process(
+        target=_publish_many, args=(path, 2000)
+    )
+    writer.start()
+
+    read_versions = set()
+    while writer.is_alive() or not read_versions:
+        if (table := reader.read()) is None:
+            continue
+        rates = table[1]
+        version = int(rates.fingerprint[0])
+        assert {currency.rate for currency in rates.currencies} == {float(version)}
+        read_versions.add(version)
+    writer.join()
+
+    assert writer.exitcode == 0
+    assert int(reader.read()[1].fingerprint[0]) == 2000
+
+
+def test_should_install_only_changed_rates():
+    """
+    Try to install the same rates twice
+    """
+    store = RateSnapshotStore(refresh_interval=60)
+    published = []
+    store.subscribe(published.append)
+    snapshot = _snapshot(version=1, rate=1.0)
+
+    first = store.install(
+        currencies=snapshot.currencies, fingerprint=("a",), changed_at=None
+    )
+    assert (
+        store.install(
+            currencies=snapshot.currencies, fingerprint=("a",), changed_at=None
+        )
+        is first
+    )
+    assert published == [first]
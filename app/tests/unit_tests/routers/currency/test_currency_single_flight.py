@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal
+from app.services import snapshot as snapshot_module
+from app.services.single_flight import SingleFlight
+from app.services.snapshot import rate_snapshot_store
+
+
+def _run_concurrently(count: int, call):
+    barrier = threading.Barrier(count)
+
+    def run():
+        barrier.wait()
+        return call()
+
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(run) for _ in range(count)]
+    return futures
+
+
+def test_should_load_once_for_concurrent_callers():
+    """
+    Try to load the same key from many threads at once
+    """
+    flight = SingleFlight(timeout=5)
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.1)
+        return object()
+
+    futures = _run_concurrently(20, lambda: flight.do("BRL", load))
+
+    assert len(loads) == 1
+    assert len({id(future.result()) for future in futures}) == 1
+    assert flight.coalesced == 19
+    # Nothing in flight anymore, so the next call loads again
+    flight.do("BRL", load)
+    assert len(loads) == 2
+
+
+def test_should_share_load_errors_and_time_out():
+    """
+    Try to wait on a failing load and on a load slower than the timeout
+    """
+    flight = SingleFlight(timeout=5)
+
+    def fail():
+        time.sleep(0.1)
+        raise HTTPException(status_code=404, detail="Currency code XYZ not found")
+
+    for future in _run_concurrently(5, lambda: flight.do("XYZ", fail)):
+        with pytest.raises(HTTPException) as error:
+            future.result()
+        assert error.value.status_code == 404
+
+    flight.timeout = 0.01
+    futures = _run_concurrently(2, lambda: flight.do("BRL", lambda: time.sleep(0.2)))
+    errors = [future.exception() for future in futures]
+    assert [error.status_code for error in errors if error is not None] == [503]
+
+
+def test_should_load_once_for_concurrent_coroutines():
+    """
+    Try to load the same key from many coroutines at once
+    """
+    flight = SingleFlight(timeout=5)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.05)
+        return len(loads)
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("BRL", load) for _ in range(20)))
+
+    assert asyncio.run(main()) == [1] * 20
+    assert flight.coalesced == 19
+
+
+def test_should_load_cold_snapshot_once(client: TestClient, monkeypatch):
+    """
+    Try to read the rates from many threads while no snapshot is loaded
+    """
+    queries = []
+    query_fingerprint = snapshot_module._query_fingerprint
+
+    def counting_query_fingerprint(db):
+        queries.append(1)
+        time.sleep(0.05)
+        return query_fingerprint(db=db)
+
+    monkeypatch.setattr(
+        snapshot_module, "_query_fingerprint", counting_query_fingerprint
+    )
+    rate_snapshot_store.clear()
+
+    def read():
+        db = SessionLocal()
+        try:
+            return rate_snapshot_store.current(db=db)
+        finally:
+            db.close()
+
+    futures = _run_concurrently(10, read)
+
+    assert len(queries) == 1
+    assert len({id(future.result()) for future in futures}) == 1
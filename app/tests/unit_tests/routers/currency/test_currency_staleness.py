@@ -0,0 +1,97 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.models import CurrencyModel
+from app.services import snapshot as snapshot_module
+from app.services.snapshot import rate_snapshot_store
+
+
+def _age_rates(session: Session, age: timedelta):
+    session.query(CurrencyModel).update(
+        {CurrencyModel.updated_at: datetime.now(timezone.utc) - age}
+    )
+    session.commit()
+
+
+def test_should_report_staleness_of_rates(client: TestClient, session: Session):
+    """
+    Try to read the currencies and a conversion after the rates were updated one hour ago
+    """
+    _age_rates(session, timedelta(hours=1))
+
+    res = client.get("/currency")
+    assert res.status_code == 200
+    assert 3600 <= int(res.headers["staleness"]) < 3660
+    assert "warning" not in res.headers
+
+    res = client.get(
+        "/convert/?from_this=BRL&to=EUR&amount=10", headers={"Max-Staleness": "7200"}
+    )
+    assert res.status_code == 200
+    assert 3600 <= int(res.headers["staleness"]) < 3660
+
+
+def test_should_revalidate_rates_older_than_accepted(
+    client: TestClient, session: Session
+):
+    """
+    Try to read rates older than the client accepts, before and after newer ones are written
+    """
+    _age_rates(session, timedelta(hours=1))
+    client.get("/currency")
+
+    res = client.get("/currency/BRL", headers={"Max-Staleness": "60"})
+    assert res.status_code == 503
+
+    # Written behind the snapshot's back, picked up by the revalidation
+    _age_rates(session, timedelta(seconds=0))
+    res = client.get("/currency/BRL", headers={"Max-Staleness": "60"})
+    assert res.status_code == 200
+    assert int(res.headers["staleness"]) < 60
+
+
+def test_should_serve_last_good_snapshot_while_database_fails(
+    client: TestClient, session: Session, monkeypatch
+):
+    """
+    Try to read the currencies while refreshing the snapshot fails or stalls
+    """
+    _age_rates(session, timedelta(hours=1))
+    snapshot = client.get("/currency").headers["etag"]
+
+    query_fingerprint = snapshot_module._query_fingerprint
+
+    def failing_query_fingerprint(db):
+        raise OperationalError("SELECT md5(...)", {}, Exception("connection refused"))
+
+    monkeypatch.setattr(
+        snapshot_module, "_query_fingerprint", failing_query_fingerprint
+    )
+    monkeypatch.setattr(rate_snapshot_store, "failing_since", None)
+    res = client.get("/currency", headers={"Max-Staleness": "60"})
+    assert res.status_code == 503
+
+    res = client.get("/currency")
+    assert res.status_code == 200
+    assert res.headers["etag"] == snapshot
+    assert res.headers["warning"] == '111 - "Revalidation Failed"'
+
+    def stalled_query_fingerprint(db):
+        time.sleep(0.5)
+        return query_fingerprint(db=db)
+
+    monkeypatch.setattr(
+        snapshot_module, "_query_fingerprint", stalled_query_fingerprint
+    )
+    monkeypatch.setattr(rate_snapshot_store, "revalidate_timeout", 0.05)
+    started_at = time.monotonic()
+    res = client.get("/currency", headers={"Max-Staleness": "60"})
+    assert res.status_code == 503
+    assert time.monotonic() - started_at < 0.4
+    # The stalled refresh goes on in the background and recovers
+    rate_snapshot_store._revalidation.join()
+    assert rate_snapshot_store.failing_since is None
@@ -1,7 +1,7 @@
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
-from app.models import CoinbaseCurrenciesPublicApiModel
+from app.models import CoinbaseCurrenciesPublicApiModel, FictitiousCoinModel
 from app.schemas.currency import CurrencyInput
 
 NEW_RATE = 50.41
@@ -166,3 +166,39 @@ def test_found_in_db_original(
         res.json()["detail"]
         == f"Currency code {real_currency_data_brl['currency_code']} is an coinbase_api currency and cannot be changed"
     )
+
+
+def test_found_in_db_circular_backed_by(
+    client: TestClient, create_hurb_currency: dict, fictitious_currency_data_test: dict
+):
+    """
+    Try to back a fictitious currency by a currency backed by itself and asserts an error
+    """
+    client.post(
+        "/currency/", json={**fictitious_currency_data_test, "backed_by": "HURB"}
+    )
+
+    payload = {**create_hurb_currency, "backed_by": "TEST"}
+    res = client.put(f"/currency/{create_hurb_currency['currency_code']}", json=payload)
+
+    assert res.status_code == 409
+    assert res.json()["detail"] == "Backed currency code TEST is backed by HURB"
+
+
+def test_found_in_db_renaming_backing_currency(
+    client: TestClient, session: Session, create_hurb_currency: dict
+):
+    """
+    Try to rename a fictitious currency that backs another currency and asserts an error
+    """
+    session.add(FictitiousCoinModel(currency_code="NEST", rate=2.0, backed_by="HURB"))
+    session.commit()
+
+    payload = {**create_hurb_currency, "currency_code": "HURB2"}
+    res = client.put(f"/currency/{create_hurb_currency['currency_code']}", json=payload)
+
+    assert res.status_code == 409
+    assert (
+        res.json()["detail"]
+        == "Currency code HURB backs currency NEST and cannot be renamed"
+    )
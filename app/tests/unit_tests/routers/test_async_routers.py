@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.database import (SQLALCHEMY_ASYNC_DATABASE_URL, get_async_db,
+                          get_async_read_db)
+from app.models import RateHistoryModel
+from app.routers import convert_async, currency_async
+from app.services.history_index import rate_history_index
+from app.services.snapshot import rate_snapshot_store
+
+
+@pytest.fixture
+def async_client(session: Session, insert_test_data):
+    # Each TestClient request runs on its own event loop, so connections are not pooled
+    async_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=NullPool
+    )
+    AsyncTestingSession = sessionmaker(bind=async_engine, class_=AsyncSession)
+
+    async def override_get_async_db():
+        async with AsyncTestingSession() as db:
+            yield db
+
+    async_app = FastAPI()
+    async_app.include_router(currency_async.router)
+    async_app.include_router(convert_async.router)
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+    async_app.dependency_overrides[get_async_read_db] = override_get_async_db
+    rate_snapshot_store.clear()
+    rate_history_index.clear()
+    yield TestClient(async_app)
+
+
+def test_should_read_currency_on_async_path(async_client: TestClient):
+    res = async_client.get("/currency/BRL")
+
+    assert res.status_code == 200
+    assert res.json()["data"]["rate"] == 5.12
+    assert len(async_client.get("/currency").json()["data"]) == 5
+
+
+def test_should_convert_currency_on_async_path(async_client: TestClient):
+    res = async_client.get("/convert/?from_this=BRL&to=EUR&amount=10")
+
+    assert res.status_code == 200
+    assert res.json()["data"]["converted_value"] == 1.97
+
+
+def test_should_write_currency_on_async_path(
+    async_client: TestClient, fictitious_currency_data_hurb: dict
+):
+    res = async_client.post("/currency/", json=fictitious_currency_data_hurb)
+    assert res.status_code == 201
+    assert (
+        async_client.get("/convert/?from_this=HURB&to=BRL&amount=8").json()["data"][
+            "converted_value"
+        ]
+        == 2.0
+    )
+
+    res = async_client.put(
+        "/currency/HURB", json={**fictitious_currency_data_hurb, "rate": 8.0}
+    )
+    assert res.status_code == 200
+    assert res.json()["data"]["rate"] == 8.0
+
+    assert async_client.delete("/currency/HURB").status_code == 204
+    assert async_client.get("/currency/HURB").status_code == 404
+    assert async_client.delete("/currency/HURB").status_code == 404
+
+
+def test_should_convert_at_moment_on_async_path(
+    async_client: TestClient, session: Session
+):
+    moment = datetime.now(timezone.utc) - timedelta(days=3)
+    for currency_code, rate in [("USD", 1.0), ("BRL", 4.0)]:
+        session.add(
+            RateHistoryModel(
+                currency_code=currency_code,
+                rate=rate,
+                backed_by="USD",
+                updated_at=moment,
+            )
+        )
+    session.commit()
+
+    res = async_client.get(
+        "/convert/",
+        params={
+            "from_this": "BRL",
+            "to": "USD",
+            "amount": 10,
+            "at": (moment + timedelta(hours=1)).isoformat(),
+        },
+    )
+
+    assert res.status_code == 200
+    assert res.json()["data"]["converted_value"] == 2.5
+
+
+def test_should_answer_not_modified_on_async_path(async_client: TestClient):
+    etag = async_client.get("/currency").headers["etag"]
+
+    assert (
+        async_client.get("/currency", headers={"If-None-Match": etag}).status_code
+        == 304
+    )
+    assert (
+        async_client.get(
+            "/convert/?from_this=BRL&to=EUR&amount=10", headers={"If-None-Match": etag}
+        ).status_code
+        == 304
+    )
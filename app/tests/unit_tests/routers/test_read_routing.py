@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import database
+from app.database import (ReadSessionLocal, Replica, ReplicaRouter, engine,
+                          get_read_db)
+from app.models import CurrencyModel, FictitiousCoinModel
+
+
+@pytest.fixture
+def replicas():
+    # Both point at the test database, which answers the lag check like a replica in sync
+    replicas = [
+        Replica("localhost"),
+        Replica(f"localhost:{database.settings.database_port}"),
+    ]
+    yield replicas
+    for replica in replicas:
+        replica.engine.dispose()
+
+
+def _router(replicas, routing: str = "round_robin") -> ReplicaRouter:
+    router = ReplicaRouter(
+        replicas=replicas, routing=routing, max_lag=5, check_interval=60
+    )
+    router.check()
+    return router
+
+
+def test_should_spread_reads_over_replicas_in_sync(replicas):
+    """
+    Try to pick the replica of several read sessions, in turns and by busyness
+    """
+    router = _router(replicas)
+    assert [replica.lag for replica in replicas] == [0, 0]
+    picked = [router.pick() for _ in range(4)]
+    assert picked == [replica.engine for replica in replicas] * 2
+
+    router = _router(replicas, routing="least_busy")
+    with replicas[0].engine.connect():
+        assert router.pick() is replicas[1].engine
+
+
+def test_should_read_from_primary_without_replica_in_sync(replicas):
+    """
+    Try to pick a replica while one lags behind and the other cannot be reached
+    """
+    unreachable = Replica("localhost:1")
+    router = _router([replicas[0], unreachable])
+    assert unreachable.lag is None
+    assert router.pick() is replicas[0].engine
+
+    replicas[0].lag = 60.0
+    assert router.pick() is None
+    unreachable.engine.dispose()
+
+
+def test_should_read_own_writes_from_primary(session: Session, replicas, monkeypatch):
+    """
+    Try to read, write and read again in one read session
+    """
+    monkeypatch.setattr(database, "replica_router", _router(replicas[:1]))
+    db = next(get_read_db())
+    query = select(CurrencyModel)
+
+    assert db.get_bind(clause=query) is replicas[0].engine
+    assert db.execute(query).all() == []
+
+    db.add(FictitiousCoinModel(currency_code="HURB", rate=4.0, backed_by="USD"))
+    db.flush()
+    assert db.wrote
+    assert db.get_bind(clause=query) is engine
+    assert [row.currency_code for row in db.scalars(query)] == ["HURB"]
+    db.rollback()
+    db.close()
+
+    # Every session picks again
+    assert ReadSessionLocal().get_bind(clause=query) is replicas[0].engine